@@ -1,5 +1,6 @@
 from .document_processor import DocumentProcessor, Document
 from .build_index import IndexBuilder
+from .embedding_client import EmbeddingClient
 # from .embedding_indexer import EmbeddingIndexer, IndexedDocument
 # from .memory import ConversationMemory, Message
 # from .rag_agent import RAGAgent
@@ -7,7 +8,8 @@ from .build_index import IndexBuilder
 
 __all__ = [
     'DocumentProcessor',
-    'IndexBuilder'
+    'IndexBuilder',
+    'EmbeddingClient'
     # 'Document',
     # 'EmbeddingIndexer',
     # 'IndexedDocument',
@@ -2,9 +2,15 @@ import asyncio
 import time
 import os
 import datetime
-from perception import extract_perception
+import json
+import uuid
+import argparse
+from contextlib import AsyncExitStack
+from typing import Iterable, List, Optional
+from perception import extract_perception_async
 from memory import MemoryManager, MemoryItem
-from decision import generate_plan
+from decision import generate_plan_async
+from ollama_client import OllamaClient
 from action import execute_tool
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -40,99 +46,222 @@ def log(stage: str, msg: str):
 
 
 max_steps = 3
+# Durable agent memory: snapshot plus append-only log, reloaded on every run
+MEMORY_DIR = "memory_store"
 
-async def main(user_input: str):
-    try:
-        print("[agent] Starting agent...")
-        print(f"[agent] Current working directory: {os.getcwd()}")
-        
-        server_params = StdioServerParameters(
-            command="python",
-            args=["mcp_server.py"],
-            cwd=""
+
+class Agent:
+    """A warm agent: one MCP session, its tool list, the memory store and the Ollama client, reused across queries.
+
+    Start-up (spawning the MCP server, which loads the index, plus the
+    initialize and list_tools round trips) is paid once in start(); every
+    run() after that only pays for the LLM and tool calls of its own steps.
+    """
+
+    def __init__(
+        self,
+        server_script: str = "mcp_server.py",
+        memory_dir: str = MEMORY_DIR,
+        llm_concurrency: int = 4,
+        session_id: Optional[str] = None
+    ):
+        # The server resolves its index relative to its own directory, which is also this one
+        self.server_params = StdioServerParameters(
+            command=sys.executable,
+            args=[server_script],
+            cwd=os.path.dirname(os.path.abspath(__file__))
         )
+        self.memory_dir = memory_dir
+        self.llm_concurrency = llm_concurrency
+        # Memories are stored under this id and, if set, retrieval only sees this session's memories
+        self.session_id = session_id
+        self.session: Optional[ClientSession] = None
+        self.tools: list = []
+        self.tool_descriptions = ""
+        self.memory: Optional[MemoryManager] = None
+        self.ollama: Optional[OllamaClient] = None
+        self._stack = AsyncExitStack()
+
+    async def __aenter__(self) -> "Agent":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
 
+    async def start(self) -> None:
+        start = time.perf_counter()
+        print("[agent] Starting agent...")
+        print(f"[agent] Current working directory: {os.getcwd()}")
         try:
-            async with stdio_client(server_params) as (read, write):
-                print("Connection established, creating session...")
+            read, write = await self._stack.enter_async_context(stdio_client(self.server_params))
+            self.session = await self._stack.enter_async_context(ClientSession(read, write))
+            await self.session.initialize()
+            print("[agent] MCP session initialized")
+
+            self.tools = (await self.session.list_tools()).tools
+            self.tool_descriptions = "\n".join(
+                f"- {tool.name}: {getattr(tool, 'description', 'No description')}"
+                for tool in self.tools
+            )
+            log("Agent:", f"{len(self.tools)} tools loaded: {[tool.name for tool in self.tools]}")
+
+            self.memory = MemoryManager(path=self.memory_dir)
+            self.ollama = OllamaClient(max_concurrency=self.llm_concurrency)
+        except BaseException:
+            # __aexit__ does not run when __aenter__ fails; stop the MCP server process here
+            if self.memory is not None:
+                self.memory.close()
+            await self._stack.aclose()
+            raise
+        log("Agent:", f"Ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    async def close(self) -> None:
+        if self.memory is not None:
+            self.memory.close()
+        if self.ollama is not None:
+            await self.ollama.aclose()
+        await self._stack.aclose()
+
+    async def run(self, user_input: str, session_id: Optional[str] = None) -> str:
+        """Answer one query; returns the final plan line (or the last tool result if steps ran out).
+
+        Memories are stored and recalled under session_id, the agent's session by default.
+        """
+        start = time.perf_counter()
+        # Only tags this query's log lines
+        query_id = f"query-{uuid.uuid4().hex[:12]}"
+        session_id = session_id or self.session_id
+        query = user_input  # Store original intent
+        answer = "FINAL_ANSWER: [unknown]"
+        step = 0
+
+        while step < max_steps:
+            log("Loop: ", f"[{query_id}] Step {step + 1} started")
+
+            # Perception and memory retrieval are independent, so both LLM calls run at once
+            perception, retrieved = await asyncio.gather(
+                extract_perception_async(user_input, self.ollama),
+                self.memory.retrieve_async(query=user_input, client=self.ollama, top_k=3, session_filter=session_id)
+            )
+            log("Perception: ", f"[{query_id}] Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
+            log("Memory: ", f"[{query_id}] Retrieved {len(retrieved)} relevant memories")
+
+            plan = await generate_plan_async(perception, retrieved, self.ollama, tool_descriptions=self.tool_descriptions)
+            log("Plan: ", f"[{query_id}] Plan generated: {plan}")
+
+            if plan.startswith("FINAL_ANSWER:"):
+                log("Agent: ", f"[{query_id}] ✅ FINAL RESULT: {plan}")
+                answer = plan
+                break
+
+            try:
+                result = await execute_tool(self.session, self.tools, plan)
+                log("Tool: ", f"[{query_id}] {result.tool_name} returned: {result.result}")
+
+                await self.memory.add_async(MemoryItem(
+                    text=f"Tool call: {result.tool_name} with {result.arguments}, got: {result.result}",
+                    type="tool_output",
+                    tool_name=result.tool_name,
+                    user_query=user_input,
+                    tags=[result.tool_name],
+                    session_id=session_id
+                ), self.ollama)
+
+                answer = str(result.result)
+                user_input = f"Original task: {query}\nPrevious output: {result.result}\nWhat should I do next?"
+
+            except Exception as e:
+                log("Tool: ", f"[{query_id}] Tool execution failed: {e}")
+                break
+
+            step += 1
+
+        log("Agent: ", f"[{query_id}] Query answered in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return answer
+
+    async def run_many(self, queries: Iterable[str], concurrency: int = 8) -> List[str]:
+        """Answer queries concurrently, at most `concurrency` at a time; answers come back in query order.
+
+        Every query runs its own loop over the shared MCP session, memory and
+        Ollama client, under its own session id so concurrent queries never
+        recall each other's tool outputs. How many LLM requests are in
+        flight is capped separately by llm_concurrency, so throughput follows
+        what Ollama can serve while tool calls and memory work overlap.
+        """
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        for position, query in enumerate(queries):
+            queue.put_nowait((position, query))
+        answers: List[str] = ["FINAL_ANSWER: [unknown]"] * queue.qsize()
+
+        async def worker() -> None:
+            while not queue.empty():
+                position, query = queue.get_nowait()
+                session_id = f"{self.session_id or 'batch'}-{uuid.uuid4().hex[:12]}"
                 try:
-                    async with ClientSession(read, write) as session:
-                        print("[agent] Session created, initializing...")
- 
-                        try:
-                            await session.initialize()
-                            print("[agent] MCP session initialized")
-
-                            # Your reasoning, planning, perception etc. would go here
-                            tools = await session.list_tools()
-                            print("Available tools:", [t.name for t in tools.tools])
-
-                            # Get available tools
-                            print("Requesting tool list...")
-                            tools_result = await session.list_tools()
-                            tools = tools_result.tools
-                            tool_descriptions = "\n".join(
-                                f"- {tool.name}: {getattr(tool, 'description', 'No description')}" 
-                                for tool in tools
-                            )
-
-                            log("Agent:", f"{len(tools)} tools loaded")
-
-                            memory = MemoryManager()
-                            session_id = f"session-{int(time.time())}"
-                            query = user_input  # Store original intent
-                            step = 0
-
-                            while step < max_steps:
-                                log("Loop: ", f"Step {step + 1} started")
-
-                                perception = extract_perception(user_input)
-                                log("Perception: ", f"Intent: {perception.intent}, Tool hint: {perception.tool_hint}")
-
-                                retrieved = memory.retrieve(query=user_input, top_k=3, session_filter=session_id)
-                                log("Memory: ", f"Retrieved {len(retrieved)} relevant memories")
-
-                                plan = generate_plan(perception, retrieved, tool_descriptions=tool_descriptions)
-                                log("Plan: ", f"Plan generated: {plan}")
-
-                                if plan.startswith("FINAL_ANSWER:"):
-                                    log("Agent: ", f"✅ FINAL RESULT: {plan}")
-                                    break
-
-                                try:
-                                    result = await execute_tool(session, tools, plan)
-                                    log("Tool: ", f"{result.tool_name} returned: {result.result}")
-
-                                    memory.add(MemoryItem(
-                                        text=f"Tool call: {result.tool_name} with {result.arguments}, got: {result.result}",
-                                        type="tool_output",
-                                        tool_name=result.tool_name,
-                                        user_query=user_input,
-                                        tags=[result.tool_name],
-                                        session_id=session_id
-                                    ))
-
-                                    user_input = f"Original task: {query}\nPrevious output: {result.result}\nWhat should I do next?"
-
-                                except Exception as e:
-                                    log(f"Tool execution failed: {e}")
-                                    break
-
-                                step += 1
-                        except Exception as e:
-                            print(f"[agent] Session initialization error: {str(e)}")
+                    answers[position] = await self.run(query, session_id=session_id)
                 except Exception as e:
-                    print(f"[agent] Session creation error: {str(e)}")
-        except Exception as e:
-            print(f"[agent] Connection error: {str(e)}")
+                    log("Agent: ", f"Query {query!r} failed: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(answers))))))
+        elapsed = time.perf_counter() - start
+        log("Agent: ", f"Answered {len(answers)} queries in {elapsed:.1f} s ({len(answers) / elapsed:.2f} queries/s)")
+        return answers
+
+
+async def main(user_input: str, session_id: Optional[str] = None):
+    """Answer a single query with a fresh agent."""
+    try:
+        async with Agent(session_id=session_id) as agent:
+            await agent.run(user_input)
     except Exception as e:
-        print(f"[agent] Overall error: {str(e)}")
+        print(f"[agent] Error: {str(e)}")
 
     log("Agent: ", "Agent session complete.")
 
+
+async def repl(session_id: Optional[str] = None):
+    """Keep one warm agent and answer queries until an empty line, 'exit' or EOF."""
+    async with Agent(session_id=session_id) as agent:
+        while True:
+            try:
+                user_input = await asyncio.to_thread(input, "🧑 What do you want to solve today? → ")
+            except EOFError:
+                break
+            if user_input.strip().lower() in ("", "exit", "quit"):
+                break
+            try:
+                await agent.run(user_input)
+            except Exception as e:
+                print(f"[agent] Error: {str(e)}")
+
+    log("Agent: ", "Agent session complete.")
+
+async def batch(path: str, concurrency: int, llm_concurrency: int, session_id: Optional[str] = None):
+    """Answer every non-empty line of a file concurrently and print one JSON line per query."""
+    with open(path, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    async with Agent(llm_concurrency=llm_concurrency, session_id=session_id) as agent:
+        answers = await agent.run_many(queries, concurrency)
+    for query, answer in zip(queries, answers):
+        print(json.dumps({"query": query, "answer": answer}, ensure_ascii=False))
+
 if __name__ == "__main__":
-    query = input("🧑 What do you want to solve today? → ")
-    asyncio.run(main(query))
+    parser = argparse.ArgumentParser(description="Swiggy statement analysis agent")
+    parser.add_argument("question", nargs="*", help="answer this question and exit; without one, start a REPL")
+    parser.add_argument("--batch", help="file with one question per line, answered concurrently")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions in flight in batch mode")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Ollama requests in flight")
+    parser.add_argument("--session", help="keep memories under this id and only recall this session's memories")
+    args = parser.parse_args()
+
+    if args.batch:
+        asyncio.run(batch(args.batch, args.concurrency, args.llm_concurrency, args.session))
+    elif args.question:
+        asyncio.run(main(" ".join(args.question), args.session))
+    else:
+        asyncio.run(repl(args.session))
 
 
 # #Example questions you can ask:
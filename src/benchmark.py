@@ -0,0 +1,288 @@
+import argparse
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from document_processor import DocumentProcessor, PARALLEL_MIN_PAGES
+
+
+def _pdf_paths(pdf_dir: str) -> List[str]:
+    return [
+        os.path.join(pdf_dir, f)
+        for f in sorted(os.listdir(pdf_dir))
+        if f.endswith('.pdf')
+    ]
+
+
+def bench_extraction(args: argparse.Namespace) -> None:
+    """Compare serial and process-pool page extraction in pages per second."""
+    pdf_paths = _pdf_paths(args.pdf_dir)
+    if not pdf_paths:
+        print(f"No PDF files found in {args.pdf_dir}")
+        return
+
+    worker_counts = sorted({1, *args.workers})
+    baseline = None
+    print(f"{'workers':>8} {'pages':>8} {'seconds':>10} {'pages/s':>10} {'speedup':>8}")
+    for workers in worker_counts:
+        # One processor (and pool) for all files, as in an index build; pool start-up is included
+        start = time.perf_counter()
+        with DocumentProcessor(workers=workers, parallel_min_pages=args.parallel_min_pages) as processor:
+            pages = sum(len(processor.process_pdf(pdf_path)) for pdf_path in pdf_paths)
+        elapsed = time.perf_counter() - start
+
+        rate = pages / elapsed if elapsed else float("inf")
+        baseline = baseline or rate
+        print(f"{workers:>8} {pages:>8} {elapsed:>10.2f} {rate:>10.1f} {rate / baseline:>7.2f}x")
+
+
+def _percentiles(latencies_ms: List[float]) -> str:
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return f"p50 {p50:8.3f} ms  p95 {p95:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+def bench_search(args: argparse.Namespace) -> None:
+    """Per-query latency of reloading the index on every query vs. a resident SearchContext."""
+    from index_store import DocumentStore, read_index
+    from search_context import SearchContext, INDEX_FILE
+
+    context = SearchContext(args.index_dir)
+    snapshot = context.reload()
+    if snapshot is None:
+        print(f"No index found in {args.index_dir}")
+        return
+
+    # Random query vectors keep Ollama out of the measurement
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, snapshot.index.d)).astype(np.float32)
+
+    index_dir = snapshot.directory
+
+    def reload_per_query(query: np.ndarray) -> None:
+        index = read_index(os.path.join(index_dir, INDEX_FILE))
+        store = DocumentStore(index_dir)
+        _, I = index.search(query.reshape(1, -1), args.k)
+        [store.get(idx) for idx in I[0] if idx >= 0]
+
+    def resident(query: np.ndarray) -> None:
+        current = context.snapshot
+        _, I = current.search(query.reshape(1, -1), args.k)
+        [current.store.get(idx) for idx in I[0] if idx >= 0]
+
+    print(f"{snapshot.index.ntotal} vectors, {args.queries} queries, k={args.k}")
+    for name, run in (("reload per query", reload_per_query), ("resident", resident)):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            run(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>18}: {_percentiles(latencies)}")
+
+
+def bench_lexical(args: argparse.Namespace) -> None:
+    """Per-query latency of lexical, vector (embedding + search) and hybrid modes on exact-token queries."""
+    from embedding_client import EmbeddingClient
+    from search_context import SearchContext
+
+    snapshot = SearchContext(args.index_dir).reload()
+    if snapshot is None or snapshot.lexical is None:
+        print(f"No index with a lexical index found in {args.index_dir}")
+        return
+
+    # Exact-token queries sampled from the corpus vocabulary; the embedding cache is
+    # off so vector and hybrid modes pay the Ollama round trip a real new query pays
+    rng = np.random.default_rng(0)
+    vocab = list(snapshot.lexical.vocab)
+    queries = [vocab[i] for i in rng.integers(0, len(vocab), args.queries)]
+    embedder = EmbeddingClient(use_cache=False)
+
+    print(f"{len(snapshot.store)} documents, {len(vocab)} terms, {args.queries} queries, k={args.k}")
+    for mode in args.modes:
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            snapshot.rank(query, args.k, embedder.embed, mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{mode:>8}: {_percentiles(latencies)}")
+    embedder.close()
+
+
+def bench_plan(args: argparse.Namespace) -> None:
+    """Time to decision of generate_plan, streaming with early stop vs. waiting for the full generation."""
+    from decision import generate_plan
+    from perception import PerceptionResult
+
+    perception = PerceptionResult(
+        user_input=args.query,
+        intent="spending analysis",
+        tool_hint="search_documents"
+    )
+    tool_descriptions = "- search_documents: Search the indexed Swiggy statements"
+    for stream in (False, True):
+        latencies = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            generate_plan(perception, [], tool_descriptions=tool_descriptions, stream=stream)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{'streaming' if stream else 'full':>10}: {_percentiles(latencies)}")
+
+
+def bench_prefix(args: argparse.Namespace) -> None:
+    """Time to first token and prompt-eval time of plan prompts that share the static prefix vs. ones whose prefix changes every call."""
+    import json
+    import requests
+    from decision import OLLAMA_API_URL, build_plan_prompt
+    from ollama_client import KEEP_ALIVE
+    from perception import PerceptionResult
+
+    tool_descriptions = "- search_documents: Search the indexed Swiggy statements"
+
+    def time_prompt(prompt: str) -> Tuple[float, float]:
+        """Time to first token and Ollama's prompt_eval_duration, both in ms."""
+        start = time.perf_counter()
+        first_token = None
+        prompt_eval = 0.0
+        payload = {
+            "model": args.model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": KEEP_ALIVE,
+            "options": {"num_predict": 1}
+        }
+        with requests.post(OLLAMA_API_URL, json=payload, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if first_token is None and "response" in chunk:
+                    first_token = (time.perf_counter() - start) * 1000
+                if chunk.get("done"):
+                    prompt_eval = chunk.get("prompt_eval_duration", 0) / 1e6
+                    break
+        return first_token or (time.perf_counter() - start) * 1000, prompt_eval
+
+    def prompt(i: int) -> str:
+        perception = PerceptionResult(user_input=f"How much did I spend in week {i}?", intent="spending analysis")
+        return build_plan_prompt(perception, [], tool_descriptions)
+
+    # Load the model first so neither variant pays for it
+    time_prompt(prompt(0))
+    variants = (
+        # A different first line makes the whole prompt a cache miss
+        ("prefix changed", lambda i: f"Request {i}.\n" + prompt(i)),
+        ("prefix reused", prompt),
+    )
+    for name, make_prompt in variants:
+        timings = [time_prompt(make_prompt(i)) for i in range(1, args.runs + 1)]
+        print(f"{name:>15}: first token  {_percentiles([first for first, _ in timings])}")
+        print(f"{'':>15}  prompt eval  {_percentiles([evaluated for _, evaluated in timings])}")
+
+
+def _synthetic_corpus(n: int, dim: int, rng: np.random.Generator, clusters: int = 256) -> np.ndarray:
+    """Clustered Gaussian vectors, closer to real embeddings than uniform noise."""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        stop = min(n, start + 100_000)
+        labels = rng.integers(0, clusters, stop - start)
+        vectors[start:stop] = centers[labels] + 0.5 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+    return vectors
+
+
+def bench_ann(args: argparse.Namespace) -> None:
+    """Recall@k against exact flat search, plus build time and query latency, per index type."""
+    import faiss
+    from index_factory import IndexConfig, build_index, index_type_of
+
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>9} {'type':>9} {'build s':>9} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+    for n in args.sizes:
+        corpus = _synthetic_corpus(n, args.dim, rng)
+        queries = _synthetic_corpus(args.queries, args.dim, rng)
+        flat = faiss.IndexFlatL2(args.dim)
+        flat.add(corpus)
+        del corpus
+
+        start = time.perf_counter()
+        _, truth = flat.search(queries, args.k)
+        flat_ms = (time.perf_counter() - start) * 1000 / args.queries
+        print(f"{n:>9} {'flat':>9} {0.0:>9.2f} {1.0:>10.3f} {flat_ms:>9.3f}")
+
+        for index_type in args.types:
+            config = IndexConfig(type=index_type, flat_threshold=0)
+            start = time.perf_counter()
+            index = build_index(flat, config)
+            build_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            _, found = index.search(queries, args.k)
+            query_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+            recall = np.mean([
+                len(set(found[i]) & set(truth[i])) / args.k
+                for i in range(args.queries)
+            ])
+            print(f"{n:>9} {index_type_of(index):>9} {build_s:>9.2f} {recall:>10.3f} {query_ms:>9.3f}")
+            del index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the Swiggy logger")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extraction = subparsers.add_parser("extraction", help="PDF page extraction throughput")
+    extraction.add_argument("--pdf-dir", default="data/")
+    extraction.add_argument(
+        "--workers", type=int, nargs="+",
+        default=[2, 4, os.cpu_count() or 1],
+        help="worker counts to compare against the serial path"
+    )
+    extraction.add_argument(
+        "--parallel-min-pages", type=int, default=PARALLEL_MIN_PAGES,
+        help="files with fewer pages are extracted serially (2 sends every multi-page file to the pool)"
+    )
+    extraction.set_defaults(func=bench_extraction)
+
+    search = subparsers.add_parser("search", help="Per-query search latency, reload vs. resident index")
+    search.add_argument("--index-dir", default="faiss_index")
+    search.add_argument("--queries", type=int, default=200)
+    search.add_argument("--k", type=int, default=20)
+    search.set_defaults(func=bench_search)
+
+    lexical = subparsers.add_parser("lexical", help="Lexical vs. vector vs. hybrid search latency")
+    lexical.add_argument("--index-dir", default="faiss_index")
+    lexical.add_argument("--queries", type=int, default=200)
+    lexical.add_argument("--k", type=int, default=20)
+    lexical.add_argument(
+        "--modes", nargs="+", choices=["lexical", "vector", "hybrid"], default=["lexical", "vector", "hybrid"],
+        help="vector and hybrid need Ollama"
+    )
+    lexical.set_defaults(func=bench_lexical)
+
+    plan = subparsers.add_parser("plan", help="Plan generation time to decision, streaming vs. full")
+    plan.add_argument("--query", default="What is my average order value?")
+    plan.add_argument("--runs", type=int, default=10)
+    plan.set_defaults(func=bench_plan)
+
+    prefix = subparsers.add_parser("prefix", help="Time to first token with and without prompt-prefix reuse")
+    prefix.add_argument("--model", default="gemma3:1b")
+    prefix.add_argument("--runs", type=int, default=10)
+    prefix.set_defaults(func=bench_prefix)
+
+    ann = subparsers.add_parser("ann", help="ANN index recall@k and latency on synthetic corpora")
+    ann.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ann.add_argument("--types", nargs="+", default=["hnsw", "ivf_flat", "ivf_pq"])
+    ann.add_argument("--dim", type=int, default=768)
+    ann.add_argument("--queries", type=int, default=1000)
+    ann.add_argument("--k", type=int, default=10)
+    ann.set_defaults(func=bench_ann)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
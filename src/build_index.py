@@ -2,11 +2,17 @@ import os
 import json
 import numpy as np
 import faiss
-import requests
-from typing import List, Dict, Any, Tuple
-from document_processor import DocumentProcessor, Document
+from typing import List, Dict, Any, Optional, Set, Union
+from document_processor import DocumentProcessor, Document, check_chunking, chunk_document, CHUNK_SIZE, CHUNK_OVERLAP
+from embedding_client import EmbeddingClient
+from index_manifest import IndexManifest
+from link_enricher import LINK_TYPE, LinkEnricher, link_document
+from index_store import DocumentStore, StoredDocument, current_dir, new_version, version_dir, write_index, write_version
+from index_factory import IndexConfig, build_index, extend_index, index_type_of
+from order_store import OrderStore, OrderTableParser
+from spending_aggregates import SpendingAggregates
+from lexical_index import BM25Index
 import logging
-import pickle
 
 # Configure logging
 os.makedirs("logs", exist_ok=True)
@@ -29,81 +35,350 @@ console_handler.setFormatter(console_formatter)
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
+# Search index type; corpora below IndexConfig.flat_threshold are searched exactly
+INDEX_TYPE = "hnsw"
+
 class IndexBuilder:
-    def __init__(self, dimension: int = 768):
+    def __init__(
+        self,
+        dimension: int = 768,
+        extract_workers: int = 1,
+        embedder: Optional[EmbeddingClient] = None,
+        embed_batch_size: Optional[int] = None,
+        link_enricher: Optional[LinkEnricher] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        index_config: Optional[IndexConfig] = None
+    ):
         self.dimension = dimension
+        self.extract_workers = extract_workers
+        # With a chunk size each page is indexed as overlapping word chunks, one vector each
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        if chunk_size:
+            check_chunking(chunk_size, chunk_overlap)
+        self.embedder = embedder or EmbeddingClient()
+        # Enough pages per flush to keep every concurrent embedding request busy
+        self.embed_batch_size = embed_batch_size or (
+            self.embedder.batch_size * self.embedder.max_concurrency
+        )
+        # self.index is the flat master copy of every vector; it supports removal and
+        # exact rebuilds, and the configured search index is built from it on save
         self.index = faiss.IndexFlatL2(dimension)
-        self.documents: List[Document] = []
-        self.embeddings: List[np.ndarray] = []
+        self.index_config = index_config or IndexConfig(type=INDEX_TYPE)
+        # Saved search index of the loaded version; while pages are only appended, save
+        # extends it instead of rebuilding. Removing vectors renumbers them, so it is dropped
+        self._search_index_path: Optional[str] = None
+        self.link_enricher = link_enricher or LinkEnricher()
+        # Pages of a loaded index stay in its memory-mapped store; only new pages are held in memory
+        self.documents: List[Union[Document, StoredDocument]] = []
+        # Scraped text of every linked URL, stored and indexed once, referenced from page metadata
+        self.link_texts: Dict[str, str] = {}
+        # Orders parsed from statement tables, for exact analytics without the LLM
+        self.orders = OrderStore()
+        # Dashboard totals kept in step with every change to the order store
+        self.aggregates = SpendingAggregates()
+        self.manifest = IndexManifest(settings=self.settings)
+        
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap if self.chunk_size else None
+        }
         
     def get_embedding(self, text: str) -> np.ndarray:
         """Get embeddings from local Ollama server using nomic-embed-text model."""
         try:
-            response = requests.post(
-                "http://localhost:11434/api/embeddings",
-                json={
-                    "model": "nomic-embed-text",
-                    "prompt": text
-                }
-            )
-            response.raise_for_status()
-            return np.array(response.json()["embedding"], dtype=np.float32)
+            return self.embedder.embed(text)
         except Exception as e:
             logger.error(f"Error getting embedding from Ollama: {str(e)}")
             raise
 
     def process_and_embed_documents(self, pdf_files: List[str]) -> None:
-        """Process PDF files and create embeddings."""
+        """Stream pages of PDF files and embed new or changed pages in bounded batches."""
+        # One extraction pool for every file of the build, shut down at the end
+        doc_processor = DocumentProcessor(workers=self.extract_workers)
         try:
-            doc_processor = DocumentProcessor()
-            
             for pdf_file in pdf_files:
+                file_hash = IndexManifest.hash_file(pdf_file)
+                if self.manifest.is_unchanged(pdf_file, file_hash):
+                    logger.info(f"Skipping unchanged PDF file: {pdf_file}")
+                    continue
+                    
                 logger.info(f"Processing PDF file: {pdf_file}")
-                documents = doc_processor.process_pdf(pdf_file)
+                old_hashes = self.manifest.page_hashes(pdf_file)
+                existing: Dict[int, List[int]] = {}
+                for position, doc in enumerate(self.documents):
+                    if doc.source == pdf_file:
+                        existing.setdefault(doc.page, []).append(position)
+                page_hashes = []
+                stale_pages = set()
+                failed_pages = set()
+                processed_pages = set()
+                batch = []
+                urls = set()
+                new_orders = []
+                # Parse every page so tables continued across pages keep their header
+                order_parser = OrderTableParser()
                 
-                for doc in documents:
-                    try:
-                        embedding = self.get_embedding(doc.content)
-                        self.documents.append(doc)
-                        self.embeddings.append(embedding)
-                        logger.info(f"Created embedding for document from {doc.metadata['source']}")
-                    except Exception as e:
-                        logger.error(f"Error creating embedding for document: {str(e)}")
-                        continue
-            
-            if self.embeddings:
-                embeddings_array = np.stack(self.embeddings)#.astype('float32')
-                self.index.add(embeddings_array)
-                logger.info("Successfully added all embeddings to FAISS index")
+                for doc in doc_processor.iter_pdf(pdf_file):
+                    page = doc.metadata["page"]
+                    page_hash = IndexManifest.hash_text(doc.content)
+                    page_hashes.append(page_hash)
+                    urls.update(doc.metadata.get("links", []))
+                    page_orders = order_parser.parse(doc.tables, pdf_file, page)
+                    doc.tables = []
+                    
+                    # Keep pages whose content is unchanged and already embedded
+                    if page in existing:
+                        if page < len(old_hashes) and old_hashes[page] == page_hash:
+                            continue
+                        stale_pages.add(page)
+                        
+                    processed_pages.add(page)
+                    new_orders.extend(page_orders)
+                    if self.chunk_size:
+                        batch.extend(chunk_document(doc, self.chunk_size, self.chunk_overlap))
+                    else:
+                        batch.append(doc)
+                    if len(batch) >= self.embed_batch_size:
+                        failed_pages |= self._embed_and_add(batch)
+                        batch = []
+                        
+                if batch:
+                    failed_pages |= self._embed_and_add(batch)
+                    
+                # Pages that no longer exist in the new version of the file
+                stale_pages.update(page for page in existing if page >= len(page_hashes))
+                self._remove_positions([
+                    position for page in stale_pages for position in existing[page]
+                ])
+                replaced_pages = processed_pages | stale_pages
+                self.aggregates.subtract(self.orders, self.orders.rows(pdf_file, pages=replaced_pages))
+                self.orders.remove(pdf_file, pages=replaced_pages)
+                first_new = len(self.orders)
+                self.orders.add(new_orders)
+                self.aggregates.add(self.orders, np.arange(len(self.orders)) >= first_new)
+                self._index_links(urls)
+                logger.info(
+                    f"Embedded {len(processed_pages) - len(failed_pages)} new or changed pages "
+                    f"with {len(new_orders)} orders from {pdf_file} "
+                    f"({len(existing) - len(stale_pages)} unchanged, {len(stale_pages)} replaced)"
+                )
+                
+                # Failed pages get no hash so they, and the file, are retried next run
+                for page in failed_pages:
+                    page_hashes[page] = None
+                self.manifest.record(pdf_file, None if failed_pages else file_hash, page_hashes)
                 
         except Exception as e:
             logger.error(f"Error processing documents: {str(e)}")
             raise
+        finally:
+            doc_processor.close()
+
+    def remove_documents(self, sources: List[str]) -> None:
+        """Remove every page of the given source files from the index."""
+        sources = set(sources)
+        positions = [
+            position for position, doc in enumerate(self.documents)
+            if doc.source in sources
+        ]
+        self._remove_positions(positions)
+        for source in sources:
+            self.aggregates.subtract(self.orders, self.orders.rows(source))
+            self.orders.remove(source)
+            self.manifest.remove(source)
+        if positions:
+            logger.info(f"Removed {len(positions)} pages from {len(sources)} deleted files")
+            self._remove_unreferenced_links()
+
+    def sync_documents(self, pdf_files: List[str]) -> None:
+        """Bring the index in line with pdf_files: drop deleted files, embed new or changed pages."""
+        current = set(pdf_files)
+        deleted = [source for source in self.manifest.files if source not in current]
+        if deleted:
+            self.remove_documents(deleted)
+        self.process_and_embed_documents(pdf_files)
+        # Changed pages may have dropped links that deleted files did not
+        self._remove_unreferenced_links()
+
+    def _link_positions(self) -> Dict[str, List[int]]:
+        """Index positions of each indexed linked page (several when chunked), by URL."""
+        positions: Dict[str, List[int]] = {}
+        for position, doc in enumerate(self.documents):
+            if doc.type == LINK_TYPE:
+                positions.setdefault(doc.source, []).append(position)
+        return positions
+
+    def _index_links(self, urls: Set[str]) -> None:
+        """Fetch linked pages and embed each URL's text once, as its own document keyed by the URL.
+
+        A URL already indexed with the same text is skipped, however many pages
+        link to it; one whose text changed is replaced.
+        """
+        texts = self.link_enricher.enrich(urls)
+        indexed = self._link_positions()
+        changed = [url for url, text in texts.items() if url not in indexed or self.link_texts.get(url) != text]
+        self.link_texts.update(texts)
+        if not changed:
+            return
+        self._remove_positions([position for url in changed for position in indexed.get(url, [])])
+        documents = [link_document(url, texts[url]) for url in changed]
+        if self.chunk_size:
+            documents = [chunk for doc in documents for chunk in chunk_document(doc, self.chunk_size, self.chunk_overlap)]
+        added = len(self.documents)
+        self._embed_and_add(documents)
+        logger.info(f"Embedded {len({doc.source for doc in self.documents[added:]})} of {len(changed)} new or changed linked pages")
+
+    def _remove_unreferenced_links(self) -> None:
+        """Drop linked pages, and their text, that no indexed page links to any more."""
+        referenced = {url for doc in self.documents if doc.type != LINK_TYPE for url in doc.metadata.get("links", [])}
+        unreferenced = {url: positions for url, positions in self._link_positions().items() if url not in referenced}
+        self.link_texts = {url: text for url, text in self.link_texts.items() if url in referenced}
+        if unreferenced:
+            self._remove_positions([position for positions in unreferenced.values() for position in positions])
+            logger.info(f"Removed {len(unreferenced)} linked pages no statement links to")
+
+    def _embed_and_add(self, documents: List[Document]) -> Set[int]:
+        """Embed documents and append their vectors to the index; returns the pages that failed."""
+        embeddings = self.embedder.embed_many([doc.content for doc in documents])
+        added = []
+        failed_pages: Set[int] = set()
+        for doc, embedding in zip(documents, embeddings):
+            if embedding is None:
+                logger.error(f"Error creating embedding for document from {doc.metadata['source']}")
+                failed_pages.add(doc.metadata["page"])
+                continue
+            self.documents.append(doc)
+            added.append(embedding)
+            
+        if added:
+            self.index.add(np.stack(added))
+        return failed_pages
+
+    def _remove_positions(self, positions: List[int]) -> None:
+        """Remove vectors and documents at the given index positions."""
+        if not positions:
+            return
+        self.index.remove_ids(np.array(positions, dtype=np.int64))
+        self._search_index_path = None
+        removed = set(positions)
+        self.documents = [doc for i, doc in enumerate(self.documents) if i not in removed]
+
+    def load_index(self, index_dir: str = "faiss_index") -> bool:
+        """Load a previously saved index for an incremental update; False if none is usable."""
+        directory = current_dir(index_dir)
+        if directory is None:
+            logger.info(f"No published index in {index_dir}, building from scratch")
+            return False
+        manifest = IndexManifest.load(directory)
+        # Non-flat search indexes are saved alongside their flat master copy
+        index_path = os.path.join(directory, "vectors.index")
+        if not os.path.exists(index_path):
+            index_path = os.path.join(directory, "swiggy.index")
+        if manifest is None or not os.path.exists(index_path) or not DocumentStore.exists(directory):
+            logger.info(f"No incremental index state in {index_dir}, building from scratch")
+            return False
+            
+        try:
+            index = faiss.read_index(index_path)
+            store = DocumentStore(directory)
+            documents = [StoredDocument(store, position) for position in range(len(store))]
+            orders = OrderStore.load(directory)
+            aggregates = SpendingAggregates.load(directory)
+        except Exception as e:
+            logger.error(f"Error loading index from {index_dir}: {str(e)}")
+            return False
+            
+        if manifest.settings != self.settings:
+            logger.info(f"Index in {index_dir} was built with {manifest.settings}, rebuilding with {self.settings}")
+            return False
+        if (
+            orders is None
+            or aggregates is None
+            or aggregates.orders != len(orders)
+            or index_type_of(index) != "flat"
+            or index.ntotal != len(documents)
+            or index.d != self.dimension
+        ):
+            logger.warning(f"Index in {index_dir} is inconsistent, building from scratch")
+            return False
+            
+        self.index = index
+        self.documents = documents
+        self.orders = orders
+        self._search_index_path = self._reusable_search_index(directory)
+        self.aggregates = aggregates
+        self.manifest = manifest
+        links_path = os.path.join(directory, "links.json")
+        if os.path.exists(links_path):
+            with open(links_path, "r", encoding="utf-8") as f:
+                self.link_texts = json.load(f)
+        logger.info(f"Loaded {len(self.documents)} indexed pages from {index_dir}")
+        return True
+
+    def _reusable_search_index(self, directory: str) -> Optional[str]:
+        """Path of the non-flat search index saved in directory, if the current config builds the same kind."""
+        meta_path = os.path.join(directory, "index_meta.json")
+        if not os.path.exists(os.path.join(directory, "vectors.index")) or not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            saved_config = IndexConfig.from_dict(json.load(f)["config"])
+        return os.path.join(directory, "swiggy.index") if saved_config.builds_like(self.index_config) else None
 
     def save_index(self, index_dir: str = "faiss_index") -> None:
-        """Save the FAISS index and related data."""
+        """Save the FAISS index and related data as a new version of index_dir."""
         try:
-            os.makedirs(index_dir, exist_ok=True)
+            # Everything goes to a fresh version directory, published at the end
+            version = new_version()
+            directory = version_dir(index_dir, version)
+            os.makedirs(directory)
             
-            # Save FAISS index
-            faiss.write_index(self.index, os.path.join(index_dir, "swiggy.index"))
+            # Save FAISS search index: the loaded one extended with appended vectors, or else built from the flat master copy
+            search_index = None
+            if self._search_index_path is not None:
+                search_index = extend_index(faiss.read_index(self._search_index_path), self.index, self.index_config)
+            extended = search_index is not None
+            if not extended:
+                search_index = build_index(self.index, self.index_config)
+            index_type = index_type_of(search_index)
+            if search_index is not self.index:
+                write_index(self.index, os.path.join(directory, "vectors.index"))
+            write_index(search_index, os.path.join(directory, "swiggy.index"))
+            with open(os.path.join(directory, "index_meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "index_type": index_type,
+                    "config": self.index_config.to_dict(),
+                    "dimension": self.dimension,
+                    "ntotal": search_index.ntotal
+                }, f, indent=2)
+            logger.info(f"{'Extended' if extended else 'Built'} {index_type} search index over {search_index.ntotal} vectors")
             
-            # Save documents and their metadata
-            documents_data = [
-                {
-                    "content": doc.content,
-                    "metadata": doc.metadata
-                }
-                for doc in self.documents
-            ]
+            # Save documents and their metadata in the memory-mappable store format
+            DocumentStore.write(directory, self.documents)
             
-            with open(os.path.join(index_dir, "documents.pkl"), "wb") as f:
-                pickle.dump(documents_data, f)
-                
-            # Save embeddings
-            np.save(os.path.join(index_dir, "embeddings.npy"), np.array(self.embeddings))
+            # Save the BM25 inverted index over the same positions for lexical and hybrid search
+            BM25Index.build(doc.content for doc in self.documents).save(directory)
+            
+            # Save scraped link text once per URL for get_linked_content
+            with open(os.path.join(directory, "links.json"), "w", encoding="utf-8") as f:
+                json.dump(self.link_texts, f)
+            
+            # Save the columnar order store and its spending aggregates next to the index
+            self.orders.save(directory)
+            self.aggregates.save(directory)
+            
+            # Save content hashes for incremental rebuilds
+            self.manifest.save(directory)
+            
+            # Publish the new version last so running servers swap in a complete snapshot;
+            # this also drops versions older than the previous one
+            write_version(index_dir, version)
+            self._search_index_path = os.path.join(directory, "swiggy.index") if search_index is not self.index else None
             
-            logger.info(f"Successfully saved index and data to {index_dir}")
+            logger.info(f"Successfully saved index and data to {directory}")
             
         except Exception as e:
             logger.error(f"Error saving index: {str(e)}")
@@ -125,11 +400,18 @@ def main():
     
     try:
         # Initialize and build index
-        builder = IndexBuilder()
-        builder.process_and_embed_documents(pdf_paths)
+        builder = IndexBuilder(
+            extract_workers=os.cpu_count() or 1,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        builder.load_index()
+        builder.sync_documents(pdf_paths)
         
         # Save the index and related data
         builder.save_index()
+        if builder.embedder.cache is not None:
+            logger.info(f"Embedding cache: {builder.embedder.cache.stats()}")
         logger.info("Index building completed successfully")
         
     except Exception as e:
@@ -1,10 +1,15 @@
 from perception import PerceptionResult
 from memory import MemoryItem
 from typing import List, Optional
+from contextlib import aclosing
 from dotenv import load_dotenv
 import os
+import json
+import time
 import requests
 import logging
+from ollama_client import KEEP_ALIVE, OllamaClient, log_timings
+from prompt_templates import PLAN_TEMPLATE
 
 # Optional: import log from agent if shared, else define locally
 try:
@@ -38,87 +43,159 @@ except ImportError:
 # Ollama API endpoint
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 
-def generate_plan(
+DECISION_PREFIXES = ("FUNCTION_CALL:", "FINAL_ANSWER:")
+
+
+class DecisionScanner:
+    """Finds the first complete FUNCTION_CALL/FINAL_ANSWER line in streamed LLM output.
+
+    A line counts once its newline has arrived (or the generation is done),
+    so a decision is never returned with its parameters cut off.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._scanned = 0
+        self._start = time.perf_counter()
+        self._first_token: Optional[float] = None
+
+    def feed(self, chunk: str, done: bool = False) -> Optional[str]:
+        if chunk and self._first_token is None:
+            self._first_token = time.perf_counter()
+        self.text += chunk
+        end = len(self.text) if done else self.text.rfind("\n") + 1
+        if end <= self._scanned:
+            return None
+        lines = self.text[self._scanned:end].splitlines()
+        self._scanned = end
+        for line in lines:
+            if line.strip().startswith(DECISION_PREFIXES):
+                return line.strip()
+        return None
+
+    def log_timing(self, decision: Optional[str], done: bool) -> None:
+        """Time to first token and to decision; early stops mean the rest of the generation was never paid for."""
+        elapsed = (time.perf_counter() - self._start) * 1000
+        first_token = (self._first_token - self._start) * 1000 if self._first_token else elapsed
+        if decision is None:
+            log("plan", f"No decision line, generation finished after {elapsed:.0f} ms (first token {first_token:.0f} ms)")
+        else:
+            ending = "generation finished" if done else "rest of the generation cancelled"
+            log("plan", f"Decision after {elapsed:.0f} ms (first token {first_token:.0f} ms), {ending}")
+
+def build_plan_prompt(
     perception: PerceptionResult,
     memory_items: List[MemoryItem],
     tool_descriptions: Optional[str] = None
 ) -> str:
-    """Generates a plan (tool call or final answer) using LLM based on structured perception and memory."""
-
     memory_texts = "\n".join(f"- {m.text}" for m in memory_items) or "None"
 
     tool_context = f"\nYou have access to the following tools:\n{tool_descriptions}" if tool_descriptions else ""
 
-    prompt = f"""
-You are a reasoning-driven AI agent with access to tools. Your job is to solve the user's request step-by-step by reasoning through the problem, selecting a tool if needed, and continuing until the FINAL_ANSWER is produced.{tool_context}
-
-Always follow this loop:
-
-1. Think step-by-step about the problem.
-2. If a tool is needed, respond using the format:
-   FUNCTION_CALL: tool_name|param1=value1|param2=value2
-3. When the final answer is known, respond using:
-   FINAL_ANSWER: [your final result]
-
-Guidelines:
-- Respond using EXACTLY ONE of the formats above per step.
-- Do NOT include extra text, explanation, or formatting.
-- Use nested keys (e.g., input.string) and square brackets for lists.
-- You can reference these relevant memories:
-{memory_texts}
-
-Input Summary:
-- User input: "{perception.user_input}"
-- Intent: {perception.intent}
-- Entities: {', '.join(perception.entities)}
-- Tool hint: {perception.tool_hint or 'None'}
-
-✅ Examples:
-- FUNCTION_CALL: add|a=5|b=3
-- FUNCTION_CALL: strings_to_chars_to_int|input.string=INDIA
-- FUNCTION_CALL: int_list_to_exponential_sum|input.int_list=[73,78,68,73,65]
-- FINAL_ANSWER: [42]
-
-✅ Examples:
-- User asks: "What's the relationship between Cricket and Sachin Tendulkar"
-  - FUNCTION_CALL: search_documents|query="relationship between Cricket and Sachin Tendulkar"
-  - [receives a detailed document]
-  - FINAL_ANSWER: [Sachin Tendulkar is widely regarded as the "God of Cricket" due to his exceptional skills, longevity, and impact on the sport in India. He is the leading run-scorer in both Test and ODI cricket, and the first to score 100 centuries in international cricket. His influence extends beyond his statistics, as he is seen as a symbol of passion, perseverance, and a national icon. ]
-
-
-IMPORTANT:
-- 🚫 Do NOT invent tools. Use only the tools listed below.
-- 📄 If the question may relate to factual knowledge, use the 'search_documents' tool to look for the answer.
-- 🧮 If the question is mathematical or needs calculation, use the appropriate math tool.
-- 🤖 If the previous tool output already contains factual information, DO NOT search again. Instead, summarize the relevant facts and respond with: FINAL_ANSWER: [your answer]
-- Only repeat `search_documents` if the last result was irrelevant or empty.
-- ❌ Do NOT repeat function calls with the same parameters.
-- ❌ Do NOT output unstructured responses.
-- 🧠 Think before each step. Verify intermediate results mentally before proceeding.
-- 💥 If unsure or no tool fits, skip to FINAL_ANSWER: [unknown]
-- ✅ You have only 3 attempts. Final attempt must be FINAL_ANSWER]
-"""
+    return PLAN_TEMPLATE.render(
+        {"tool_context": tool_context},
+        memory_texts=memory_texts,
+        user_input=perception.user_input,
+        intent=perception.intent,
+        entities=', '.join(perception.entities),
+        tool_hint=perception.tool_hint or 'None'
+    )
+
+
+def parse_plan(raw: str) -> str:
+    """First FUNCTION_CALL/FINAL_ANSWER line of the LLM output, or the whole output if there is none."""
+    log("plan", f"LLM output: {raw}")
+
+    for line in raw.splitlines():
+        if line.strip().startswith(DECISION_PREFIXES):
+            return line.strip()
+
+    return raw.strip()
+
+
+def generate_plan(
+    perception: PerceptionResult,
+    memory_items: List[MemoryItem],
+    tool_descriptions: Optional[str] = None,
+    stream: bool = True
+) -> str:
+    """Generates a plan (tool call or final answer) using LLM based on structured perception and memory.
+
+    When streaming, returns as soon as the first decision line is complete and
+    closes the connection, which stops Ollama from generating the rest.
+    """
+
+    prompt = build_plan_prompt(perception, memory_items, tool_descriptions)
 
     try:
         # Call Ollama API
+        start = time.perf_counter()
         response = requests.post(
             OLLAMA_API_URL,
             json={
                 "model": "gemma3:1b",
                 "prompt": prompt,
-                "stream": False
-            }
+                "stream": stream,
+                "keep_alive": KEEP_ALIVE
+            },
+            stream=stream
         )
         response.raise_for_status()
-        raw = response.json()["response"].strip()
-        log("plan", f"LLM output: {raw}")
+        if not stream:
+            data = response.json()
+            log("plan", f"Decision after {(time.perf_counter() - start) * 1000:.0f} ms (full generation)")
+            log_timings("plan", data)
+            return parse_plan(data["response"].strip())
+
+        scanner = DecisionScanner()
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                log_timings("plan", chunk)
+                decision = scanner.feed(chunk.get("response", ""), chunk.get("done", False))
+                if decision is not None:
+                    log("plan", f"LLM output: {scanner.text.strip()}")
+                    scanner.log_timing(decision, chunk.get("done", False))
+                    return decision
+        scanner.log_timing(None, True)
+        return parse_plan(scanner.text.strip())
 
-        for line in raw.splitlines():
-            if line.strip().startswith("FUNCTION_CALL:") or line.strip().startswith("FINAL_ANSWER:"):
-                return line.strip()
+    except Exception as e:
+        log("plan", f"⚠️ Decision generation failed: {e}")
+        return "FINAL_ANSWER: [unknown]"
 
-        return raw.strip()
 
+async def generate_plan_async(
+    perception: PerceptionResult,
+    memory_items: List[MemoryItem],
+    client: OllamaClient,
+    tool_descriptions: Optional[str] = None,
+    stream: bool = True
+) -> str:
+    """generate_plan over the shared async Ollama client, without blocking the event loop."""
+    prompt = build_plan_prompt(perception, memory_items, tool_descriptions)
+    try:
+        if not stream:
+            start = time.perf_counter()
+            data = await client.generate(prompt, model="gemma3:1b")
+            log("plan", f"Decision after {(time.perf_counter() - start) * 1000:.0f} ms (full generation)")
+            log_timings("plan", data)
+            return parse_plan(data["response"].strip())
+
+        scanner = DecisionScanner()
+        # aclosing closes the stream on early return, which cancels the generation server-side
+        async with aclosing(client.stream_generate(prompt, model="gemma3:1b")) as chunks:
+            async for chunk in chunks:
+                log_timings("plan", chunk)
+                decision = scanner.feed(chunk.get("response", ""), chunk.get("done", False))
+                if decision is not None:
+                    log("plan", f"LLM output: {scanner.text.strip()}")
+                    scanner.log_timing(decision, chunk.get("done", False))
+                    return decision
+        scanner.log_timing(None, True)
+        return parse_plan(scanner.text.strip())
     except Exception as e:
         log("plan", f"⚠️ Decision generation failed: {e}")
         return "FINAL_ANSWER: [unknown]"
@@ -1,11 +1,13 @@
 import fitz
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Tuple
-from dataclasses import dataclass
+import re
+from typing import List, Dict, Any, Tuple, Iterator, Optional
+from dataclasses import dataclass, field
 import logging
 import os
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 # Configure logging
 os.makedirs("logs", exist_ok=True)
@@ -28,79 +30,154 @@ console_handler.setFormatter(console_formatter)
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 40
+# Files with fewer pages are extracted in-process: handing them to the pool costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
 @dataclass
 class Document:
     content: str
     metadata: Dict[str, Any]
+    # Raw extracted table cells; used to build the order store, not persisted with the index
+    tables: List[List[List[str]]] = field(default_factory=list)
+
+    @property
+    def source(self) -> str:
+        return self.metadata["source"]
+
+    @property
+    def page(self) -> int:
+        return self.metadata["page"]
+
+    @property
+    def type(self) -> str:
+        return self.metadata.get("type", "")
     
 class DocumentProcessor:
-    def __init__(self):
-        self.documents: List[Document] = []
+    """Extracts pages of PDF files, in-process or across a process pool.
+
+    The pool is started on first use and shared by every file this processor
+    handles, so a build pays the worker start-up once; close() (or leaving a
+    with block) shuts it down.
+    """
+
+    def __init__(self, workers: int = 1, parallel_min_pages: int = PARALLEL_MIN_PAGES):
+        self.workers = max(1, workers)
+        self.parallel_min_pages = max(2, parallel_min_pages)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "DocumentProcessor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
         
     def process_pdf(self, pdf_path: str) -> List[Document]:
         """Process PDF and extract text, tables, and links."""
+        return list(self.iter_pdf(pdf_path))
+        
+    def iter_pdf(self, pdf_path: str) -> Iterator[Document]:
+        """Yield one Document per page, in page order, as pages are extracted."""
         try:
             logger.info(f"Processing PDF: {pdf_path}")
             doc = fitz.open(pdf_path)
+            page_count = len(doc)
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Extract regular text
-                text = page.get_text()
-                
-                # Extract tables
-                tables = self._extract_tables(page)
-                tables_text = self._format_tables(tables)
-                
-                # Extract links
-                links = page.get_links()
-                link_texts = []
-                
-                for link in links:
-                    if "uri" in link:
-                        try:
-                            link_content = self._scrape_link(link["uri"])
-                            link_texts.append(link_content)
-                        except Exception as e:
-                            logger.error(f"Error scraping link {link['uri']}: {str(e)}")
+            if self.workers > 1 and page_count >= self.parallel_min_pages:
+                doc.close()
+                yield from self._iter_pages_parallel(pdf_path, page_count)
+            else:
+                try:
+                    for page_num in range(page_count):
+                        yield self._process_page(doc[page_num], pdf_path, page_num)
+                finally:
+                    doc.close()
                 
-                # Combine all content
-                combined_content = f"{text}\n\nTABLES:\n{tables_text}\n\nLINKED CONTENT:\n" + "\n".join(link_texts)
-                
-                # Create structured metadata
-                metadata = {
-                    "source": pdf_path,
-                    "page": page_num,
-                    "type": "statement",
-                    "has_tables": bool(tables),
-                    "table_count": len(tables),
-                    "link_count": len(links)
-                }
-                
-                # Add table metadata if present
-                if tables:
-                    metadata["tables"] = [
-                        {
-                            "row_count": len(table),
-                            "col_count": len(table[0]) if table else 0
-                        }
-                        for table in tables
-                    ]
-                
-                document = Document(
-                    content=combined_content,
-                    metadata=metadata
-                )
-                self.documents.append(document)
-                
-            logger.info(f"Successfully processed PDF with {len(doc)} pages")
-            return self.documents
+            logger.info(f"Successfully processed PDF with {page_count} pages")
             
         except Exception as e:
             logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
             raise
             
+    def _iter_pages_parallel(self, pdf_path: str, page_count: int) -> Iterator[Document]:
+        """Extract pages across a process pool, yielding them in page order."""
+        # Several small ranges per worker keep the pool busy when some pages
+        # (large tables, many links) are much slower than others.
+        range_count = min(page_count, self.workers * 4)
+        bounds = [page_count * i // range_count for i in range(range_count + 1)]
+        ranges = iter([(bounds[i], bounds[i + 1]) for i in range(range_count)])
+        
+        logger.info(f"Extracting {page_count} pages with {self.workers} workers")
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        executor = self._executor
+        # Bound the ranges in flight so extracted pages never pile up
+        # faster than the consumer takes them.
+        pending = deque(
+            executor.submit(_process_page_range, pdf_path, start, stop)
+            for start, stop in islice(ranges, self.workers * 2)
+        )
+        try:
+            while pending:
+                documents = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(executor.submit(_process_page_range, pdf_path, *next_range))
+                yield from documents
+        finally:
+            # A consumer that stops early leaves no queued work behind on the shared pool
+            for future in pending:
+                future.cancel()
+            
+    def _process_page(self, page: fitz.Page, pdf_path: str, page_num: int) -> Document:
+        """Extract text, tables, and links from a single page."""
+        # Extract regular text
+        text = page.get_text()
+        
+        # Extract tables
+        tables = self._extract_tables(page)
+        tables_text = self._format_tables(tables)
+        
+        # Extract links; their content is fetched once per document by LinkEnricher
+        links = page.get_links()
+        uris = list(dict.fromkeys(link["uri"] for link in links if "uri" in link))
+        
+        # Combine all content
+        combined_content = f"{text}\n\nTABLES:\n{tables_text}\n\nLINKS:\n" + "\n".join(uris)
+        
+        # Create structured metadata
+        metadata = {
+            "source": pdf_path,
+            "page": page_num,
+            "type": "statement",
+            "has_tables": bool(tables),
+            "table_count": len(tables),
+            "link_count": len(links),
+            "links": uris
+        }
+        
+        # Add table metadata if present
+        if tables:
+            metadata["tables"] = [
+                {
+                    "row_count": len(table),
+                    "col_count": len(table[0]) if table else 0
+                }
+                for table in tables
+            ]
+        
+        return Document(
+            content=combined_content,
+            metadata=metadata,
+            tables=tables
+        )
+            
     def _extract_tables(self, page: fitz.Page) -> List[List[List[str]]]:
         """Extract tables from a PDF page using PyMuPDF."""
         try:
@@ -164,26 +241,75 @@ class DocumentProcessor:
             formatted_text.append("")
             
         return "\n".join(formatted_text)
-            
-    def _scrape_link(self, url: str) -> str:
-        """Scrape content from a link."""
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-                
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            return text
-            
-        except Exception as e:
-            logger.error(f"Error scraping URL {url}: {str(e)}")
-            return "" 
+
+
+def _process_page_range(pdf_path: str, start: int, stop: int) -> List[Document]:
+    """Worker entry point: extract pages [start, stop) from its own document handle."""
+    processor = DocumentProcessor()
+    doc = fitz.open(pdf_path)
+    try:
+        return [
+            processor._process_page(doc[page_num], pdf_path, page_num)
+            for page_num in range(start, stop)
+        ]
+    finally:
+        doc.close()
+
+
+def check_chunking(size: int, overlap: int) -> None:
+    if not size > overlap >= 0:
+        raise ValueError(f"Chunk size must exceed the overlap and the overlap must not be negative (size={size}, overlap={overlap})")
+
+
+def iter_chunks(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[Tuple[int, str]]:
+    """Return an iterator of (character offset, chunk) windows of `size` words overlapping by `overlap` words.
+
+    Each chunk is a slice of the original text, so line and table layout survive.
+    """
+    check_chunking(size, overlap)
+    return _iter_chunks(text, size, overlap)
+
+
+def _iter_chunks(text: str, size: int, overlap: int) -> Iterator[Tuple[int, str]]:
+    words = [match.span() for match in re.finditer(r"\S+", text)]
+    for i in range(0, len(words), size - overlap):
+        window = words[i:i+size]
+        yield window[0][0], text[window[0][0]:window[-1][1]]
+        if i + size >= len(words):
+            break
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    for _, chunk in iter_chunks(text, size, overlap):
+        yield chunk
+
+
+def chunk_document(document: Document, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Document]:
+    """Split a page into overlapping chunk Documents that keep the page metadata plus their position."""
+    return [
+        Document(
+            content=chunk,
+            metadata={**document.metadata, "chunk": chunk_num, "offset": offset}
+        )
+        for chunk_num, (offset, chunk) in enumerate(iter_chunks(document.content, size, overlap))
+    ]
+
+
+def merge_chunks(chunks: List[Document]) -> str:
+    """Stitch chunks of one page back together on their character offsets, dropping overlapping text."""
+    if len(chunks) == 1:
+        return chunks[0].content
+    merged = []
+    end = None
+    for chunk in sorted(chunks, key=lambda c: c.metadata.get("offset", 0)):
+        offset = chunk.metadata.get("offset", 0)
+        if end is None:
+            merged.append(chunk.content)
+        elif offset > end:
+            # The text between two retrieved chunks is not known
+            merged.append(" ... " + chunk.content)
+        else:
+            # Adjacent chunks are slices of the same page, so the overlap is exactly end - offset characters
+            merged.append(chunk.content[end - offset:])
+        end = max(end or 0, offset + len(chunk.content))
+    return "".join(merged)
@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+from embedding_cache import EmbeddingCache
+import logging
+
+if TYPE_CHECKING:
+    from ollama_client import OllamaClient
+
+# Configure logging
+os.makedirs("logs", exist_ok=True)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# File handler
+file_handler = logging.FileHandler("logs/embedding_client.log")
+file_handler.setLevel(logging.INFO)
+file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler.setFormatter(file_formatter)
+
+# Console handler
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_formatter = logging.Formatter('%(levelname)s: %(message)s')
+console_handler.setFormatter(console_formatter)
+
+# Add handlers to logger
+logger.addHandler(file_handler)
+logger.addHandler(console_handler)
+
+OLLAMA_URL = "http://localhost:11434"
+EMBED_MODEL = "nomic-embed-text"
+
+
+def is_missing_model(response: requests.Response) -> bool:
+    """Whether an Ollama 404 means the model is not pulled, rather than that the endpoint does not exist."""
+    text = response.text.lower()
+    return "model" in text and "not found" in text
+
+
+class EmbeddingClient:
+    """Ollama embedding client with keep-alive connections, batching and per-item retries.
+
+    Texts are sent in batches to the `/api/embed` endpoint, with several batches
+    in flight at once. A batch that keeps failing is split and each text retried
+    on its own, so one bad input does not cost the whole batch. Servers without
+    `/api/embed` fall back to concurrent single-text `/api/embeddings` calls.
+    Embeddings are looked up in, and written back to, a shared on-disk
+    EmbeddingCache, so only texts never seen before reach Ollama.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        model: str = EMBED_MODEL,
+        batch_size: int = 32,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        timeout: float = 120.0,
+        use_cache: bool = True,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.timeout = timeout
+        self._use_legacy_endpoint = False
+        self.cache = cache if cache is not None or not use_cache else EmbeddingCache()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text, raising if it cannot be embedded."""
+        embedding = self.embed_many([text])[0]
+        if embedding is None:
+            raise RuntimeError("Failed to get embedding from Ollama")
+        return embedding
+
+    def embed_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Embed texts in order; entries that still fail after retries are None."""
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        results = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(
+            text for text, result in zip(texts, results) if result is None
+        ))
+        if missing:
+            embedded = dict(zip(missing, self._embed_uncached(missing)))
+            stored = [text for text in missing if embedded[text] is not None]
+            self.cache.put_many(self.model, stored, [embedded[text] for text in stored])
+            results = [
+                result if result is not None else embedded[text]
+                for text, result in zip(texts, results)
+            ]
+        return results
+
+    async def aembed(self, text: str, client: "OllamaClient") -> np.ndarray:
+        """Embed a single text through an async OllamaClient, sharing this client's cache.
+
+        The cache is SQLite, so its reads and writes run in worker threads, off the event loop.
+        """
+        if self.cache is not None:
+            cached = (await asyncio.to_thread(self.cache.get_many, self.model, [text]))[0]
+            if cached is not None:
+                return cached
+        embedding = (await client.embed([text], self.model))[0]
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put_many, self.model, [text], [embedding])
+        return embedding
+
+    def _embed_uncached(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if self._use_legacy_endpoint:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                return list(executor.map(self._embed_single, texts))
+
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = executor.map(self._embed_batch, batches)
+            return [embedding for batch in results for embedding in batch]
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _embed_batch(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if not self._use_legacy_endpoint:
+            try:
+                return self._post_batch(texts)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404 and is_missing_model(e.response):
+                    # Every text would fail the same way, on either endpoint
+                    logger.error(f"Ollama has no model {self.model!r}; pull it with `ollama pull {self.model}`")
+                    return [None] * len(texts)
+                if e.response is not None and e.response.status_code == 404:
+                    logger.info("Ollama has no /api/embed endpoint, using /api/embeddings")
+                    self._use_legacy_endpoint = True
+                else:
+                    logger.error(f"Embedding batch of {len(texts)} failed: {str(e)}")
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} failed: {str(e)}")
+
+        # Retry every item on its own so a single failure only loses that item
+        return [self._embed_single(text) for text in texts]
+
+    def _embed_single(self, text: str) -> Optional[np.ndarray]:
+        try:
+            if self._use_legacy_endpoint:
+                data = self._post("/api/embeddings", {"model": self.model, "prompt": text})
+                embedding = np.array(data["embedding"], dtype=np.float32)
+                # /api/embed returns unit vectors; keep both endpoints comparable
+                norm = np.linalg.norm(embedding)
+                return embedding / norm if norm else embedding
+            return self._post_batch([text])[0]
+        except Exception as e:
+            logger.error(f"Error getting embedding from Ollama: {str(e)}")
+            return None
+
+    def _post_batch(self, texts: List[str]) -> List[np.ndarray]:
+        data = self._post("/api/embed", {"model": self.model, "input": texts})
+        embeddings = data["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return [np.array(embedding, dtype=np.float32) for embedding in embeddings]
+
+    def _post(self, path: str, payload: dict) -> dict:
+        for attempt in range(self.max_retries):
+            try:
+                response = self.session.post(
+                    f"{self.base_url}{path}",
+                    json=payload,
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                return response.json()
+            except requests.HTTPError as e:
+                # Client errors will not succeed on retry
+                status = e.response.status_code if e.response is not None else None
+                if (status is not None and 400 <= status < 500) or attempt == self.max_retries - 1:
+                    raise
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries - 1:
+                    raise
+            time.sleep(0.5 * 2 ** attempt)
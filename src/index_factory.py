@@ -0,0 +1,168 @@
+import os
+import math
+import numpy as np
+import faiss
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+@dataclass
+class IndexConfig:
+    """How to build the search index; small corpora always fall back to flat search."""
+    type: str = "flat"
+    # Below this many vectors brute force is fast enough and exact
+    flat_threshold: int = 10_000
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    # The smallest setting with recall@10 >= 0.95 at 100k vectors in `benchmark.py ann` (0.971)
+    ef_search: int = 512
+    # IVF; nlist defaults to ~4 * sqrt(n)
+    nlist: Optional[int] = None
+    # The smallest setting with recall@10 >= 0.95 at 100k vectors in `benchmark.py ann` (0.966)
+    nprobe: int = 32
+    # PQ; the dimension must be divisible by pq_m
+    pq_m: int = 16
+    pq_bits: int = 8
+    # Vectors sampled to train IVF/PQ quantizers
+    max_train_size: int = 100_000
+
+    def __post_init__(self):
+        if self.type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.type}', expected one of {INDEX_TYPES}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexConfig":
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+    def nlist_for(self, n: int) -> int:
+        return self.nlist or max(1, int(4 * math.sqrt(n)))
+
+    def min_vectors(self, n: int) -> int:
+        """Vectors needed before the configured type is used instead of flat search."""
+        if self.type == "flat":
+            return 0
+        required = self.flat_threshold
+        if self.type in ("ivf_flat", "ivf_pq"):
+            # k-means wants ~39 training points per centroid
+            required = max(required, 39 * self.nlist_for(n))
+        if self.type == "ivf_pq":
+            required = max(required, 39 * 2 ** self.pq_bits)
+        return required
+
+    def effective_type(self, n: int) -> str:
+        return self.type if n >= self.min_vectors(n) else "flat"
+
+    def builds_like(self, other: "IndexConfig") -> bool:
+        """Whether both configs build the same index; search-time parameters may differ."""
+        search_only = ("ef_search", "nprobe")
+        mine, theirs = self.to_dict(), other.to_dict()
+        return all(mine[key] == theirs[key] for key in mine if key not in search_only)
+
+
+def create_index(dimension: int, config: IndexConfig, n: int = 0) -> faiss.Index:
+    """Create an empty index of the type the config calls for at corpus size n."""
+    index_type = config.effective_type(n)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, config.nlist_for(n))
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, config.nlist_for(n), config.pq_m, config.pq_bits)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+    configure_search(index, config)
+    return index
+
+
+def configure_search(index: faiss.Index, config: IndexConfig) -> None:
+    """Apply search-time parameters (efSearch, nprobe) for the index's type."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.nprobe
+
+
+def search_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters restricting a search to selector, keeping the index's own efSearch / nprobe."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def read_index(path: str) -> faiss.Index:
+    """Read a FAISS index memory-mapped and read-only, falling back to a plain read."""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def write_index(index: faiss.Index, path: str) -> None:
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_index(source: faiss.Index, config: IndexConfig, batch_size: int = 100_000) -> faiss.Index:
+    """Build the configured index from the vectors of a flat source index.
+
+    Training uses an evenly spaced sample of at most max_train_size vectors and
+    vectors are copied in batches, so the corpus is never duplicated in memory
+    at once.
+    """
+    n = source.ntotal
+    if config.effective_type(n) == "flat":
+        return source
+
+    index = create_index(source.d, config, n)
+    if not index.is_trained:
+        sample_ids = np.linspace(0, n - 1, num=min(n, config.max_train_size), dtype=np.int64)
+        index.train(source.reconstruct_batch(np.unique(sample_ids)))
+
+    for start in range(0, n, batch_size):
+        index.add(source.reconstruct_n(start, min(batch_size, n - start)))
+    configure_search(index, config)
+    return index
+
+
+def extend_index(index: faiss.Index, source: faiss.Index, config: IndexConfig, batch_size: int = 100_000) -> Optional[faiss.Index]:
+    """Add the vectors of source past index.ntotal to an index built from its first vectors.
+
+    Returns None when the index has to be rebuilt instead: the corpus grew into
+    another type, or an IVF index has less than half the lists the corpus now
+    warrants, so its lists have grown too long to probe cheaply.
+    """
+    n = source.ntotal
+    if index.ntotal > n or index.d != source.d or index_type_of(index) != config.effective_type(n):
+        return None
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and 2 * ivf.nlist < config.nlist_for(n):
+        return None
+    for start in range(index.ntotal, n, batch_size):
+        index.add(source.reconstruct_n(start, min(batch_size, n - start)))
+    configure_search(index, config)
+    return index
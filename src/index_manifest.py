@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Any
+
+MANIFEST_FILE = "manifest.json"
+
+
+class IndexManifest:
+    """Content hashes of every indexed file and page, used for incremental rebuilds.
+
+    `settings` records how the index was built (e.g. chunking); an index built
+    with different settings cannot be updated incrementally.
+    """
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, Dict[str, Any]]] = None,
+        settings: Optional[Dict[str, Any]] = None
+    ):
+        self.files: Dict[str, Dict[str, Any]] = files or {}
+        self.settings: Dict[str, Any] = settings or {}
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def is_unchanged(self, path: str, file_hash: str) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry.get("sha256") == file_hash
+
+    def page_hashes(self, path: str) -> List[str]:
+        return self.files.get(path, {}).get("pages", [])
+
+    def record(self, path: str, file_hash: Optional[str], page_hashes: List[str]) -> None:
+        """Record a processed file; a None file hash forces the file to be revisited."""
+        self.files[path] = {"sha256": file_hash, "pages": page_hashes}
+
+    def remove(self, path: str) -> None:
+        self.files.pop(path, None)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["IndexManifest"]:
+        path = os.path.join(index_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["files"], data.get("settings"))
+
+    def save(self, index_dir: str) -> None:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, indent=2)
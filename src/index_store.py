@@ -0,0 +1,228 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+from document_processor import Document
+from index_factory import read_index, write_index
+
+CONTENT_FILE = "documents.bin"
+EXTRA_FILE = "metadata_extra.bin"
+OFFSETS_FILE = "documents.offsets.npy"
+METADATA_FILE = "metadata.npy"
+DICTIONARY_FILE = "metadata_dict.json"
+VERSION_FILE = "index_version"
+
+# Fixed-width metadata columns; everything else goes to the per-document JSON blob
+METADATA_DTYPE = np.dtype([
+    ("source", np.int32),
+    ("type", np.int16),
+    ("page", np.int32),
+    ("chunk", np.int32),
+    ("offset", np.int32),
+    ("has_tables", np.bool_),
+    ("table_count", np.int16),
+    ("link_count", np.int32),
+])
+COLUMNS = set(METADATA_DTYPE.names)
+OPTIONAL_COLUMNS = {"chunk", "offset"}
+
+
+def new_version() -> str:
+    return str(time.time_ns())
+
+
+def version_dir(index_dir: str, version: str) -> str:
+    """Directory holding every artifact of one index version; never modified once published."""
+    return os.path.join(index_dir, f"gen-{version}")
+
+
+def current_dir(index_dir: str) -> Optional[str]:
+    """Artifact directory of the published version, or None if no version has been published."""
+    version = read_version(index_dir)
+    return version_dir(index_dir, version) if version else None
+
+
+def write_version(index_dir: str, version: str) -> None:
+    """Publish a fully written version directory by atomically replacing the version pointer."""
+    previous = read_version(index_dir)
+    path = os.path.join(index_dir, VERSION_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(f"{path}.tmp", path)
+    remove_stale_versions(index_dir, previous)
+
+
+def remove_stale_versions(index_dir: str, oldest_kept: str) -> None:
+    """Delete versions older than oldest_kept.
+
+    The previous version is kept so a reader that resolved it just before the
+    switch can finish loading; loaded snapshots keep their memory maps valid
+    after deletion (open maps may delay it on Windows). Newer unpublished
+    directories may belong to a build still being written.
+    """
+    if not oldest_kept:
+        return
+    for name in os.listdir(index_dir):
+        if name.startswith("gen-") and name[len("gen-"):] < oldest_kept:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def read_version(index_dir: str) -> str:
+    """Current index version, or "" if none has been published."""
+    try:
+        with open(os.path.join(index_dir, VERSION_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+class StoredDocument:
+    """A Document of a DocumentStore, read from the memory maps on access.
+
+    Holding one costs a few dozen bytes instead of the page text, so an
+    incremental build can keep every indexed page without loading them.
+    """
+    __slots__ = ("store", "position")
+
+    def __init__(self, store: "DocumentStore", position: int):
+        self.store = store
+        self.position = position
+
+    @property
+    def content(self) -> str:
+        return self.store.content(self.position)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.store.metadata(self.position)
+
+    @property
+    def source(self) -> str:
+        return self.store.sources[self.store.columns[self.position]["source"]]
+
+    @property
+    def page(self) -> int:
+        return int(self.store.columns[self.position]["page"])
+
+    @property
+    def type(self) -> str:
+        return self.store.types[self.store.columns[self.position]["type"]]
+
+
+class DocumentStore:
+    """Read-only, memory-mapped document store.
+
+    Page contents and the free-form part of each document's metadata live in
+    two concatenated UTF-8 files addressed by an offsets array; the fixed
+    metadata fields (source, page, chunk, ...) are a structured NumPy array.
+    Everything is opened with mmap, so opening is O(1) and a lookup only
+    touches the pages of the documents it returns.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+        self.columns = np.load(os.path.join(index_dir, METADATA_FILE), mmap_mode="r")
+        with open(os.path.join(index_dir, DICTIONARY_FILE), "r", encoding="utf-8") as f:
+            dictionary = json.load(f)
+        self.sources: List[str] = dictionary["sources"]
+        self.types: List[str] = dictionary["types"]
+        self._content = self._map(os.path.join(index_dir, CONTENT_FILE))
+        self._extra = self._map(os.path.join(index_dir, EXTRA_FILE))
+
+    @staticmethod
+    def _map(path: str):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(index_dir, name))
+            for name in (CONTENT_FILE, EXTRA_FILE, OFFSETS_FILE, METADATA_FILE, DICTIONARY_FILE)
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def content(self, i: int) -> str:
+        start, end = self.offsets[i, 0], self.offsets[i + 1, 0]
+        return self._content[start:end].decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        row = self.columns[i]
+        metadata = {
+            "source": self.sources[row["source"]],
+            "page": int(row["page"]),
+            "type": self.types[row["type"]],
+            "has_tables": bool(row["has_tables"]),
+            "table_count": int(row["table_count"]),
+            "link_count": int(row["link_count"]),
+        }
+        for name in OPTIONAL_COLUMNS:
+            if row[name] >= 0:
+                metadata[name] = int(row[name])
+        start, end = self.offsets[i, 1], self.offsets[i + 1, 1]
+        if end > start:
+            metadata.update(json.loads(self._extra[start:end].decode("utf-8")))
+        return metadata
+
+    def get(self, i: int) -> Document:
+        return Document(content=self.content(i), metadata=self.metadata(i))
+
+    def __iter__(self):
+        return (self.get(i) for i in range(len(self)))
+
+    def close(self) -> None:
+        for mapped in (self._content, self._extra):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    @staticmethod
+    def write(index_dir: str, documents: Iterable[Document]) -> None:
+        """Write documents in store format; files are swapped in atomically."""
+        os.makedirs(index_dir, exist_ok=True)
+        sources: Dict[str, int] = {}
+        types: Dict[str, int] = {}
+        rows = []
+        offsets = [(0, 0)]
+
+        content_path = os.path.join(index_dir, CONTENT_FILE)
+        extra_path = os.path.join(index_dir, EXTRA_FILE)
+        with open(f"{content_path}.tmp", "wb") as content_file, open(f"{extra_path}.tmp", "wb") as extra_file:
+            content_end = extra_end = 0
+            for doc in documents:
+                metadata = doc.metadata
+                rows.append((
+                    sources.setdefault(metadata["source"], len(sources)),
+                    types.setdefault(metadata.get("type", ""), len(types)),
+                    metadata.get("page", -1),
+                    metadata.get("chunk", -1),
+                    metadata.get("offset", -1),
+                    metadata.get("has_tables", False),
+                    metadata.get("table_count", 0),
+                    metadata.get("link_count", 0),
+                ))
+                extra = {key: value for key, value in metadata.items() if key not in COLUMNS}
+                content_end += content_file.write(doc.content.encode("utf-8"))
+                if extra:
+                    extra_end += extra_file.write(json.dumps(extra).encode("utf-8"))
+                offsets.append((content_end, extra_end))
+
+        offsets_path = os.path.join(index_dir, OFFSETS_FILE)
+        metadata_path = os.path.join(index_dir, METADATA_FILE)
+        dictionary_path = os.path.join(index_dir, DICTIONARY_FILE)
+        with open(f"{offsets_path}.tmp", "wb") as f:
+            np.save(f, np.array(offsets, dtype=np.int64))
+        with open(f"{metadata_path}.tmp", "wb") as f:
+            np.save(f, np.array(rows, dtype=METADATA_DTYPE))
+        with open(f"{dictionary_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"sources": list(sources), "types": list(types)}, f)
+
+        for path in (content_path, extra_path, offsets_path, metadata_path, dictionary_path):
+            os.replace(f"{path}.tmp", path)
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import numpy as np
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LEXICAL_OFFSETS_FILE = "lexical.offsets.npy"
+LEXICAL_DOCS_FILE = "lexical.docs.npy"
+LEXICAL_TF_FILE = "lexical.tf.npy"
+LEXICAL_NORM_FILE = "lexical.norm.npy"
+LEXICAL_VOCAB_FILE = "lexical_vocab.json"
+
+TOKEN = re.compile(r"\w+")
+
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; "₹1,234.50" becomes ["1", "234", "50"] on both the index and query side."""
+    return TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over the indexed documents, in CSR posting-list form.
+
+    Postings for term t are docs[offsets[t]:offsets[t + 1]] with their term
+    frequencies in tf. The per-document length normalization
+    k1 * (1 - b + b * len / avg_len) is precomputed at build time, so scoring
+    a query only touches the posting lists of its terms. Document ids are the
+    positions in the vector index and DocumentStore.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        tf: np.ndarray,
+        norm: np.ndarray,
+        k1: float = 1.5
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tf = tf
+        self.norm = norm
+        self.k1 = k1
+        n = len(norm)
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.norm)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs, lengths = [], [], [], []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(count)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+        lengths = np.array(lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        norm = (k1 * (1 - b + b * lengths / avg_length)).astype(np.float32)
+        return cls(
+            vocab,
+            offsets,
+            np.array(doc_ids, dtype=np.int32)[order],
+            np.array(tfs, dtype=np.float32)[order],
+            norm,
+            k1
+        )
+
+    def term_ids(self, query: str) -> List[int]:
+        """Vocabulary ids of the query's distinct tokens; unknown tokens are dropped."""
+        return [self.vocab[token] for token in dict.fromkeys(tokenize(query)) if token in self.vocab]
+
+    def covers(self, query: str) -> bool:
+        """True if every query token occurs in the corpus."""
+        tokens = tokenize(query)
+        return bool(tokens) and all(token in self.vocab for token in tokens)
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, document ids) by BM25 among the documents selected by mask, best first."""
+        terms = self.term_ids(query)
+        if not terms or k <= 0:
+            return np.array([], dtype=np.float32), np.array([], dtype=np.int64)
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.docs[start:end]
+            tf = self.tf[start:end]
+            # Each document appears at most once per posting list, so fancy-index += is safe
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return scores[candidates], candidates.astype(np.int64)
+
+    # Persistence
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(index_dir, name))
+            for name in (LEXICAL_OFFSETS_FILE, LEXICAL_DOCS_FILE, LEXICAL_TF_FILE, LEXICAL_NORM_FILE, LEXICAL_VOCAB_FILE)
+        )
+
+    def save(self, index_dir: str) -> None:
+        """Write the index; files are swapped in atomically."""
+        arrays = (
+            (LEXICAL_OFFSETS_FILE, self.offsets),
+            (LEXICAL_DOCS_FILE, self.docs),
+            (LEXICAL_TF_FILE, self.tf),
+            (LEXICAL_NORM_FILE, self.norm),
+        )
+        for name, array in arrays:
+            with open(os.path.join(index_dir, f"{name}.tmp"), "wb") as f:
+                np.save(f, array)
+        vocab_path = os.path.join(index_dir, LEXICAL_VOCAB_FILE)
+        with open(f"{vocab_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "vocab": self.vocab}, f)
+        for name, _ in arrays:
+            path = os.path.join(index_dir, name)
+            os.replace(f"{path}.tmp", path)
+        os.replace(f"{vocab_path}.tmp", vocab_path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        """Open a saved index with its posting arrays memory-mapped."""
+        with open(os.path.join(index_dir, LEXICAL_VOCAB_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["vocab"],
+            np.load(os.path.join(index_dir, LEXICAL_OFFSETS_FILE), mmap_mode="r"),
+            np.load(os.path.join(index_dir, LEXICAL_DOCS_FILE), mmap_mode="r"),
+            np.load(os.path.join(index_dir, LEXICAL_TF_FILE), mmap_mode="r"),
+            np.load(os.path.join(index_dir, LEXICAL_NORM_FILE), mmap_mode="r"),
+            meta["k1"]
+        )
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int, rrf_k: int = RRF_K) -> List[int]:
+    """Fuse ranked id lists by summing 1 / (rrf_k + rank); returns the top-k ids."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])[:k]
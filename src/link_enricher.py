@@ -0,0 +1,230 @@
+import os
+import time
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+from document_processor import Document
+import logging
+
+# Configure logging
+os.makedirs("logs", exist_ok=True)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# File handler
+file_handler = logging.FileHandler("logs/link_enricher.log")
+file_handler.setLevel(logging.INFO)
+file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler.setFormatter(file_formatter)
+
+# Console handler
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_formatter = logging.Formatter('%(levelname)s: %(message)s')
+console_handler.setFormatter(console_formatter)
+
+# Add handlers to logger
+logger.addHandler(file_handler)
+logger.addHandler(console_handler)
+
+# Next to the embedding cache, independent of the working directory
+LINK_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "links.db")
+# Document type of a linked page, indexed once per URL with the URL as its source
+LINK_TYPE = "link"
+
+
+class LinkCache:
+    """Persistent cache of scraped link text with the validators needed to revalidate it."""
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or LINK_CACHE_PATH
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS links (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                ok INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Tuple[str, Optional[str], Optional[str], float, bool]]:
+        """Return (text, etag, last_modified, fetched_at, ok) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, fetched_at, ok FROM links WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        text, etag, last_modified, fetched_at, ok = row
+        return text, etag, last_modified, fetched_at, bool(ok)
+
+    def put(
+        self,
+        url: str,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        ok: bool = True
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO links (url, text, etag, last_modified, fetched_at, ok) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, time.time(), int(ok))
+            )
+            self._conn.commit()
+
+    def touch(self, url: str) -> None:
+        """Mark a cached entry as freshly revalidated."""
+        with self._lock:
+            self._conn.execute("UPDATE links SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LinkEnricher:
+    """Fetches the text behind statement links once per URL, concurrently and politely.
+
+    URLs are deduplicated before fetching, each host gets at most
+    `per_host_limit` requests in flight, and every request has a timeout so a
+    hanging host only costs that one link. Fetched text is kept in a LinkCache;
+    entries older than `ttl` are revalidated with conditional requests, and
+    failures are remembered for `error_ttl` so they are not retried on every page.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[LinkCache] = None,
+        max_workers: int = 8,
+        per_host_limit: int = 2,
+        timeout: Tuple[float, float] = (5.0, 15.0),
+        ttl: float = 7 * 24 * 3600,
+        error_ttl: float = 3600
+    ):
+        self.cache = cache or LinkCache()
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout = timeout
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host_limit))
+        self._host_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def enrich(self, urls: Iterable[str]) -> Dict[str, str]:
+        """Return the scraped text of every URL that yielded any, fetching only what the cache cannot answer."""
+        unique = [url for url in dict.fromkeys(urls) if url.startswith(("http://", "https://"))]
+        if not unique:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            texts = dict(zip(unique, executor.map(self._resolve, unique)))
+        logger.info(f"Resolved {len(unique)} unique links")
+        return {url: text for url, text in texts.items() if text}
+
+    def _resolve(self, url: str) -> str:
+        cached = self.cache.get(url)
+        if cached is not None:
+            text, etag, last_modified, fetched_at, ok = cached
+            age = time.time() - fetched_at
+            if age < (self.ttl if ok else self.error_ttl):
+                return text
+            if ok:
+                return self._fetch(url, text, etag, last_modified)
+        return self._fetch(url)
+
+    def _fetch(
+        self,
+        url: str,
+        cached_text: str = "",
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> str:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        with self._host_lock:
+            slot = self._host_slots[urlsplit(url).netloc]
+        try:
+            with slot:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.cache.touch(url)
+                return cached_text
+            response.raise_for_status()
+            text = html_to_text(response.text)
+            self.cache.put(
+                url,
+                text,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+            return text
+
+        except Exception as e:
+            logger.error(f"Error scraping URL {url}: {str(e)}")
+            if cached_text:
+                # Serve the stale copy rather than losing the content
+                return cached_text
+            self.cache.put(url, "", ok=False)
+            return ""
+
+    def close(self) -> None:
+        self.session.close()
+        self.cache.close()
+
+
+def link_document(url: str, text: str) -> Document:
+    """The scraped text of a linked page as a document of its own, keyed by its URL."""
+    return Document(
+        content=text,
+        metadata={
+            "source": url,
+            "page": 0,
+            "type": LINK_TYPE,
+            "has_tables": False,
+            "table_count": 0,
+            "link_count": 0
+        }
+    )
+
+
+def html_to_text(html: str) -> str:
+    """Strip scripts and styles from an HTML page and collapse its text."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
@@ -6,58 +6,241 @@ import math
 import sys
 import os
 import json
-import faiss
 import numpy as np
 from pathlib import Path
-import requests
+from typing import Callable, Optional
 import time
-import pickle
-from document_processor import DocumentProcessor, Document
+from document_processor import Document, merge_chunks, CHUNK_SIZE, CHUNK_OVERLAP
 from build_index import IndexBuilder
+from embedding_client import EmbeddingClient
+from index_store import DocumentStore, current_dir
+from link_enricher import LINK_TYPE
+from search_context import SearchContext, SearchSnapshot, SearchFilter
+from order_store import OrderStore
+from spending_aggregates import SpendingAggregates
+from query_cache import QueryCache
 import logging
 
 mcp = FastMCP("Analyzer")
 
-EMBED_URL = "http://localhost:11434/api/embeddings"
 EMBED_MODEL = "nomic-embed-text"
-CHUNK_SIZE = 256
-CHUNK_OVERLAP = 40
+TOP_K = 5
 ROOT = Path(__file__).parent.resolve()
 
+embedder = EmbeddingClient(model=EMBED_MODEL)
+# Index and documents stay resident; a watcher swaps in new versions as they are published
+search_context = SearchContext(str(ROOT / "faiss_index"))
+# Repeated queries are answered from memory; results are dropped when the index version changes
+query_cache = QueryCache()
+
 def get_embedding(text: str) -> np.ndarray:
-    response = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text})
-    response.raise_for_status()
-    return np.array(response.json()["embedding"], dtype=np.float32)
+    return query_cache.embedding(text, embedder.embed)
 
-def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    words = text.split()
-    for i in range(0, len(words), size - overlap):
-        yield " ".join(words[i:i+size])
+def get_embeddings(texts: list[str]) -> list[np.ndarray]:
+    return query_cache.embedding_many(texts, embedder.embed_many)
 
 def mcp_log(level: str, message: str) -> None:
     """Log a message to stderr to avoid interfering with JSON communication"""
     sys.stderr.write(f"{level}: {message}\n")
     sys.stderr.flush()
 
+def get_search_snapshot() -> SearchSnapshot:
+    """Current resident index snapshot, building the index first if none exists yet."""
+    snapshot = search_context.snapshot
+    if snapshot is None:
+        ensure_faiss_ready()
+        snapshot = search_context.reload()
+    if snapshot is None:
+        raise RuntimeError("Search index is not available")
+    return snapshot
+
+def format_results(hits: list[Document], top_k: int = TOP_K) -> list[str]:
+    """Merge ranked hits back per (source, page), ordered by each page's best hit."""
+    pages: dict[tuple, list[Document]] = {}
+    for doc in hits:
+        key = (doc.metadata["source"], doc.metadata["page"])
+        if key in pages or len(pages) < top_k:
+            pages.setdefault(key, []).append(doc)
+    return [
+        f"{merge_chunks(chunks)}\n" + (
+            f"[Linked page: {source}]" if chunks[0].metadata.get("type") == LINK_TYPE
+            else f"[Source: {source}, page {page + 1}]"
+        )
+        for (source, page), chunks in pages.items()
+    ]
+
+def make_filter(
+    source: str = "",
+    page_start: int = 0,
+    page_end: int = 0,
+    has_tables: Optional[bool] = None,
+    start_date: str = "",
+    end_date: str = ""
+) -> SearchFilter:
+    """Search filter from tool arguments; pages are 1-based as shown in results, empty/0 means unset."""
+    return SearchFilter(
+        source=source or None,
+        page_start=page_start - 1 if page_start > 0 else None,
+        page_end=page_end - 1 if page_end > 0 else None,
+        has_tables=has_tables,
+        start_date=start_date or None,
+        end_date=end_date or None
+    )
+
 @mcp.tool()
-def search_documents(query: str) -> list[str]:
-    """Search for relevant content from uploaded documents."""
-    ensure_faiss_ready()
+def search_documents(
+    query: str,
+    mode: str = "auto",
+    source: str = "",
+    page_start: int = 0,
+    page_end: int = 0,
+    has_tables: Optional[bool] = None,
+    start_date: str = "",
+    end_date: str = ""
+) -> list[str]:
+    """Search for relevant content from uploaded documents. mode: "lexical" for exact tokens (order IDs, amounts, restaurant names), "vector" for semantic search, "hybrid" to fuse both, or "auto" to pick. Optional filters: source file glob (e.g. "*march*.pdf"), page_start/page_end (1-based, inclusive), has_tables, and start_date/end_date as YYYY-MM-DD to pages listing orders in that range."""
     mcp_log("SEARCH", f"Query: {query}")
     try:
-        index = faiss.read_index(str(ROOT / "faiss_index" / "swiggy.index"))
-        with open(file_path, 'rb') as file:
-            metadata = pickle.load((ROOT / "faiss_index" / "documents.pkl"))
-        query_vec = get_embedding(query).reshape(1, -1)
-        D, I = index.search(query_vec, k=5)
-        results = []
-        for idx in I[0]:
-            data = metadata[idx]
-            results.append(f"{data['content']}\n[Source: {data['metadata']['source']}]")
-        return results
+        snapshot = get_search_snapshot()
+        mode = snapshot.resolve_mode(query, mode)
+        search_filter = make_filter(source, page_start, page_end, has_tables, start_date, end_date)
+        mcp_log("SEARCH", f"Mode: {mode}")
+        # Chunked indexes return several chunks per page; over-fetch so pages can fill top-k
+        k = TOP_K * 4 if snapshot.chunked else TOP_K
+        ids = query_cache.ranked(
+            snapshot.version, query, mode, k,
+            lambda: snapshot.rank(query, k, get_embedding, mode, search_filter),
+            search_filter
+        )
+        hits = [snapshot.store.get(idx) for idx in ids]
+        return format_results(hits)
     except Exception as e:
         return [f"ERROR: Failed to search: {str(e)}"]
 
+@mcp.tool()
+def search_documents_batch(
+    queries: list[str],
+    mode: str = "auto",
+    source: str = "",
+    page_start: int = 0,
+    page_end: int = 0,
+    has_tables: Optional[bool] = None,
+    start_date: str = "",
+    end_date: str = ""
+) -> list[dict]:
+    """Search several queries in one call (e.g. one per facet of a question).
+
+    Returns one {"query", "results", "error"} entry per query, in input order; error is None
+    unless that query failed. mode and the filters apply to every query, as in search_documents.
+    """
+    mcp_log("SEARCH", f"Batch of {len(queries)} queries")
+    entries = [{"query": query, "results": [], "error": None} for query in queries]
+    try:
+        snapshot = get_search_snapshot()
+        k = TOP_K * 4 if snapshot.chunked else TOP_K
+        search_filter = make_filter(source, page_start, page_end, has_tables, start_date, end_date)
+    except Exception as e:
+        for entry in entries:
+            entry["error"] = f"Failed to search: {str(e)}"
+        return entries
+
+    modes = {}
+    ranked = {}
+    for i, query in enumerate(queries):
+        try:
+            modes[i] = snapshot.resolve_mode(query, mode)
+            ranked[i] = query_cache.get_ranked(snapshot.version, query, modes[i], k, search_filter)
+        except Exception as e:
+            entries[i]["error"] = f"Failed to search: {str(e)}"
+    # Cache misses share one embedding request and one multi-row index search
+    missing = [i for i, ids in ranked.items() if ids is None]
+    if missing:
+        try:
+            computed = snapshot.rank_many(
+                [queries[i] for i in missing], k, get_embeddings, [modes[i] for i in missing], search_filter
+            )
+            for i, ids in zip(missing, computed):
+                query_cache.put_ranked(snapshot.version, queries[i], modes[i], k, ids, search_filter)
+                ranked[i] = ids
+        except Exception as e:
+            for i in missing:
+                del ranked[i]
+                entries[i]["error"] = f"Failed to search: {str(e)}"
+    for i, ids in ranked.items():
+        entries[i]["results"] = format_results([snapshot.store.get(idx) for idx in ids])
+    return entries
+
+@mcp.tool()
+def search_cache_stats() -> dict:
+    """Hit rates of the query-embedding and search-result caches."""
+    return query_cache.stats()
+
+def get_order_store() -> OrderStore:
+    snapshot = get_search_snapshot()
+    if snapshot.orders is None:
+        raise RuntimeError("No order store in the index; rebuild it with build_index.py")
+    return snapshot.orders
+
+@mcp.tool()
+def order_summary(start_date: str = "", end_date: str = "", restaurant: str = "") -> dict:
+    """Exact order count, total spent, fees and average/median/max order value from the statements. Optional filters: start_date and end_date as YYYY-MM-DD, restaurant name substring."""
+    try:
+        orders = get_order_store()
+        return orders.totals(orders.mask(start_date or None, end_date or None, restaurant or None))
+    except Exception as e:
+        return {"error": f"Failed to summarize orders: {str(e)}"}
+
+@mcp.tool()
+def top_ordered_items(limit: int = 10, start_date: str = "", end_date: str = "") -> list[dict]:
+    """Most ordered items by total quantity. Optional start_date and end_date as YYYY-MM-DD."""
+    try:
+        orders = get_order_store()
+        return orders.top_items(limit, orders.mask(start_date or None, end_date or None))
+    except Exception as e:
+        return [{"error": f"Failed to rank items: {str(e)}"}]
+
+@mcp.tool()
+def top_restaurants(limit: int = 10, start_date: str = "", end_date: str = "") -> list[dict]:
+    """Restaurants ranked by total amount spent. Optional start_date and end_date as YYYY-MM-DD."""
+    try:
+        orders = get_order_store()
+        return orders.top_restaurants(limit, orders.mask(start_date or None, end_date or None))
+    except Exception as e:
+        return [{"error": f"Failed to rank restaurants: {str(e)}"}]
+
+@mcp.tool()
+def order_histogram(bucket: str = "month", start_date: str = "", end_date: str = "") -> dict:
+    """Order count and spend per time bucket: day, week, month, year, weekday or hour. Optional start_date and end_date as YYYY-MM-DD."""
+    try:
+        orders = get_order_store()
+        return orders.histogram(bucket, orders.mask(start_date or None, end_date or None))
+    except Exception as e:
+        return {"error": f"Failed to build histogram: {str(e)}"}
+
+def get_spending_aggregates() -> SpendingAggregates:
+    snapshot = get_search_snapshot()
+    if snapshot.aggregates is None:
+        raise RuntimeError("No order store in the index; rebuild it with build_index.py")
+    return snapshot.aggregates
+
+@mcp.tool()
+def spending_dashboard(limit: int = 10) -> dict:
+    """Precomputed spending dashboard: totals, spend per month/week/day (last `limit` periods), per weekday and hour of day, and the top restaurants and items. Use this first for overview questions; it answers instantly."""
+    try:
+        return get_spending_aggregates().dashboard(limit)
+    except Exception as e:
+        return {"error": f"Failed to load spending dashboard: {str(e)}"}
+
+@mcp.tool()
+def get_linked_content(url: str) -> str:
+    """Get the scraped text of a link referenced in a statement page."""
+    try:
+        with open(os.path.join(get_search_snapshot().directory, "links.json"), "r", encoding="utf-8") as f:
+            link_texts = json.load(f)
+        return link_texts.get(url, f"No content stored for {url}")
+    except Exception as e:
+        return f"ERROR: Failed to read linked content: {str(e)}"
+
 # DEFINE RESOURCES
 
 # Add a dynamic greeting resource
@@ -83,23 +266,40 @@ def debug_error(error: str) -> list[base.Message]:
         base.AssistantMessage("I'll help debug that. What have you tried so far?"),
     ]
 
+def precomputed_figures(select: Callable[[SpendingAggregates], dict]) -> str:
+    """Prompt section with figures from the spending aggregates, or a note saying why there are none."""
+    try:
+        return f"Precomputed figures:\n{json.dumps(select(get_spending_aggregates()), indent=2)}"
+    except Exception as e:
+        return f"Precomputed figures are unavailable ({str(e)}); answer from the statement excerpts only."
+
 @mcp.prompt()
 def analyze_statement(question: str, context: list[str]) -> str:
     """Analyze Swiggy statement based on context and question."""
-    context_text = "\n".join(context)
-    return get_llm_response(question, context_text)
+    return f"{question}\n\nStatement excerpts:\n" + "\n".join(context)
 
 @mcp.prompt()
 def summarize_orders(context: list[str]) -> str:
     """Generate a summary of orders from the statement."""
     question = "Please provide a summary of all orders including total amount spent, number of orders, and most ordered items."
-    return get_llm_response(question, "\n".join(context))
+    figures = precomputed_figures(lambda aggregates: {
+        "totals": aggregates.totals(),
+        "top_items": aggregates.top("item"),
+        "top_restaurants": aggregates.top("restaurant")
+    })
+    return f"{question}\n\n{figures}\n\nStatement excerpts:\n" + "\n".join(context)
 
 @mcp.prompt()
 def analyze_spending_patterns(context: list[str]) -> str:
     """Analyze spending patterns from the statement."""
     question = "Please analyze the spending patterns including average order value, peak ordering times, and spending trends."
-    return get_llm_response(question, "\n".join(context)) 
+    figures = precomputed_figures(lambda aggregates: {
+        "totals": aggregates.totals(),
+        "by_month": aggregates.series("month"),
+        "by_weekday": aggregates.series("weekday"),
+        "by_hour": aggregates.series("hour")
+    })
+    return f"{question}\n\n{figures}\n\nStatement excerpts:\n" + "\n".join(context)
 
 def process_documents(pdf_dir = "data/"):
     """Process documents and create FAISS index"""
@@ -118,22 +318,26 @@ def process_documents(pdf_dir = "data/"):
     
     try:
         # Initialize and build index
-        builder = IndexBuilder()
-        builder.process_and_embed_documents(pdf_paths)
+        builder = IndexBuilder(
+            extract_workers=os.cpu_count() or 1,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        builder.load_index(search_context.index_dir)
+        builder.sync_documents(pdf_paths)
         
-        # Save the index and related data
-        builder.save_index()
+        # Save the index and related data where the search context watches for it
+        builder.save_index(search_context.index_dir)
         mcp_log("INFO","Index building completed successfully")
+        search_context.reload()
         
     except Exception as e:
         mcp_log("ERROR",f"Error building index: {str(e)}")
         raise
 
 def ensure_faiss_ready():
-    from pathlib import Path
-    index_path = ROOT / "faiss_index" / "swiggy.index"
-    meta_path = ROOT / "faiss_index" / "documents.pkl"
-    if not (index_path.exists() and meta_path.exists()):
+    index_dir = current_dir(search_context.index_dir)
+    if index_dir is None or not (os.path.exists(os.path.join(index_dir, "swiggy.index")) and DocumentStore.exists(index_dir)):
         mcp_log("INFO", "Index not found — running process_documents()...")
         process_documents()
     else:
@@ -141,29 +345,22 @@ def ensure_faiss_ready():
 
 
 if __name__ == "__main__":
-    print("STARTING THE SERVER AT AMAZING LOCATION")
+    # stdout carries the JSON-RPC stream, so nothing else may be printed there
+    mcp_log("INFO", "Starting the server")
 
-    
-    
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
+        search_context.start_watching()
         mcp.run() # Run without transport for dev server
     else:
-        # Start the server in a separate thread
-        import threading
-        server_thread = threading.Thread(target=lambda: mcp.run(transport="stdio"))
-        server_thread.daemon = True
-        server_thread.start()
-        
-        # Wait a moment for the server to start
-        time.sleep(2)
-        
-        # Process documents after server is running if not done already
-        # process_documents()
+        # Load the index before serving: the first request the client sends
+        # (initialize) is answered once the server can actually search
+        start = time.perf_counter()
         ensure_faiss_ready()
-        
-        # Keep the main thread alive
+        search_context.reload()
+        search_context.start_watching()
+        mcp_log("INFO", f"Index loaded in {(time.perf_counter() - start) * 1000:.0f} ms, serving on stdio")
+
         try:
-            while True:
-                time.sleep(1)
+            mcp.run(transport="stdio")
         except KeyboardInterrupt:
-            print("\nShutting down...")
+            mcp_log("INFO", "Shutting down...")
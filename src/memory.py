@@ -1,49 +1,323 @@
 # memory.py
 
+import os
+import json
+import mmap
+import time
+import shutil
+import asyncio
+import threading
 import numpy as np
 import faiss
-import requests
-from typing import List, Optional, Literal
-from pydantic import BaseModel
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Literal, Set, Tuple, get_args
+from pydantic import BaseModel, Field
 from datetime import datetime
 import logging
+from embedding_client import EmbeddingClient
+from index_factory import IndexConfig, build_index, search_params, read_index, write_index
+
+if TYPE_CHECKING:
+    from ollama_client import OllamaClient
+
+# Optional: import log from agent if shared, else define locally
+try:
+    from agent import log
+except ImportError:
+    def log(stage: str, msg: str):
+        now = datetime.now().strftime("%H:%M:%S")
+        print(f"[{now}] [{stage}] {msg}")
+
+# Snapshot: written to a fresh generation directory, published by rewriting the meta file
+SNAPSHOT_META_FILE = "snapshot.json"
+SNAPSHOT_INDEX_FILE = "index.faiss"
+SNAPSHOT_VECTORS_FILE = "vectors.npy"
+SNAPSHOT_ITEMS_FILE = "items.bin"
+SNAPSHOT_OFFSETS_FILE = "items.offsets.npy"
+SNAPSHOT_POSTINGS_FILE = "postings.json"
+SNAPSHOT_POSTING_IDS_FILE = "postings.npy"
+SNAPSHOT_COLUMNS_FILE = "columns.npz"
+# Append-only log of memories added since the snapshot: one JSON line and one float32 row each
+LOG_ITEMS_FILE = "log.jsonl"
+LOG_VECTORS_FILE = "log.f32"
+# Sequence numbers of memories evicted since the snapshot, one per line
+LOG_EVICTED_FILE = "log.evicted"
 
 
 class MemoryItem(BaseModel):
     text: str
     type: Literal["preference", "tool_output", "fact", "query", "system"] = "fact"
-    timestamp: Optional[str] = datetime.now().isoformat()
+    timestamp: Optional[str] = Field(default_factory=lambda: datetime.now().isoformat())
     tool_name: Optional[str] = None
     user_query: Optional[str] = None
     tags: List[str] = []
     session_id: Optional[str] = None
 
 
+MEMORY_TYPES = get_args(MemoryItem.model_fields["type"].annotation)
+
+
+@dataclass
+class MemoryPolicy:
+    """Capacity and retention rules for MemoryManager."""
+    max_items: int = 10_000
+    # Over capacity, evict down to this fraction of max_items so eviction runs in batches
+    low_watermark: float = 0.9
+    # Seconds until a memory of a type expires; types not listed never expire
+    ttl: Dict[str, float] = field(default_factory=lambda: {"tool_output": 7 * 24 * 3600, "query": 24 * 3600})
+    # Evicted for capacity only once no other memory is left
+    protected_types: Tuple[str, ...] = ("preference", "fact")
+    # Cosine similarity at which a new memory duplicates a stored one of the same type and session; None disables
+    dedup_threshold: Optional[float] = 0.97
+    # Minimum seconds between expiry checks on retrieval
+    expiry_interval: float = 60.0
+    # Compact once this fraction of stored memories is evicted
+    compact_fraction: float = 0.25
+
+
+class MemoryItems:
+    """Memories by position; snapshot items are decoded lazily from a memory-mapped blob."""
+
+    def __init__(self, blob=b"", offsets: Optional[np.ndarray] = None, items: Optional[List[MemoryItem]] = None):
+        self._blob = blob
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._decoded: Dict[int, MemoryItem] = {}
+        self._tail: List[MemoryItem] = items or []
+
+    @property
+    def base_count(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.base_count + len(self._tail)
+
+    def __getitem__(self, i: int) -> MemoryItem:
+        if i < 0:
+            i += len(self)
+        if i >= self.base_count:
+            return self._tail[i - self.base_count]
+        item = self._decoded.get(i)
+        if item is None:
+            item = MemoryItem.model_validate_json(self.raw(i))
+            self._decoded[i] = item
+        return item
+
+    def __iter__(self) -> Iterator[MemoryItem]:
+        return (self[i] for i in range(len(self)))
+
+    def append(self, item: MemoryItem) -> None:
+        self._tail.append(item)
+
+    def raw(self, i: int) -> bytes:
+        """Serialized item; snapshot items are returned without decoding them."""
+        if i >= self.base_count:
+            return self._tail[i - self.base_count].model_dump_json().encode("utf-8")
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+
+class Postings:
+    """Key to sorted memory positions; snapshot postings stay memory-mapped, newer positions are kept in lists."""
+
+    def __init__(self, ranges: Optional[Dict[str, List[int]]] = None, ids: Optional[np.ndarray] = None):
+        self._ranges = ranges or {}
+        self._ids = ids if ids is not None else np.empty(0, dtype=np.int64)
+        self._tail: Dict[str, List[int]] = {}
+
+    def add(self, key: str, position: int) -> None:
+        self._tail.setdefault(key, []).append(position)
+
+    def get(self, key: str) -> np.ndarray:
+        start, end = self._ranges.get(key, (0, 0))
+        tail = self._tail.get(key)
+        if not tail:
+            return self._ids[start:end]
+        # Tail positions are all past the snapshot, so the result stays sorted
+        return np.concatenate([self._ids[start:end], np.array(tail, dtype=np.int64)])
+
+    def keys(self) -> Set[str]:
+        return set(self._ranges) | set(self._tail)
+
+    def to_csr(self) -> Tuple[Dict[str, List[int]], np.ndarray]:
+        """(key -> [start, end], concatenated ids) for saving."""
+        ranges, chunks, start = {}, [], 0
+        for key in sorted(self.keys()):
+            ids = self.get(key)
+            ranges[key] = [start, start + len(ids)]
+            chunks.append(ids)
+            start += len(ids)
+        return ranges, np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def remapped(self, keep: np.ndarray, remap: np.ndarray) -> "Postings":
+        """Postings of the kept positions, renumbered through remap; keys left empty are dropped."""
+        ranges, chunks, start = {}, [], 0
+        for key in sorted(self.keys()):
+            ids = self.get(key)
+            ids = remap[ids[keep[ids]]]
+            if len(ids):
+                ranges[key] = [start, start + len(ids)]
+                chunks.append(ids)
+                start += len(ids)
+        return Postings(ranges, np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64))
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersection of two sorted position arrays in O(len(a) log len(b)); pass the shorter one as a."""
+    if len(a) == 0 or len(b) == 0:
+        return np.empty(0, dtype=np.int64)
+    found = np.searchsorted(b, a)
+    return a[(found < len(b)) & (b[np.minimum(found, len(b) - 1)] == a)]
+
+
+def created_at(item: MemoryItem) -> float:
+    """Creation time of a memory as a Unix timestamp; now if it has none."""
+    try:
+        return datetime.fromisoformat(item.timestamp).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
 class MemoryManager:
-    def __init__(self, embedding_model_url="http://localhost:11434/api/embeddings", model_name="nomic-embed-text"):
+    """Bounded semantic memory with exact filtered retrieval and an optional durable backend.
+
+    Memories up to the last snapshot are searched through the snapshot's FAISS
+    index; newer ones are scored exactly until the next compaction folds them
+    in. Evicted memories are tombstoned and skipped by every search until a
+    compaction drops them from the index. With a path, adds and evictions are
+    appended to logs, and compaction writes a new snapshot that is
+    memory-mapped on startup, so a restart only replays the log tail and never
+    re-embeds.
+
+    The async methods run storage and search in worker threads, off the event
+    loop; a lock serialises them with each other and with the sync methods.
+    """
+
+    def __init__(
+        self,
+        embedding_model_url="http://localhost:11434/api/embeddings",
+        model_name="nomic-embed-text",
+        embedder: Optional[EmbeddingClient] = None,
+        index_config: Optional[IndexConfig] = None,
+        exact_subset_max: int = 4096,
+        path: Optional[str] = None,
+        snapshot_every: int = 1000,
+        policy: Optional[MemoryPolicy] = None
+    ):
         self.embedding_model_url = embedding_model_url
         self.model_name = model_name
-        self.index = None
-        self.data: List[MemoryItem] = []
-        self.embeddings: List[np.ndarray] = []
+        self.embedder = embedder or EmbeddingClient(
+            base_url=embedding_model_url.split("/api/")[0],
+            model=model_name
+        )
+        self.index_config = index_config or IndexConfig()
+        self.policy = policy or MemoryPolicy()
+        self.dimension: Optional[int] = None
+        # Search index over the snapshot's memories; read-only when memory-mapped
+        self.index: Optional[faiss.Index] = None
+        self._base_vectors = np.empty((0, 0), dtype=np.float32)
+        # Memories added since the snapshot
+        self._tail_vectors: List[np.ndarray] = []
+        self.data = MemoryItems()
+        # Inverted indexes from session, type and tag to memory positions
+        self._by_session = Postings()
+        self._by_type = Postings()
+        self._by_tag = Postings()
+        # Per-position columns for eviction: add sequence number, type, creation and last access time
+        self._seq: List[int] = []
+        self._type_code: List[int] = []
+        self._created: List[float] = []
+        self._last_access: List[float] = []
+        self._next_seq = 0
+        # Evicted positions, skipped by searches until the next compaction
+        self._evicted: Set[int] = set()
+        self._evicted_ids = np.empty(0, dtype=np.int64)
+        self._last_expiry = time.time()
+        # Filtered subsets up to this size are scored exactly with one matrix product
+        self.exact_subset_max = exact_subset_max
+        # Compact once this many memories were added since the last snapshot
+        self.snapshot_every = snapshot_every
+        self.path = path
+        self._generation: Optional[str] = None
+        self._log_items = None
+        self._log_vectors = None
+        self._log_evicted = None
+        # Held while memories are stored, searched, evicted or compacted; reentrant since storing may evict
+        self._lock = threading.RLock()
+        if path:
+            self._open(path)
+
+    def __len__(self) -> int:
+        """Number of live (not evicted) memories."""
+        return len(self.data) - len(self._evicted)
 
     def _get_embedding(self, text: str) -> np.ndarray:
-        response = requests.post(
-            self.embedding_model_url,
-            json={"model": self.model_name, "prompt": text}
-        )
-        response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype=np.float32)
+        return self.embedder.embed(text)
+
+    def add(self, item: MemoryItem) -> bool:
+        """Store a memory; returns False if it was dropped as a near-duplicate of a stored one."""
+        return self._store(item, np.asarray(self._get_embedding(item.text), dtype=np.float32))
+
+    async def add_async(self, item: MemoryItem, client: "OllamaClient") -> bool:
+        """add() with the text embedded through the async Ollama client."""
+        emb = await self.embedder.aembed(item.text, client)
+        # The log append, and any eviction or compaction it triggers, is file I/O
+        return await asyncio.to_thread(self._store, item, np.asarray(emb, dtype=np.float32))
 
-    def add(self, item: MemoryItem):
-        emb = self._get_embedding(item.text)
-        self.embeddings.append(emb)
+    def _store(self, item: MemoryItem, emb: np.ndarray) -> bool:
+        with self._lock:
+            return self._store_locked(item, emb)
+
+    def _store_locked(self, item: MemoryItem, emb: np.ndarray) -> bool:
+        duplicate = self._find_duplicate(item, emb)
+        if duplicate is not None:
+            # The existing memory was just asked to be remembered again, so it counts as used
+            self._last_access[duplicate] = time.time()
+            return False
+
+        seq = self._next_seq
+        self._append(item, emb, seq)
+        if self.path:
+            self._log(seq, item, emb)
+        if len(self) > self.policy.max_items:
+            self._evict()
+        if len(self._tail_vectors) >= self.snapshot_every:
+            self._compact()
+        return True
+
+    def _append(self, item: MemoryItem, emb: np.ndarray, seq: int) -> None:
+        if self.dimension is None:
+            self.dimension = len(emb)
+            if self.path:
+                self._write_meta()
+        position = len(self.data)
+        self._tail_vectors.append(emb)
         self.data.append(item)
+        self._seq.append(seq)
+        self._next_seq = seq + 1
+        self._type_code.append(MEMORY_TYPES.index(item.type))
+        self._created.append(created_at(item))
+        self._last_access.append(self._created[-1])
+        if item.session_id:
+            self._by_session.add(item.session_id, position)
+        self._by_type.add(item.type, position)
+        for tag in dict.fromkeys(item.tags):
+            self._by_tag.add(tag, position)
 
-        # Initialize or add to index
-        if self.index is None:
-            self.index = faiss.IndexFlatL2(len(emb))
-        self.index.add(np.stack([emb]))
+    def _find_duplicate(self, item: MemoryItem, emb: np.ndarray) -> Optional[int]:
+        """Position of a live memory of the same type and session whose cosine similarity reaches the threshold."""
+        threshold = self.policy.dedup_threshold
+        if threshold is None or len(self) == 0:
+            return None
+        candidates = self._candidates(item.type, None, item.session_id)
+        if len(candidates) == 0:
+            return None
+        nearest = self._search_subset(emb.reshape(1, -1), candidates, 1)
+        if not nearest:
+            return None
+        stored = self._vectors(np.array(nearest, dtype=np.int64))[0]
+        norms = float(np.linalg.norm(emb) * np.linalg.norm(stored))
+        if norms == 0 or float(emb @ stored) / norms < threshold:
+            return None
+        return nearest[0]
 
     def retrieve(
         self,
@@ -53,36 +327,406 @@ class MemoryManager:
         tag_filter: Optional[List[str]] = None,
         session_filter: Optional[str] = None
     ) -> List[MemoryItem]:
-        if not self.index or len(self.data) == 0:
+        """Nearest memories matching every filter; the query is embedded before the lock is taken."""
+        if len(self) == 0:
+            return []
+        return self._search(self._get_embedding(query), top_k, type_filter, tag_filter, session_filter)
+
+    async def retrieve_async(
+        self,
+        query: str,
+        client: "OllamaClient",
+        top_k: int = 3,
+        type_filter: Optional[str] = None,
+        tag_filter: Optional[List[str]] = None,
+        session_filter: Optional[str] = None
+    ) -> List[MemoryItem]:
+        """retrieve() with the query embedded through the async Ollama client.
+
+        Filtering and search run in a worker thread under the lock, so a
+        concurrent add that evicts or compacts (renumbering positions) can
+        never interleave with them.
+        """
+        if len(self) == 0:
             return []
+        query_vec = await self.embedder.aembed(query, client)
+        return await asyncio.to_thread(self._search, query_vec, top_k, type_filter, tag_filter, session_filter)
 
-        query_vec = self._get_embedding(query).reshape(1, -1)
-        D, I = self.index.search(query_vec, top_k * 2)  # Overfetch to allow filtering
+    def _search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        type_filter: Optional[str],
+        tag_filter: Optional[List[str]],
+        session_filter: Optional[str]
+    ) -> List[MemoryItem]:
+        with self._lock:
+            candidates = self._retrieval_candidates(type_filter, tag_filter, session_filter)
+            if candidates is not None and len(candidates) == 0:
+                return []
+            return self._nearest(query_vec, candidates, top_k)
 
-        results = []
-        for idx in I[0]:
-            if idx >= len(self.data):
-                continue
-            item = self.data[idx]
+    def _retrieval_candidates(
+        self,
+        type_filter: Optional[str],
+        tag_filter: Optional[List[str]],
+        session_filter: Optional[str]
+    ) -> Optional[np.ndarray]:
+        """Expire due memories, then return the filtered candidates (empty if nothing can match)."""
+        now = time.time()
+        if now - self._last_expiry >= self.policy.expiry_interval:
+            self._evict(now)
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        return self._candidates(type_filter, tag_filter, session_filter)
 
-            # Filter by type
-            if type_filter and item.type != type_filter:
-                continue
+    def _nearest(self, query_vec: np.ndarray, candidates: Optional[np.ndarray], top_k: int) -> List[MemoryItem]:
+        query_vec = np.asarray(query_vec, dtype=np.float32).reshape(1, -1)
+        if candidates is None:
+            ids = self._search_all(query_vec, top_k)
+        else:
+            ids = self._search_subset(query_vec, candidates, top_k)
+        now = time.time()
+        for idx in ids:
+            self._last_access[idx] = now
+        return [self.data[idx] for idx in ids]
 
-            # Filter by tags
-            if tag_filter and not any(tag in item.tags for tag in tag_filter):
-                continue
+    def _candidates(
+        self,
+        type_filter: Optional[str],
+        tag_filter: Optional[List[str]],
+        session_filter: Optional[str]
+    ) -> Optional[np.ndarray]:
+        """Sorted live positions matching every filter (any of the tags), or None if unfiltered."""
+        postings = []
+        if session_filter:
+            postings.append(self._by_session.get(session_filter))
+        if type_filter:
+            postings.append(self._by_type.get(type_filter))
+        if tag_filter:
+            postings.append(np.unique(np.concatenate([self._by_tag.get(tag) for tag in tag_filter])))
+        if not postings:
+            return None
+        # Intersect from the shortest posting list, so the cost follows the smallest filter
+        postings.sort(key=len)
+        matching = np.asarray(postings[0], dtype=np.int64)
+        for other in postings[1:]:
+            matching = intersect_sorted(matching, other)
+        return self._live(matching)
+
+    def _live(self, ids: np.ndarray) -> np.ndarray:
+        """ids without evicted positions."""
+        if len(self._evicted_ids) == 0 or len(ids) == 0:
+            return ids
+        return ids[~np.isin(ids, self._evicted_ids, assume_unique=True)]
 
-            # Filter by session
-            if session_filter and item.session_id != session_filter:
-                continue
+    def _search_all(self, query_vec: np.ndarray, top_k: int) -> List[int]:
+        """Nearest live memories overall: the snapshot index merged with an exact scan of the tail."""
+        base = len(self._base_vectors)
+        hits = self._exact(query_vec, self._live(np.arange(base, len(self.data), dtype=np.int64)), top_k)
+        if self.index is not None and self.index.ntotal:
+            evicted = self._evicted_ids[self._evicted_ids < base]
+            if len(evicted):
+                excluded = faiss.IDSelectorBatch(len(evicted), faiss.swig_ptr(evicted))
+                selector = faiss.IDSelectorNot(excluded)
+                D, I = self.index.search(query_vec, top_k, params=search_params(self.index, selector))
+            else:
+                D, I = self.index.search(query_vec, top_k)
+            hits += [(float(d), int(idx)) for d, idx in zip(D[0], I[0]) if idx >= 0]
+        return [idx for _, idx in sorted(hits)[:top_k]]
 
-            results.append(item)
-            if len(results) >= top_k:
-                break
+    def _search_subset(self, query_vec: np.ndarray, ids: np.ndarray, top_k: int) -> List[int]:
+        """Exact nearest neighbours among ids; large subsets go through a FAISS ID selector."""
+        base = len(self._base_vectors)
+        base_ids = ids[ids < base]
+        if len(ids) > self.exact_subset_max and self.index is not None and len(base_ids):
+            selector = faiss.IDSelectorBatch(len(base_ids), faiss.swig_ptr(base_ids))
+            D, I = self.index.search(query_vec, top_k, params=search_params(self.index, selector))
+            hits = [(float(d), int(idx)) for d, idx in zip(D[0], I[0]) if idx >= 0]
+            if len(hits) >= min(top_k, len(base_ids)):
+                hits += self._exact(query_vec, ids[ids >= base], top_k)
+                return [idx for _, idx in sorted(hits)[:top_k]]
+        return [idx for _, idx in self._exact(query_vec, ids, top_k)]
 
-        return results
+    def _exact(self, query_vec: np.ndarray, ids: np.ndarray, top_k: int) -> List[Tuple[float, int]]:
+        """(squared L2 distance, position) of the top_k nearest among ids, nearest first."""
+        if len(ids) == 0:
+            return []
+        distances = ((self._vectors(ids) - query_vec) ** 2).sum(axis=1)
+        if len(ids) > top_k:
+            nearest = np.argpartition(distances, top_k - 1)[:top_k]
+            nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        else:
+            nearest = np.argsort(distances, kind="stable")
+        return [(float(distances[i]), int(ids[i])) for i in nearest]
+
+    def _vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Stored vectors at the given positions, from the snapshot or the tail."""
+        base = len(self._base_vectors)
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        in_base = ids < base
+        if in_base.any():
+            vectors[in_base] = self._base_vectors[ids[in_base]]
+        for row in np.flatnonzero(~in_base):
+            vectors[row] = self._tail_vectors[ids[row] - base]
+        return vectors
 
     def bulk_add(self, items: List[MemoryItem]):
         for item in items:
             self.add(item)
+
+    # Eviction
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Expire memories past their type's TTL, then enforce max_items; returns how many were evicted.
+
+        Over capacity, memories are evicted down to the low watermark:
+        unprotected types before protected ones, least recently used first.
+        """
+        with self._lock:
+            return self._evict(now)
+
+    def _evict(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        self._last_expiry = now
+        n = len(self.data)
+        if n == 0:
+            return 0
+        alive = np.ones(n, dtype=bool)
+        alive[self._evicted_ids] = False
+        type_codes = np.array(self._type_code, dtype=np.int8)
+
+        expired = np.zeros(n, dtype=bool)
+        created = np.array(self._created)
+        for memory_type, ttl in self.policy.ttl.items():
+            expired |= (type_codes == MEMORY_TYPES.index(memory_type)) & (created < now - ttl)
+        victims = [np.flatnonzero(alive & expired)]
+        alive &= ~expired
+
+        live = int(alive.sum())
+        if live > self.policy.max_items:
+            excess = live - int(self.policy.max_items * self.policy.low_watermark)
+            candidates = np.flatnonzero(alive)
+            protected = np.isin(
+                type_codes[candidates],
+                [MEMORY_TYPES.index(memory_type) for memory_type in self.policy.protected_types]
+            )
+            last_access = np.array(self._last_access)[candidates]
+            # lexsort orders by the last key first: unprotected before protected, then oldest access
+            victims.append(candidates[np.lexsort((last_access, protected))[:excess]])
+
+        victims = np.concatenate(victims)
+        if len(victims) == 0:
+            return 0
+        self._evicted.update(victims.tolist())
+        self._evicted_ids = np.array(sorted(self._evicted), dtype=np.int64)
+        if self.path:
+            self._log_evicted.write("".join(f"{self._seq[i]}\n" for i in victims).encode("utf-8"))
+            self._log_evicted.flush()
+        log("Memory", f"Evicted {len(victims)} memories, {len(self)} left")
+        if len(self._evicted) >= self.policy.compact_fraction * n:
+            self._compact()
+        return len(victims)
+
+    # Persistence
+
+    def compact(self) -> None:
+        """Rebuild the search index without evicted memories, folding in the tail (and writing a snapshot, if persistent)."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        n = len(self.data)
+        if self.dimension is None or (n == len(self._base_vectors) and not self._evicted):
+            return
+        start = time.perf_counter()
+        keep = np.ones(n, dtype=bool)
+        keep[self._evicted_ids] = False
+        kept = np.flatnonzero(keep)
+        remap = np.cumsum(keep) - 1
+        vectors = self._vectors(kept)
+        flat = faiss.IndexFlatL2(self.dimension)
+        flat.add(vectors)
+        index = build_index(flat, self.index_config)
+        postings = [p.remapped(keep, remap) for p in (self._by_session, self._by_type, self._by_tag)]
+        columns = {
+            "seq": np.array(self._seq, dtype=np.int64)[kept],
+            "type_code": np.array(self._type_code, dtype=np.int8)[kept],
+            "created": np.array(self._created, dtype=np.float64)[kept],
+            "last_access": np.array(self._last_access, dtype=np.float64)[kept],
+        }
+
+        if not self.path:
+            self.index = index
+            self._base_vectors = vectors
+            self._tail_vectors = []
+            self.data = MemoryItems(items=[self.data[i] for i in kept])
+            self._by_session, self._by_type, self._by_tag = postings
+            self._set_columns(columns)
+            return
+
+        generation = f"gen-{time.time_ns()}"
+        directory = os.path.join(self.path, generation)
+        os.makedirs(directory)
+        write_index(index, os.path.join(directory, SNAPSHOT_INDEX_FILE))
+        np.save(os.path.join(directory, SNAPSHOT_VECTORS_FILE), vectors)
+        offsets = [0]
+        with open(os.path.join(directory, SNAPSHOT_ITEMS_FILE), "wb") as f:
+            for i in kept:
+                offsets.append(offsets[-1] + f.write(self.data.raw(i)))
+        np.save(os.path.join(directory, SNAPSHOT_OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+        np.savez(os.path.join(directory, SNAPSHOT_COLUMNS_FILE), **columns)
+        # Postings of all three fields share one ids array
+        ranges, chunks, offset = {}, [], 0
+        for name, field_postings in zip(("session", "type", "tag"), postings):
+            field_ranges, ids = field_postings.to_csr()
+            ranges[name] = {key: [begin + offset, end + offset] for key, (begin, end) in field_ranges.items()}
+            chunks.append(ids)
+            offset += len(ids)
+        np.save(os.path.join(directory, SNAPSHOT_POSTING_IDS_FILE), np.concatenate(chunks).astype(np.int64))
+        with open(os.path.join(directory, SNAPSHOT_POSTINGS_FILE), "w", encoding="utf-8") as f:
+            json.dump(ranges, f)
+
+        # Publishing the meta file commits the snapshot; log records it covers are skipped on replay
+        self._generation = generation
+        self._write_meta(len(kept))
+        self._close_log()
+        for name in (LOG_ITEMS_FILE, LOG_VECTORS_FILE, LOG_EVICTED_FILE):
+            open(os.path.join(self.path, name), "wb").close()
+        self._load_snapshot()
+        self._remove_stale_generations()
+        self._open_log()
+        log("Memory", f"Compacted {len(kept)} of {n} memories into {generation} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_log()
+
+    def _set_columns(self, columns: Dict[str, np.ndarray]) -> None:
+        self._seq = columns["seq"].tolist()
+        self._type_code = columns["type_code"].tolist()
+        self._created = columns["created"].tolist()
+        self._last_access = columns["last_access"].tolist()
+        self._evicted = set()
+        self._evicted_ids = np.empty(0, dtype=np.int64)
+
+    def _open(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, SNAPSHOT_META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dimension = meta["dimension"]
+            self._generation = meta["generation"]
+            self._next_seq = meta["next_seq"]
+            if self._generation:
+                self._load_snapshot()
+        self._remove_stale_generations()
+        self._replay_log()
+        self._open_log()
+
+    def _load_snapshot(self) -> None:
+        directory = os.path.join(self.path, self._generation)
+        self.index = read_index(os.path.join(directory, SNAPSHOT_INDEX_FILE))
+        self._base_vectors = np.load(os.path.join(directory, SNAPSHOT_VECTORS_FILE), mmap_mode="r")
+        offsets = np.load(os.path.join(directory, SNAPSHOT_OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, SNAPSHOT_ITEMS_FILE), "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        self.data = MemoryItems(blob, offsets)
+        self._tail_vectors = []
+        with open(os.path.join(directory, SNAPSHOT_POSTINGS_FILE), "r", encoding="utf-8") as f:
+            ranges = json.load(f)
+        ids = np.load(os.path.join(directory, SNAPSHOT_POSTING_IDS_FILE), mmap_mode="r")
+        self._by_session = Postings(ranges["session"], ids)
+        self._by_type = Postings(ranges["type"], ids)
+        self._by_tag = Postings(ranges["tag"], ids)
+        with np.load(os.path.join(directory, SNAPSHOT_COLUMNS_FILE)) as columns:
+            self._set_columns(dict(columns))
+
+    def _replay_log(self) -> None:
+        """Re-apply logged adds and evictions newer than the snapshot, dropping torn last records."""
+        if self.dimension is None:
+            return
+        items_path = os.path.join(self.path, LOG_ITEMS_FILE)
+        vectors_path = os.path.join(self.path, LOG_VECTORS_FILE)
+        evicted_path = os.path.join(self.path, LOG_EVICTED_FILE)
+        snapshot_seq = self._next_seq
+        lines = self._read_lines(items_path)
+        row_bytes = 4 * self.dimension
+        rows = os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0
+        count = min(len(lines), rows)
+        if count:
+            vectors = np.fromfile(vectors_path, dtype=np.float32, count=count * self.dimension).reshape(count, -1)
+            for line, emb in zip(lines[:count], vectors):
+                record = json.loads(line)
+                seq = record["seq"]
+                # Records already folded into the snapshot (compaction interrupted before truncating the log)
+                if seq < snapshot_seq:
+                    continue
+                self._append(MemoryItem(**record["item"]), emb, seq)
+        self._truncate(items_path, sum(len(line) + 1 for line in lines[:count]))
+        self._truncate(vectors_path, count * row_bytes)
+
+        evicted_lines = self._read_lines(evicted_path)
+        if evicted_lines:
+            # Sequence numbers increase with position, so positions are found by binary search
+            seqs = np.array(self._seq, dtype=np.int64)
+            logged = np.array([int(line) for line in evicted_lines], dtype=np.int64)
+            found = np.minimum(np.searchsorted(seqs, logged), len(seqs) - 1)
+            positions = found[seqs[found] == logged]
+            self._evicted.update(positions.tolist())
+            self._evicted_ids = np.array(sorted(self._evicted), dtype=np.int64)
+        self._truncate(evicted_path, sum(len(line) + 1 for line in evicted_lines))
+        if count or evicted_lines:
+            log("Memory", f"Replayed {count} logged memories and {len(evicted_lines)} evictions on top of {len(self._base_vectors)}")
+
+    @staticmethod
+    def _read_lines(path: str) -> List[bytes]:
+        """Complete lines of a log; a partial last line from an interrupted write is left out."""
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            return f.read().split(b"\n")[:-1]
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _open_log(self) -> None:
+        self._log_items = open(os.path.join(self.path, LOG_ITEMS_FILE), "ab")
+        self._log_vectors = open(os.path.join(self.path, LOG_VECTORS_FILE), "ab")
+        self._log_evicted = open(os.path.join(self.path, LOG_EVICTED_FILE), "ab")
+
+    def _close_log(self) -> None:
+        for f in (self._log_items, self._log_vectors, self._log_evicted):
+            if f is not None:
+                f.close()
+        self._log_items = self._log_vectors = self._log_evicted = None
+
+    def _log(self, seq: int, item: MemoryItem, emb: np.ndarray) -> None:
+        # Vector first: a record only counts once its JSON line is complete
+        self._log_vectors.write(emb.tobytes())
+        self._log_vectors.flush()
+        record = {"seq": seq, "item": item.model_dump(mode="json")}
+        self._log_items.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._log_items.flush()
+
+    def _write_meta(self, count: Optional[int] = None) -> None:
+        path = os.path.join(self.path, SNAPSHOT_META_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "generation": self._generation,
+                "count": len(self._base_vectors) if count is None else count,
+                "dimension": self.dimension,
+                # Every memory with a lower sequence number is in the snapshot or was evicted
+                "next_seq": self._next_seq if self._generation else 0
+            }, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _remove_stale_generations(self) -> None:
+        """Delete snapshot directories other than the current one; open maps may delay this on Windows."""
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name != self._generation:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
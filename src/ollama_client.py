@@ -0,0 +1,135 @@
+import json
+import asyncio
+import httpx
+import numpy as np
+from typing import Any, AsyncIterator, Dict, List
+
+# Optional: import log from agent if shared, else define locally
+try:
+    from agent import log
+except ImportError:
+    import datetime
+    def log(stage: str, msg: str):
+        now = datetime.datetime.now().strftime("%H:%M:%S")
+        print(f"[{now}] [{stage}] {msg}")
+
+OLLAMA_URL = "http://localhost:11434"
+GENERATE_MODEL = "gemma3:1b"
+EMBED_MODEL = "nomic-embed-text"
+# How long Ollama keeps the model, and with it the KV cache of the shared prompt prefixes, loaded after a call
+KEEP_ALIVE = "30m"
+
+
+def log_timings(stage: str, data: Dict[str, Any]) -> None:
+    """Log prompt evaluation vs. generation time of a final Ollama response (a no-op for other chunks)."""
+    if not data.get("done") or "eval_duration" not in data:
+        return
+    ms = lambda key: data.get(key, 0) / 1e6
+    log(stage, (
+        f"Prompt eval {data.get('prompt_eval_count', 0)} tokens in {ms('prompt_eval_duration'):.0f} ms, "
+        f"generation {data.get('eval_count', 0)} tokens in {ms('eval_duration'):.0f} ms, "
+        f"load {ms('load_duration'):.0f} ms, total {ms('total_duration'):.0f} ms"
+    ))
+
+
+class OllamaClient:
+    """Async Ollama client for the agent loop.
+
+    All calls share one pooled httpx connection pool, so requests reuse
+    keep-alive connections instead of blocking the event loop on `requests`.
+    A semaphore caps the requests in flight (a local Ollama serves only a few
+    generations in parallel; the rest would just queue server-side), and
+    connection errors, timeouts and 5xx responses are retried with backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        max_concurrency: int = 4,
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        keep_alive: str = KEEP_ALIVE
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.keep_alive = keep_alive
+        self._use_legacy_embeddings = False
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+
+    async def __aenter__(self) -> "OllamaClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def generate(self, prompt: str, model: str = GENERATE_MODEL, **options: Any) -> Dict[str, Any]:
+        """Non-streaming /api/generate call; returns Ollama's response object (text under "response")."""
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive, **options}
+        return await self._post("/api/generate", payload)
+
+    async def stream_generate(self, prompt: str, model: str = GENERATE_MODEL, **options: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming /api/generate call yielding Ollama's chunks as they arrive.
+
+        Closing the generator early (e.g. through contextlib.aclosing) closes
+        the connection, and Ollama stops generating. Streams are not retried,
+        since part of the output may already have been consumed.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive, **options}
+        async with self._semaphore:
+            async with self._client.stream("POST", "/api/generate", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+
+    async def embed(self, texts: List[str], model: str = EMBED_MODEL) -> List[np.ndarray]:
+        """Embeddings for texts in order, falling back to /api/embeddings on servers without /api/embed."""
+        if not self._use_legacy_embeddings:
+            try:
+                data = await self._post("/api/embed", {"model": model, "input": texts})
+                return [np.array(embedding, dtype=np.float32) for embedding in data["embeddings"]]
+            except httpx.HTTPStatusError as e:
+                # Ollama also answers 404 for a model that is not pulled; only a missing endpoint falls back
+                text = e.response.text.lower()
+                if e.response.status_code != 404 or ("model" in text and "not found" in text):
+                    raise
+                log("ollama", "No /api/embed endpoint, using /api/embeddings")
+                self._use_legacy_embeddings = True
+
+        async def embed_one(text: str) -> np.ndarray:
+            data = await self._post("/api/embeddings", {"model": model, "prompt": text})
+            embedding = np.array(data["embedding"], dtype=np.float32)
+            # /api/embed returns unit vectors; keep both endpoints comparable
+            norm = np.linalg.norm(embedding)
+            return embedding / norm if norm else embedding
+
+        return list(await asyncio.gather(*(embed_one(text) for text in texts)))
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        async with self._semaphore:
+            for attempt in range(self.max_retries):
+                try:
+                    response = await self._client.post(path, json=payload)
+                    response.raise_for_status()
+                    return response.json()
+                except httpx.HTTPStatusError as e:
+                    # Client errors will not succeed on retry
+                    if e.response.status_code < 500 or attempt == self.max_retries - 1:
+                        raise
+                except httpx.TransportError:
+                    if attempt == self.max_retries - 1:
+                        raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
@@ -0,0 +1,387 @@
+import os
+import re
+import json
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+ORDERS_FILE = "orders.npz"
+ORDERS_DICT_FILE = "orders_dict.json"
+
+# Header keywords per column role, checked in this order
+COLUMN_KEYWORDS = {
+    "order_id": ("order id", "order no", "order number", "order #"),
+    "date": ("order date", "ordered on", "date", "time"),
+    "restaurant": ("restaurant", "outlet", "store", "merchant"),
+    "items": ("items", "item", "dish", "description"),
+    "amount": ("order total", "total amount", "grand total", "amount paid", "total", "amount", "paid", "bill"),
+    "fees": ("fee", "charge", "packaging", "delivery", "tax", "gst"),
+}
+
+DATE_FORMATS = (
+    "%d %b %Y, %I:%M %p", "%d %b %Y %I:%M %p", "%d %b %Y, %H:%M", "%d %b %Y %H:%M",
+    "%d-%m-%Y %H:%M", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S",
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%d-%m-%Y", "%d/%m/%Y",
+    "%Y-%m-%d", "%d-%b-%Y", "%d %b, %Y",
+)
+
+ITEM_QTY_SUFFIX = re.compile(r"^(.*?)\s*[x×*]\s*(\d+)$", re.IGNORECASE)
+ITEM_QTY_PREFIX = re.compile(r"^(\d+)\s*[x×]\s+(.*)$", re.IGNORECASE)
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+@dataclass
+class Order:
+    source: str
+    page: int
+    amount: float
+    fees: float = 0.0
+    timestamp: Optional[datetime] = None
+    has_time: bool = False
+    restaurant: str = ""
+    order_id: str = ""
+    items: List[Tuple[str, int]] = field(default_factory=list)
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """First number in a cell such as "₹1,234.50" or "Rs. 250"; None if there is none."""
+    match = NUMBER.search(text.replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def parse_date(text: str) -> Tuple[Optional[datetime], bool]:
+    """Parse a statement date; returns (datetime, whether it carried a time of day)."""
+    text = " ".join(text.split())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt), "%H" in fmt or "%I" in fmt
+        except ValueError:
+            continue
+    return None, False
+
+
+def parse_items(text: str) -> List[Tuple[str, int]]:
+    """Split an items cell like "Paneer Tikka x 2, Naan x 1" into (name, quantity) pairs."""
+    items = []
+    for part in re.split(r"[,;\n]", text):
+        part = part.strip()
+        if not part:
+            continue
+        match = ITEM_QTY_SUFFIX.match(part)
+        if match:
+            items.append((match.group(1).strip(), int(match.group(2))))
+            continue
+        match = ITEM_QTY_PREFIX.match(part)
+        if match:
+            items.append((match.group(2).strip(), int(match.group(1))))
+        else:
+            items.append((part, 1))
+    return items
+
+
+class OrderTableParser:
+    """Turns extracted statement tables into Orders.
+
+    Columns are identified from header keywords. Tables continuing on a later
+    page without their header reuse the last header seen with the same width.
+    """
+
+    def __init__(self):
+        self.last_header: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _match_header(row: List[str]) -> Optional[Dict[str, Any]]:
+        roles: Dict[str, Any] = {"fees": []}
+        for col, cell in enumerate(row):
+            label = cell.lower()
+            # A column takes the first role whose keywords match; later duplicates are ignored
+            role = next(
+                (role for role, keywords in COLUMN_KEYWORDS.items()
+                 if any(keyword in label for keyword in keywords)),
+                None
+            )
+            if role == "fees":
+                roles["fees"].append(col)
+            elif role is not None and role not in roles:
+                roles[role] = col
+        # An order table needs at least an amount and a date or restaurant
+        if "amount" in roles and ("date" in roles or "restaurant" in roles):
+            roles["width"] = len(row)
+            return roles
+        return None
+
+    def parse(self, tables: List[List[List[str]]], source: str, page: int) -> List[Order]:
+        orders = []
+        for table in tables:
+            if not table:
+                continue
+            header = self._match_header(table[0])
+            rows = table[1:]
+            if header is None:
+                if self.last_header is None or self.last_header["width"] != len(table[0]):
+                    continue
+                header, rows = self.last_header, table
+            self.last_header = header
+
+            for row in rows:
+                order = self._parse_row(row, header, source, page)
+                if order is not None:
+                    orders.append(order)
+        return orders
+
+    @staticmethod
+    def _parse_row(row: List[str], header: Dict[str, Any], source: str, page: int) -> Optional[Order]:
+        def cell(role: str) -> str:
+            col = header.get(role)
+            return row[col] if col is not None and col < len(row) else ""
+
+        amount = parse_amount(cell("amount"))
+        if amount is None:
+            return None
+        timestamp, has_time = parse_date(cell("date"))
+        restaurant = " ".join(cell("restaurant").split())
+        # Skip totals/summary rows that carry an amount but nothing identifying an order
+        if timestamp is None and not restaurant:
+            return None
+        fees = sum(
+            parse_amount(row[col]) or 0.0
+            for col in header["fees"] if col < len(row) and col != header.get("amount")
+        )
+        return Order(
+            source=source,
+            page=page,
+            amount=amount,
+            fees=fees,
+            timestamp=timestamp,
+            has_time=has_time,
+            restaurant=restaurant,
+            order_id=cell("order_id").strip(),
+            items=parse_items(cell("items"))
+        )
+
+
+class OrderStore:
+    """Columnar store of parsed orders with vectorized aggregations.
+
+    One row per order (timestamp, amount, fees, restaurant code, source code,
+    page) plus an exploded item table (order row, item code, quantity). String
+    columns are dictionary-encoded.
+    """
+
+    def __init__(self):
+        self.timestamp = np.array([], dtype="datetime64[s]")
+        self.has_time = np.array([], dtype=bool)
+        self.amount = np.array([], dtype=np.float64)
+        self.fees = np.array([], dtype=np.float64)
+        self.restaurant = np.array([], dtype=np.int32)
+        self.source = np.array([], dtype=np.int32)
+        self.page = np.array([], dtype=np.int32)
+        self.order_ids: List[str] = []
+        self.item_order = np.array([], dtype=np.int64)
+        self.item_code = np.array([], dtype=np.int32)
+        self.item_qty = np.array([], dtype=np.int32)
+        self.restaurants: List[str] = []
+        self.items: List[str] = []
+        self.sources: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    @staticmethod
+    def _code(values: List[str], value: str, lookup: Dict[str, int]) -> int:
+        if value not in lookup:
+            lookup[value] = len(values)
+            values.append(value)
+        return lookup[value]
+
+    def add(self, orders: List[Order]) -> None:
+        if not orders:
+            return
+        restaurant_codes = {name: i for i, name in enumerate(self.restaurants)}
+        item_codes = {name: i for i, name in enumerate(self.items)}
+        source_codes = {name: i for i, name in enumerate(self.sources)}
+        base = len(self)
+
+        item_order, item_code, item_qty = [], [], []
+        for offset, order in enumerate(orders):
+            for name, qty in order.items:
+                item_order.append(base + offset)
+                item_code.append(self._code(self.items, name, item_codes))
+                item_qty.append(qty)
+
+        self.timestamp = np.concatenate([self.timestamp, np.array(
+            [o.timestamp for o in orders], dtype="datetime64[s]"
+        )])
+        self.has_time = np.concatenate([self.has_time, np.array([o.has_time for o in orders], dtype=bool)])
+        self.amount = np.concatenate([self.amount, np.array([o.amount for o in orders], dtype=np.float64)])
+        self.fees = np.concatenate([self.fees, np.array([o.fees for o in orders], dtype=np.float64)])
+        self.restaurant = np.concatenate([self.restaurant, np.array(
+            [self._code(self.restaurants, o.restaurant, restaurant_codes) for o in orders], dtype=np.int32
+        )])
+        self.source = np.concatenate([self.source, np.array(
+            [self._code(self.sources, o.source, source_codes) for o in orders], dtype=np.int32
+        )])
+        self.page = np.concatenate([self.page, np.array([o.page for o in orders], dtype=np.int32)])
+        self.order_ids.extend(o.order_id for o in orders)
+        self.item_order = np.concatenate([self.item_order, np.array(item_order, dtype=np.int64)])
+        self.item_code = np.concatenate([self.item_code, np.array(item_code, dtype=np.int32)])
+        self.item_qty = np.concatenate([self.item_qty, np.array(item_qty, dtype=np.int32)])
+
+    def rows(self, source: str, pages: Optional[List[int]] = None) -> np.ndarray:
+        """Boolean mask of the orders parsed from a source file, or only from some of its pages."""
+        if source not in self.sources:
+            return np.zeros(len(self), dtype=bool)
+        rows = self.source == self.sources.index(source)
+        if pages is not None:
+            rows &= np.isin(self.page, np.array(list(pages), dtype=np.int32))
+        return rows
+
+    def remove(self, source: str, pages: Optional[List[int]] = None) -> int:
+        """Drop orders parsed from a source file, or only from some of its pages; returns the count."""
+        drop = self.rows(source, pages)
+        if not drop.any():
+            return 0
+        self._keep(~drop)
+        return int(drop.sum())
+
+    def _keep(self, keep: np.ndarray) -> None:
+        new_positions = np.cumsum(keep) - 1
+        item_keep = keep[self.item_order] if len(self.item_order) else np.array([], dtype=bool)
+        self.item_order = new_positions[self.item_order[item_keep]]
+        self.item_code = self.item_code[item_keep]
+        self.item_qty = self.item_qty[item_keep]
+        for name in ("timestamp", "has_time", "amount", "fees", "restaurant", "source", "page"):
+            setattr(self, name, getattr(self, name)[keep])
+        self.order_ids = [order_id for order_id, k in zip(self.order_ids, keep) if k]
+
+    # Vectorized analytics
+
+    def mask(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        restaurant: Optional[str] = None
+    ) -> np.ndarray:
+        """Boolean row mask for an inclusive ISO date range and a restaurant substring."""
+        mask = np.ones(len(self), dtype=bool)
+        if start:
+            mask &= self.timestamp >= np.datetime64(start, "D")
+        if end:
+            mask &= self.timestamp < np.datetime64(end, "D") + np.timedelta64(1, "D")
+        if restaurant:
+            needle = restaurant.lower()
+            matching = [i for i, name in enumerate(self.restaurants) if needle in name.lower()]
+            mask &= np.isin(self.restaurant, matching)
+        return mask
+
+    def totals(self, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        mask = self.mask() if mask is None else mask
+        count = int(mask.sum())
+        amount = float(self.amount[mask].sum())
+        return {
+            "orders": count,
+            "total_amount": round(amount, 2),
+            "total_fees": round(float(self.fees[mask].sum()), 2),
+            "average_order_value": round(amount / count, 2) if count else 0.0,
+            "median_order_value": round(float(np.median(self.amount[mask])), 2) if count else 0.0,
+            "max_order_value": round(float(self.amount[mask].max()), 2) if count else 0.0,
+        }
+
+    def top_items(self, n: int = 10, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        if len(self.item_code) == 0:
+            return []
+        selected = np.ones(len(self.item_code), dtype=bool) if mask is None else mask[self.item_order]
+        quantities = np.bincount(
+            self.item_code[selected], weights=self.item_qty[selected], minlength=len(self.items)
+        )
+        orders = np.bincount(self.item_code[selected], minlength=len(self.items))
+        top = np.argsort(-quantities, kind="stable")[:n]
+        return [
+            {"item": self.items[i], "quantity": int(quantities[i]), "orders": int(orders[i])}
+            for i in top if quantities[i] > 0
+        ]
+
+    def top_restaurants(self, n: int = 10, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        mask = self.mask() if mask is None else mask
+        if not mask.any():
+            return []
+        spend = np.bincount(self.restaurant[mask], weights=self.amount[mask], minlength=len(self.restaurants))
+        orders = np.bincount(self.restaurant[mask], minlength=len(self.restaurants))
+        top = np.argsort(-spend, kind="stable")[:n]
+        return [
+            {"restaurant": self.restaurants[i], "total_amount": round(float(spend[i]), 2), "orders": int(orders[i])}
+            for i in top if orders[i] > 0
+        ]
+
+    def histogram(self, bucket: str = "month", mask: Optional[np.ndarray] = None) -> Dict[str, Dict[str, Any]]:
+        """Order counts and spend per day, week, month, year, weekday or hour of day."""
+        mask = (self.mask() if mask is None else mask) & ~np.isnat(self.timestamp)
+        if bucket == "hour":
+            mask &= self.has_time
+        timestamps = self.timestamp[mask]
+        if bucket in ("day", "week", "month", "year"):
+            if bucket == "week":
+                # numpy weeks start on Thursday (the epoch); label them by their Monday
+                days = timestamps.astype("datetime64[D]")
+                periods = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+            else:
+                unit = {"day": "D", "month": "M", "year": "Y"}[bucket]
+                periods = timestamps.astype(f"datetime64[{unit}]")
+            keys, inverse = np.unique(periods, return_inverse=True)
+            labels = [str(key) for key in keys]
+        elif bucket == "weekday":
+            inverse = (timestamps.astype("datetime64[D]").astype(np.int64) + 3) % 7
+            labels = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        elif bucket == "hour":
+            inverse = (timestamps - timestamps.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+            labels = [f"{hour:02d}:00" for hour in range(24)]
+        else:
+            raise ValueError(f"Unknown bucket '{bucket}'")
+
+        counts = np.bincount(inverse, minlength=len(labels))
+        spend = np.bincount(inverse, weights=self.amount[mask], minlength=len(labels))
+        return {
+            label: {"orders": int(counts[i]), "total_amount": round(float(spend[i]), 2)}
+            for i, label in enumerate(labels) if counts[i]
+        }
+
+    # Persistence
+
+    def save(self, index_dir: str) -> None:
+        path = os.path.join(index_dir, ORDERS_FILE)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                timestamp=self.timestamp, has_time=self.has_time, amount=self.amount,
+                fees=self.fees, restaurant=self.restaurant, source=self.source, page=self.page,
+                item_order=self.item_order, item_code=self.item_code, item_qty=self.item_qty
+            )
+        dict_path = os.path.join(index_dir, ORDERS_DICT_FILE)
+        with open(f"{dict_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "restaurants": self.restaurants,
+                "items": self.items,
+                "sources": self.sources,
+                "order_ids": self.order_ids
+            }, f)
+        os.replace(f"{path}.tmp", path)
+        os.replace(f"{dict_path}.tmp", dict_path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["OrderStore"]:
+        path = os.path.join(index_dir, ORDERS_FILE)
+        dict_path = os.path.join(index_dir, ORDERS_DICT_FILE)
+        if not (os.path.exists(path) and os.path.exists(dict_path)):
+            return None
+        store = cls()
+        with np.load(path) as arrays:
+            for name in arrays.files:
+                setattr(store, name, arrays[name])
+        with open(dict_path, "r", encoding="utf-8") as f:
+            dictionary = json.load(f)
+        store.restaurants = dictionary["restaurants"]
+        store.items = dictionary["items"]
+        store.sources = dictionary["sources"]
+        store.order_ids = dictionary["order_ids"]
+        return store
@@ -1,10 +1,16 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 import os
+import time
+import numpy as np
 from dotenv import load_dotenv
 import re
 import requests
 import logging
+from ollama_client import KEEP_ALIVE, OllamaClient, log_timings
+from prompt_templates import PERCEPTION_TEMPLATE
+from query_cache import LRUCache, QueryCache
+from embedding_client import EmbeddingClient
 
 # Optional: import log from agent if shared, else define locally
 try:
@@ -41,26 +47,255 @@ OLLAMA_API_URL = "http://localhost:11434/api/generate"
 
 class PerceptionResult(BaseModel):
     user_input: str
-    intent: Optional[str]
+    intent: Optional[str] = None
     entities: List[str] = []
     tool_hint: Optional[str] = None
 
 
-def extract_perception(user_input: str) -> PerceptionResult:
-    """Extracts intent, entities, and tool hints using LLM"""
+# The intents most traffic falls into: keyword phrases, example questions for
+# embedding similarity, and the MCP tool that answers them
+KNOWN_INTENTS: Dict[str, Dict[str, List[str]]] = {
+    "order summary": {
+        "keywords": ["summary", "summarize", "summarise", "overview", "all my orders", "how many orders", "total orders", "total spent", "total spend"],
+        "examples": ["Give me a summary of all my orders", "How much have I spent in total?", "How many orders did I place?"],
+        "tool_hint": "order_summary",
+    },
+    "average order value": {
+        "keywords": ["average order", "avg order", "aov", "average spend", "average amount", "per order", "average value"],
+        "examples": ["What's my average order value?", "How much do I spend per order on average?"],
+        "tool_hint": "order_summary",
+    },
+    "spending trends": {
+        "keywords": ["trend", "trends", "pattern", "patterns", "over time", "monthly", "weekly", "per month", "per week", "by month", "habits"],
+        "examples": ["What are my spending trends?", "Show me my ordering patterns", "How has my spending changed over the months?"],
+        "tool_hint": "spending_dashboard",
+    },
+    "top items": {
+        "keywords": ["top items", "most ordered", "favourite", "favorite", "most frequent", "order the most", "ordered most", "popular items", "top dishes"],
+        "examples": ["What are my most ordered items?", "Which dishes do I order the most?"],
+        "tool_hint": "top_ordered_items",
+    },
+}
+
+
+class IntentClassifier:
+    """Local fast path for perception over KNOWN_INTENTS.
+
+    Keyword phrases are matched first (microseconds); when they are absent or
+    ambiguous, the input embedding is compared with each intent's example
+    questions. Only a clear winner counts, anything else goes to the LLM.
+    """
+
+    def __init__(
+        self,
+        intents: Dict[str, Dict[str, List[str]]] = KNOWN_INTENTS,
+        similarity_threshold: float = 0.75,
+        similarity_margin: float = 0.05
+    ):
+        self.intents = intents
+        self.similarity_threshold = similarity_threshold
+        self.similarity_margin = similarity_margin
+        self._patterns = {
+            intent: [(keyword, re.compile(rf"\b{re.escape(keyword)}\b")) for keyword in spec["keywords"]]
+            for intent, spec in intents.items()
+        }
+        self.examples: List[Tuple[str, str]] = [
+            (intent, example) for intent, spec in intents.items() for example in spec["examples"]
+        ]
+        # Unit-normalized example embeddings, filled in on first use
+        self.example_vectors: Optional[np.ndarray] = None
+
+    def by_keywords(self, text: str) -> Optional[Tuple[str, List[str]]]:
+        """(intent, matched keywords) if exactly one intent has the most keyword matches."""
+        text = QueryCache.normalize(text)
+        matches = {
+            intent: [keyword for keyword, pattern in patterns if pattern.search(text)]
+            for intent, patterns in self._patterns.items()
+        }
+        ranked = sorted(matches.items(), key=lambda entry: -len(entry[1]))
+        if not ranked[0][1] or (len(ranked) > 1 and len(ranked[1][1]) == len(ranked[0][1])):
+            return None
+        return ranked[0]
+
+    def set_example_vectors(self, vectors: List[np.ndarray]) -> None:
+        matrix = np.array(vectors, dtype=np.float32)
+        self.example_vectors = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def by_embedding(self, vector: np.ndarray) -> Optional[str]:
+        """Intent whose closest example is similar enough and clearly closer than any other intent's."""
+        vector = np.asarray(vector, dtype=np.float32)
+        similarities = self.example_vectors @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+        best: Dict[str, float] = {}
+        for (intent, _), similarity in zip(self.examples, similarities):
+            best[intent] = max(best.get(intent, -1.0), float(similarity))
+        ranked = sorted(best.items(), key=lambda entry: -entry[1])
+        top_intent, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if top >= self.similarity_threshold and top - runner_up >= self.similarity_margin:
+            return top_intent
+        return None
+
+    def result(self, user_input: str, intent: str, entities: List[str]) -> PerceptionResult:
+        return PerceptionResult(
+            user_input=user_input,
+            intent=intent,
+            entities=entities,
+            tool_hint=self.intents[intent]["tool_hint"]
+        )
+
+
+# Entities the fast path extracts itself: amounts, dates and restaurant names
+_MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?"
+_DAY = r"\d{1,2}(?:st|nd|rd|th)?\b"
+ENTITY_PATTERNS = [
+    re.compile(r"(?:₹|\brs\.?|\binr)\s*\d[\d,]*(?:\.\d+)?|\b\d[\d,]*(?:\.\d+)?\s*(?:rupees|rs\b|inr\b)", re.IGNORECASE),
+    re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b"),
+    # A month with a day or year, or a full month name other than the ambiguous "May"
+    re.compile(
+        rf"\b{_DAY}\s+{_MONTH}(?:,?\s+\d{{4}}\b)?|\b{_MONTH}\s+(?:{_DAY}(?:,?\s+\d{{4}}\b)?|\d{{4}}\b)"
+        r"|\b(?:january|february|march|april|june|july|august|september|october|november|december)\b",
+        re.IGNORECASE
+    ),
+    re.compile(r"\b(?:19|20)\d{2}\b"),
+    # Capitalized names after "from"/"at", e.g. "orders from Burger King"
+    re.compile(r"(?<=\bfrom )(?:[A-Z][\w'&.-]*)(?:\s+(?:[A-Z][\w'&.-]*|&))*|(?<=\bat )(?:[A-Z][\w'&.-]*)(?:\s+(?:[A-Z][\w'&.-]*|&))*"),
+]
+
+
+def extract_entities(text: str) -> List[str]:
+    """Amounts, dates and restaurant names in text, in order of appearance, without overlaps."""
+    spans = sorted(
+        (match.start(), -match.end(), match.group().strip())
+        for pattern in ENTITY_PATTERNS
+        for match in pattern.finditer(text)
+    )
+    entities, end = [], 0
+    for start, negative_end, entity in spans:
+        # Longest match first at each position; anything inside it is skipped
+        if start >= end and entity:
+            entities.append(entity)
+            end = -negative_end
+    return list(dict.fromkeys(entities))
+
+
+intent_classifier = IntentClassifier()
+# Perception results by normalized input; shared by the sync and async paths
+perception_cache = LRUCache(max_entries=1024)
+_embedder: Optional[EmbeddingClient] = None
+
+
+def original_task(user_input: str) -> Optional[str]:
+    """The original task of one of the agent's later steps, or None for a first step."""
+    match = re.match(r"\s*Original task:\s*(.*?)\s*\nPrevious output:", user_input, re.DOTALL)
+    return match.group(1) if match else None
+
+
+def _get_embedder() -> EmbeddingClient:
+    global _embedder
+    if _embedder is None:
+        _embedder = EmbeddingClient()
+    return _embedder
+
+
+def build_perception_prompt(user_input: str) -> str:
+    return PERCEPTION_TEMPLATE.render(user_input=user_input)
+
+
+def parse_perception(user_input: str, raw: str) -> PerceptionResult:
+    """Turns the LLM's dictionary output into a PerceptionResult."""
+    log("perception", f"LLM output: {raw}")
+
+    # Strip Markdown backticks if present
+    clean = re.sub(r"^```json|```$", "", raw.strip(), flags=re.MULTILINE).strip()
+
+    try:
+        parsed = eval(clean)
+    except Exception as e:
+        log("perception", f"⚠️ Failed to parse cleaned output: {e}")
+        raise
 
-    prompt = f"""
-You are an AI that extracts structured facts from user input.
+    # Fix common issues
+    if isinstance(parsed.get("entities"), dict):
+        parsed["entities"] = list(parsed["entities"].values())
 
-Input: "{user_input}"
+    return PerceptionResult(user_input=user_input, **parsed)
 
-Return the response as a Python dictionary with keys:
-- intent: (brief phrase about what the user wants)
-- entities: a list of strings representing keywords or values (e.g., ["INDIA", "ASCII"])
-- tool_hint: (name of the MCP tool that might be useful, if any)
 
-Output only the dictionary on a single line. Do NOT wrap it in ```json or other formatting. Ensure `entities` is a list of strings, not a dictionary.
+def extract_perception(user_input: str) -> PerceptionResult:
+    """Extracts intent, entities, and tool hints: from the cache, the local classifier, or else the LLM.
+
+    A later step keeps the perception of its original task; the previous
+    output it carries reaches the planner through user_input.
     """
+    task = original_task(user_input)
+    if task is not None:
+        return extract_perception(task).model_copy(update={"user_input": user_input})
+    start = time.perf_counter()
+    result = _fast_perception(user_input)
+    if result is None:
+        try:
+            embedder = _get_embedder()
+            if intent_classifier.example_vectors is None:
+                intent_classifier.set_example_vectors(embedder.embed_many([example for _, example in intent_classifier.examples]))
+            result = _embedding_perception(user_input, embedder.embed(user_input))
+        except Exception as e:
+            log("perception", f"⚠️ Embedding fast path unavailable: {e}")
+    if result is None:
+        return _remember(user_input, llm_perception(user_input))
+    log("perception", f"Fast path: {result.intent} in {(time.perf_counter() - start) * 1000:.2f} ms")
+    return _remember(user_input, result)
+
+
+async def extract_perception_async(user_input: str, client: OllamaClient) -> PerceptionResult:
+    """extract_perception over the shared async Ollama client, without blocking the event loop."""
+    task = original_task(user_input)
+    if task is not None:
+        return (await extract_perception_async(task, client)).model_copy(update={"user_input": user_input})
+    start = time.perf_counter()
+    result = _fast_perception(user_input)
+    if result is None:
+        try:
+            embedder = _get_embedder()
+            if intent_classifier.example_vectors is None:
+                examples = [example for _, example in intent_classifier.examples]
+                intent_classifier.set_example_vectors(await client.embed(examples, embedder.model))
+            result = _embedding_perception(user_input, await embedder.aembed(user_input, client))
+        except Exception as e:
+            log("perception", f"⚠️ Embedding fast path unavailable: {e}")
+    if result is None:
+        return _remember(user_input, await llm_perception_async(user_input, client))
+    log("perception", f"Fast path: {result.intent} in {(time.perf_counter() - start) * 1000:.2f} ms")
+    return _remember(user_input, result)
+
+
+def _fast_perception(user_input: str) -> Optional[PerceptionResult]:
+    """Cached result, or a keyword match."""
+    cached = perception_cache.get(QueryCache.normalize(user_input))
+    if cached is not None:
+        return cached
+    match = intent_classifier.by_keywords(user_input)
+    if match is None:
+        return None
+    intent, keywords = match
+    return intent_classifier.result(user_input, intent, keywords + extract_entities(user_input))
+
+
+def _embedding_perception(user_input: str, vector: np.ndarray) -> Optional[PerceptionResult]:
+    intent = intent_classifier.by_embedding(vector)
+    return intent_classifier.result(user_input, intent, extract_entities(user_input)) if intent else None
+
+
+def _remember(user_input: str, result: PerceptionResult) -> PerceptionResult:
+    # Failed extractions are not cached, so the next call retries the LLM
+    if result.intent is not None:
+        perception_cache.put(QueryCache.normalize(user_input), result)
+    return result
+
+
+def llm_perception(user_input: str) -> PerceptionResult:
+    """Extracts intent, entities, and tool hints using LLM"""
+
+    prompt = build_perception_prompt(user_input)
 
     try:
         # Call Ollama API
@@ -69,28 +304,26 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
             json={
                 "model": "gemma3:1b",
                 "prompt": prompt,
-                "stream": False
+                "stream": False,
+                "keep_alive": KEEP_ALIVE
             }
         )
         response.raise_for_status()
-        raw = response.json()["response"].strip()
-        log("perception", f"LLM output: {raw}")
-
-        # Strip Markdown backticks if present
-        clean = re.sub(r"^```json|```$", "", raw.strip(), flags=re.MULTILINE).strip()
+        data = response.json()
+        log_timings("perception", data)
+        return parse_perception(user_input, data["response"].strip())
 
-        try:
-            parsed = eval(clean)
-        except Exception as e:
-            log("perception", f"⚠️ Failed to parse cleaned output: {e}")
-            raise
-
-        # Fix common issues
-        if isinstance(parsed.get("entities"), dict):
-            parsed["entities"] = list(parsed["entities"].values())
+    except Exception as e:
+        log("perception", f"⚠️ Extraction failed: {e}")
+        return PerceptionResult(user_input=user_input)
 
-        return PerceptionResult(user_input=user_input, **parsed)
 
+async def llm_perception_async(user_input: str, client: OllamaClient) -> PerceptionResult:
+    """llm_perception over the shared async Ollama client."""
+    try:
+        data = await client.generate(build_perception_prompt(user_input), model="gemma3:1b")
+        log_timings("perception", data)
+        return parse_perception(user_input, data["response"].strip())
     except Exception as e:
         log("perception", f"⚠️ Extraction failed: {e}")
         return PerceptionResult(user_input=user_input)
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A prompt split into a static prefix and a per-call suffix.
+
+    Ollama keeps the KV cache of the last prompt in each slot of a loaded
+    model and only evaluates the tokens after the longest common prefix, so
+    everything that stays the same across calls (rules, examples, tool list)
+    goes first and byte-identical, and only the suffix changes per call.
+    """
+    prefix: str
+    suffix: str
+
+    def render_prefix(self, static: Optional[Dict[str, str]] = None) -> str:
+        return self.prefix.format(**(static or {}))
+
+    def render(self, static: Optional[Dict[str, str]] = None, **variables: str) -> str:
+        """Full prompt: the prefix filled with per-session values, then the suffix with per-call values."""
+        return self.render_prefix(static) + self.suffix.format(**variables)
+
+
+PERCEPTION_TEMPLATE = PromptTemplate(
+    prefix="""
+You are an AI that extracts structured facts from user input.
+
+Return the response as a Python dictionary with keys:
+- intent: (brief phrase about what the user wants)
+- entities: a list of strings representing keywords or values (e.g., ["INDIA", "ASCII"])
+- tool_hint: (name of the MCP tool that might be useful, if any)
+
+Output only the dictionary on a single line. Do NOT wrap it in ```json or other formatting. Ensure `entities` is a list of strings, not a dictionary.
+""",
+    suffix="""
+Input: "{user_input}"
+"""
+)
+
+# Static per session: tool_context. Per step: memory_texts and the perception fields.
+PLAN_TEMPLATE = PromptTemplate(
+    prefix="""
+You are a reasoning-driven AI agent with access to tools. Your job is to solve the user's request step-by-step by reasoning through the problem, selecting a tool if needed, and continuing until the FINAL_ANSWER is produced.
+
+Always follow this loop:
+
+1. Think step-by-step about the problem.
+2. If a tool is needed, respond using the format:
+   FUNCTION_CALL: tool_name|param1=value1|param2=value2
+3. When the final answer is known, respond using:
+   FINAL_ANSWER: [your final result]
+
+Guidelines:
+- Respond using EXACTLY ONE of the formats above per step.
+- Do NOT include extra text, explanation, or formatting.
+- Use nested keys (e.g., input.string) and square brackets for lists.
+- You can reference the relevant memories given with the input.
+
+✅ Examples:
+- FUNCTION_CALL: add|a=5|b=3
+- FUNCTION_CALL: strings_to_chars_to_int|input.string=INDIA
+- FUNCTION_CALL: int_list_to_exponential_sum|input.int_list=[73,78,68,73,65]
+- FINAL_ANSWER: [42]
+
+✅ Examples:
+- User asks: "What's the relationship between Cricket and Sachin Tendulkar"
+  - FUNCTION_CALL: search_documents|query="relationship between Cricket and Sachin Tendulkar"
+  - [receives a detailed document]
+  - FINAL_ANSWER: [Sachin Tendulkar is widely regarded as the "God of Cricket" due to his exceptional skills, longevity, and impact on the sport in India. He is the leading run-scorer in both Test and ODI cricket, and the first to score 100 centuries in international cricket. His influence extends beyond his statistics, as he is seen as a symbol of passion, perseverance, and a national icon. ]
+
+
+IMPORTANT:
+- 🚫 Do NOT invent tools. Use only the tools listed below.
+- 📄 If the question may relate to factual knowledge, use the 'search_documents' tool to look for the answer.
+- 🧮 If the question is mathematical or needs calculation, use the appropriate math tool.
+- 🤖 If the previous tool output already contains factual information, DO NOT search again. Instead, summarize the relevant facts and respond with: FINAL_ANSWER: [your answer]
+- Only repeat `search_documents` if the last result was irrelevant or empty.
+- ❌ Do NOT repeat function calls with the same parameters.
+- ❌ Do NOT output unstructured responses.
+- 🧠 Think before each step. Verify intermediate results mentally before proceeding.
+- 💥 If unsure or no tool fits, skip to FINAL_ANSWER: [unknown]
+- ✅ You have only 3 attempts. Final attempt must be FINAL_ANSWER]
+{tool_context}
+""",
+    suffix="""
+Relevant memories:
+{memory_texts}
+
+Input Summary:
+- User input: "{user_input}"
+- Intent: {intent}
+- Entities: {entities}
+- Tool hint: {tool_hint}
+"""
+)
@@ -0,0 +1,149 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU map with hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """Two-level cache for the search path.
+
+    Level one maps normalized query text to its embedding, so a repeated query
+    never reaches Ollama. Level two maps a query (with its search mode, k and filter)
+    to the ranked document ids of one index version; the embedding is a
+    function of the normalized text, so keying by text is equivalent to keying
+    by embedding. Both levels are cleared as soon as a different index version
+    is seen: results never outlive the index they came from, and a rebuild may
+    have switched the embedding model, so query vectors are recomputed too.
+    """
+
+    def __init__(self, max_embeddings: int = 1024, max_results: int = 1024):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+        self._version: Optional[str] = None
+        self._version_lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def embedding(self, query: str, embed: Callable[[str], np.ndarray]) -> np.ndarray:
+        key = self.normalize(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = embed(query)
+            self.embeddings.put(key, vector)
+        return vector
+
+    def embedding_many(
+        self,
+        queries: List[str],
+        embed_many: Callable[[List[str]], List[Optional[np.ndarray]]]
+    ) -> List[np.ndarray]:
+        """Embeddings for several queries, sending only the uncached ones to embed_many in one call."""
+        keys = [self.normalize(query) for query in queries]
+        vectors = {key: self.embeddings.get(key) for key in dict.fromkeys(keys)}
+        missing: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            if vectors[key] is None:
+                missing.setdefault(key, query)
+        if missing:
+            for key, vector in zip(missing, embed_many(list(missing.values()))):
+                if vector is None:
+                    raise RuntimeError(f"Failed to embed query {missing[key]!r}")
+                vectors[key] = vector
+                self.embeddings.put(key, vector)
+        return [vectors[key] for key in keys]
+
+    def get_ranked(
+        self,
+        version: str,
+        query: str,
+        mode: str,
+        k: int,
+        search_filter: Hashable = None
+    ) -> Optional[List[int]]:
+        """Cached ranked ids for a query (and filter) against an index version, or None."""
+        with self._version_lock:
+            if version != self._version:
+                self.results.clear()
+                self.embeddings.clear()
+                self._version = version
+        return self.results.get((version, mode, k, search_filter, self.normalize(query)))
+
+    def put_ranked(
+        self,
+        version: str,
+        query: str,
+        mode: str,
+        k: int,
+        ids: List[int],
+        search_filter: Hashable = None
+    ) -> None:
+        if version == self._version:
+            self.results.put((version, mode, k, search_filter, self.normalize(query)), ids)
+
+    def ranked(
+        self,
+        version: str,
+        query: str,
+        mode: str,
+        k: int,
+        search: Callable[[], List[int]],
+        search_filter: Hashable = None
+    ) -> List[int]:
+        """Cached ranked ids for a query against an index version, running search on a miss."""
+        ids = self.get_ranked(version, query, mode, k, search_filter)
+        if ids is None:
+            ids = search()
+            self.put_ranked(version, query, mode, k, ids, search_filter)
+        return ids
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index_version": self._version,
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
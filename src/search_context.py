@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import faiss
+from dataclasses import dataclass, field, astuple
+from fnmatch import fnmatch
+from typing import Callable, List, Optional, Tuple
+from index_store import DocumentStore, read_index, read_version, version_dir
+from index_factory import IndexConfig, configure_search, index_type_of, search_params
+from order_store import OrderStore
+from spending_aggregates import SpendingAggregates
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+import logging
+
+# Configure logging
+os.makedirs("logs", exist_ok=True)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# File handler
+file_handler = logging.FileHandler("logs/search_context.log")
+file_handler.setLevel(logging.INFO)
+file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler.setFormatter(file_formatter)
+
+# Console handler
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_formatter = logging.Formatter('%(levelname)s: %(message)s')
+console_handler.setFormatter(console_formatter)
+
+# Add handlers to logger
+logger.addHandler(file_handler)
+logger.addHandler(console_handler)
+
+INDEX_FILE = "swiggy.index"
+INDEX_META_FILE = "index_meta.json"
+# Flat master copy of the vectors, saved next to non-flat search indexes
+EXACT_INDEX_FILE = "vectors.index"
+
+SEARCH_MODES = ("auto", "lexical", "vector", "hybrid")
+# Short queries whose tokens all occur in the corpus (order IDs, amounts, names) skip embedding
+EXACT_QUERY_TOKENS = 3
+# Filters selecting at most this fraction of the corpus are searched exactly over the subset
+FILTER_EXACT_FRACTION = 0.05
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Metadata pre-filter for search; unset fields match every document."""
+    # Glob matched against the source path and its file name, e.g. "*2024*.pdf"
+    source: Optional[str] = None
+    # Inclusive, 0-based page range
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    has_tables: Optional[bool] = None
+    # Inclusive ISO dates; a page matches if it lists an order in the range
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in astuple(self))
+
+
+@dataclass
+class SearchSnapshot:
+    """An immutable, fully loaded view of one published index version."""
+    version: str
+    # Where this version's artifacts live, for files loaded on demand (e.g. links.json)
+    directory: str
+    index: faiss.Index
+    store: DocumentStore
+    orders: Optional[OrderStore] = None
+    aggregates: Optional[SpendingAggregates] = None
+    lexical: Optional[BM25Index] = None
+    # Exact flat index used for highly selective filters when the search index is approximate
+    exact_index: Optional[faiss.Index] = None
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def index_type(self) -> str:
+        return index_type_of(self.index)
+
+    @property
+    def chunked(self) -> bool:
+        return len(self.store) > 0 and self.store.columns[0]["offset"] >= 0
+
+    def search(
+        self,
+        query_vecs: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest neighbours, restricted to the documents selected by mask inside the index search."""
+        if mask is None:
+            return self.index.search(query_vecs, k)
+
+        selected = int(mask.sum())
+        if selected == 0:
+            n = len(query_vecs)
+            return np.full((n, k), np.inf, dtype=np.float32), np.full((n, k), -1, dtype=np.int64)
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+
+        exact = self.exact_index if self.exact_index is not None else self.index
+        if self.index_type != "flat" and (
+            selected > FILTER_EXACT_FRACTION * len(mask) or self.exact_index is None
+        ):
+            D, I = self.index.search(query_vecs, k, params=search_params(self.index, selector))
+            # Graph/list traversal can run dry under a filter; fall back to the exact subset search
+            if (I >= 0).sum(axis=1).min() >= min(k, selected) or self.exact_index is None:
+                return D, I
+        # Flat search with a selector only computes distances for the selected vectors
+        return exact.search(query_vecs, k, params=faiss.SearchParameters(sel=selector))
+
+    def filter_mask(self, search_filter: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """Bitmap of the documents matching a filter, from the metadata columns; None for no filter."""
+        if search_filter is None or search_filter.is_empty():
+            return None
+        columns = self.store.columns
+        mask = np.ones(len(columns), dtype=bool)
+        if search_filter.source:
+            codes = [
+                code for code, source in enumerate(self.store.sources)
+                if fnmatch(source, search_filter.source) or fnmatch(os.path.basename(source), search_filter.source)
+            ]
+            mask &= np.isin(columns["source"], codes)
+        if search_filter.page_start is not None:
+            mask &= columns["page"] >= search_filter.page_start
+        if search_filter.page_end is not None:
+            mask &= columns["page"] <= search_filter.page_end
+        if search_filter.has_tables is not None:
+            mask &= columns["has_tables"] == search_filter.has_tables
+        if search_filter.start_date or search_filter.end_date:
+            if self.orders is None:
+                return np.zeros(len(columns), dtype=bool)
+            rows = self.orders.mask(search_filter.start_date, search_filter.end_date)
+            # Map order sources onto store source codes and match (source, page) pairs
+            codes = {source: code for code, source in enumerate(self.store.sources)}
+            order_codes = np.array([codes.get(source, -1) for source in self.orders.sources], dtype=np.int64)
+            pages = (order_codes[self.orders.source[rows]] << 32) | self.orders.page[rows]
+            mask &= np.isin((columns["source"].astype(np.int64) << 32) | columns["page"], pages)
+        return mask
+
+    def resolve_mode(self, query: str, mode: str = "auto") -> str:
+        """The search mode a query actually runs in; vector-only without a lexical index."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        if self.lexical is None:
+            return "vector"
+        if mode != "auto":
+            return mode
+        if len(tokenize(query)) <= EXACT_QUERY_TOKENS and self.lexical.covers(query):
+            return "lexical"
+        return "hybrid"
+
+    def rank(
+        self,
+        query: str,
+        k: int,
+        embed: Callable[[str], np.ndarray],
+        mode: str = "auto",
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[int]:
+        """Top-k document ids for a query; embed is only called for vector and hybrid modes."""
+        return self.rank_many(
+            [query], k, lambda texts: [embed(text) for text in texts], [mode], search_filter
+        )[0]
+
+    def rank_many(
+        self,
+        queries: List[str],
+        k: int,
+        embed_many: Callable[[List[str]], List[np.ndarray]],
+        modes: Optional[List[str]] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[List[int]]:
+        """Top-k document ids per query, embedding all vector queries in one call and one multi-row search."""
+        modes = [self.resolve_mode(query, mode) for query, mode in zip(queries, modes or ["auto"] * len(queries))]
+        mask = self.filter_mask(search_filter)
+        vector_rows = [i for i, mode in enumerate(modes) if mode != "lexical"]
+        vector_ids = {}
+        if vector_rows:
+            query_vecs = np.stack(embed_many([queries[i] for i in vector_rows])).astype(np.float32)
+            _, I = self.search(query_vecs, k, mask)
+            for row, i in enumerate(vector_rows):
+                vector_ids[i] = [int(idx) for idx in I[row] if idx >= 0]
+
+        ranked = []
+        for i, (query, mode) in enumerate(zip(queries, modes)):
+            lexical_ids = self.lexical.search(query, k, mask)[1].tolist() if mode in ("lexical", "hybrid") else []
+            if mode == "lexical":
+                ranked.append(lexical_ids)
+            elif mode == "vector":
+                ranked.append(vector_ids[i])
+            else:
+                ranked.append(reciprocal_rank_fusion([vector_ids[i], lexical_ids], k))
+        return ranked
+
+
+class SearchContext:
+    """Keeps the search index resident and hot-swaps it when a new version is published.
+
+    Queries grab the current snapshot once and use it to the end, so a reload
+    never changes the index under an in-flight query; the old snapshot's
+    memory maps stay valid until the last reference to it is dropped. Every
+    build writes its own version directory and publishes it by replacing the
+    version pointer, so a reload running during a build loads one complete
+    version and never a mix of two.
+    """
+
+    def __init__(self, index_dir: str, poll_interval: float = 2.0):
+        self.index_dir = index_dir
+        self.poll_interval = poll_interval
+        self._snapshot: Optional[SearchSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def snapshot(self) -> Optional[SearchSnapshot]:
+        return self._snapshot
+
+    def reload(self, force: bool = False) -> Optional[SearchSnapshot]:
+        """Load the published index if its version changed; returns the current snapshot."""
+        with self._reload_lock:
+            version = read_version(self.index_dir)
+            current = self._snapshot
+            if current is not None and current.version == version and not force:
+                return current
+
+            if not version:
+                return current
+            directory = version_dir(self.index_dir, version)
+            index_path = os.path.join(directory, INDEX_FILE)
+            if not (os.path.exists(index_path) and DocumentStore.exists(directory)):
+                return current
+
+            try:
+                start = time.perf_counter()
+                index = read_index(index_path)
+                meta_path = os.path.join(directory, INDEX_META_FILE)
+                if os.path.exists(meta_path):
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        configure_search(index, IndexConfig.from_dict(json.load(f)["config"]))
+                snapshot = SearchSnapshot(
+                    version=version,
+                    directory=directory,
+                    index=index,
+                    store=DocumentStore(directory),
+                    orders=OrderStore.load(directory),
+                    aggregates=SpendingAggregates.load(directory),
+                    lexical=BM25Index.load(directory) if BM25Index.exists(directory) else None
+                )
+                exact_path = os.path.join(directory, EXACT_INDEX_FILE)
+                if snapshot.index_type != "flat" and os.path.exists(exact_path):
+                    snapshot.exact_index = read_index(exact_path)
+            except Exception as e:
+                logger.error(f"Error loading index version {version!r}: {str(e)}")
+                return current
+
+            if snapshot.index.ntotal != len(snapshot.store):
+                logger.warning(
+                    f"Index version {version!r} is incomplete "
+                    f"({snapshot.index.ntotal} vectors, {len(snapshot.store)} documents), keeping current"
+                )
+                return current
+            if snapshot.lexical is not None and len(snapshot.lexical) != len(snapshot.store):
+                logger.warning(f"Lexical index of version {version!r} does not match the documents, using vector search only")
+                snapshot.lexical = None
+
+            # A single reference assignment: readers see either the old or the new snapshot
+            self._snapshot = snapshot
+            logger.info(
+                f"Loaded {snapshot.index_type} index version {version!r} with {snapshot.index.ntotal} vectors "
+                f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+            return snapshot
+
+    def start_watching(self) -> None:
+        """Poll the published version in a daemon thread and swap in new snapshots."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Error watching index: {str(e)}")
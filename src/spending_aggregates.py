@@ -0,0 +1,137 @@
+import os
+import json
+import numpy as np
+from typing import Any, Dict, List, Optional
+from order_store import OrderStore
+
+AGGREGATES_FILE = "aggregates.json"
+
+TIME_BUCKETS = ("day", "week", "month", "weekday", "hour")
+
+
+class SpendingAggregates:
+    """Materialized spending totals, maintained incrementally as orders come and go.
+
+    Every bucket maps a label (a period, restaurant or item) to an
+    [orders, amount] pair (for items, [orders, quantity]). Updates are deltas
+    computed with the OrderStore's vectorized aggregations over just the rows
+    being added or removed, so ingesting a statement never rescans the rest.
+    """
+
+    def __init__(self):
+        self.orders = 0
+        self.total_amount = 0.0
+        self.total_fees = 0.0
+        self.buckets: Dict[str, Dict[str, List[float]]] = {
+            name: {} for name in TIME_BUCKETS + ("restaurant", "item")
+        }
+
+    @classmethod
+    def from_store(cls, store: OrderStore) -> "SpendingAggregates":
+        aggregates = cls()
+        aggregates.add(store, np.ones(len(store), dtype=bool))
+        return aggregates
+
+    def add(self, store: OrderStore, mask: np.ndarray) -> None:
+        """Fold the store rows selected by mask into the aggregates."""
+        self._apply(store, mask, 1)
+
+    def subtract(self, store: OrderStore, mask: np.ndarray) -> None:
+        """Take the store rows selected by mask back out; call before removing them from the store."""
+        self._apply(store, mask, -1)
+
+    def _apply(self, store: OrderStore, mask: np.ndarray, sign: int) -> None:
+        if not mask.any():
+            return
+        self.orders += sign * int(mask.sum())
+        self.total_amount = round(self.total_amount + sign * float(store.amount[mask].sum()), 2)
+        self.total_fees = round(self.total_fees + sign * float(store.fees[mask].sum()), 2)
+        for bucket in TIME_BUCKETS:
+            for label, value in store.histogram(bucket, mask).items():
+                self._update(bucket, label, value["orders"], value["total_amount"], sign)
+        for value in store.top_restaurants(len(store.restaurants), mask):
+            self._update("restaurant", value["restaurant"], value["orders"], value["total_amount"], sign)
+        for value in store.top_items(len(store.items), mask):
+            self._update("item", value["item"], value["orders"], value["quantity"], sign)
+
+    def _update(self, bucket: str, label: str, orders: int, amount: float, sign: int) -> None:
+        entry = self.buckets[bucket].setdefault(label, [0, 0.0])
+        entry[0] += sign * orders
+        # Rounded on every update so add/subtract cycles do not drift
+        entry[1] = round(entry[1] + sign * amount, 2)
+        if entry[0] <= 0:
+            del self.buckets[bucket][label]
+
+    # Queries
+
+    def totals(self) -> Dict[str, Any]:
+        return {
+            "orders": self.orders,
+            "total_amount": self.total_amount,
+            "total_fees": self.total_fees,
+            "average_order_value": round(self.total_amount / self.orders, 2) if self.orders else 0.0,
+        }
+
+    def series(self, bucket: str, last: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Orders and spend per period in chronological order, optionally only the last N periods."""
+        if bucket not in TIME_BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}', expected one of {TIME_BUCKETS}")
+        labels = sorted(self.buckets[bucket])
+        if bucket == "weekday":
+            order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+            labels = sorted(labels, key=order.index)
+        if last:
+            labels = labels[-last:]
+        return {
+            label: {"orders": int(self.buckets[bucket][label][0]), "total_amount": self.buckets[bucket][label][1]}
+            for label in labels
+        }
+
+    def top(self, bucket: str, n: int = 10) -> List[Dict[str, Any]]:
+        """Top restaurants by spend or items by quantity."""
+        entries = sorted(self.buckets[bucket].items(), key=lambda entry: -entry[1][1])[:n]
+        if bucket == "item":
+            return [{"item": name, "quantity": int(qty), "orders": int(orders)} for name, (orders, qty) in entries]
+        return [
+            {"restaurant": name, "total_amount": amount, "orders": int(orders)}
+            for name, (orders, amount) in entries
+        ]
+
+    def dashboard(self, limit: int = 10) -> Dict[str, Any]:
+        return {
+            "totals": self.totals(),
+            "by_month": self.series("month", last=limit),
+            "by_week": self.series("week", last=limit),
+            "by_day": self.series("day", last=limit),
+            "by_weekday": self.series("weekday"),
+            "by_hour": self.series("hour"),
+            "top_restaurants": self.top("restaurant", limit),
+            "top_items": self.top("item", limit),
+        }
+
+    # Persistence
+
+    def save(self, index_dir: str) -> None:
+        path = os.path.join(index_dir, AGGREGATES_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "orders": self.orders,
+                "total_amount": self.total_amount,
+                "total_fees": self.total_fees,
+                "buckets": self.buckets
+            }, f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["SpendingAggregates"]:
+        path = os.path.join(index_dir, AGGREGATES_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        aggregates = cls()
+        aggregates.orders = data["orders"]
+        aggregates.total_amount = data["total_amount"]
+        aggregates.total_fees = data["total_fees"]
+        aggregates.buckets.update(data["buckets"])
+        return aggregates
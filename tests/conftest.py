@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz
+import numpy as np
+import pytest
+
+# The modules in src/ import each other by their flat names
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+# (status, headers, body) returned by a stub route
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def json_response(data, status: int = 200) -> Response:
+    return status, {"Content-Type": "application/json"}, json.dumps(data).encode("utf-8")
+
+
+class RecordingEmbedder:
+    """Deterministic in-process embedder that records every text it embeds.
+
+    Equal texts get equal vectors; different texts get unrelated random ones.
+    """
+
+    batch_size = 4
+    max_concurrency = 1
+    cache = None
+
+    def __init__(self, dimension: int = 8):
+        self.dimension = dimension
+        self.embedded: List[str] = []
+
+    def embed(self, text: str) -> np.ndarray:
+        self.embedded.append(text)
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.embed(text) for text in texts]
+
+    async def aembed(self, text: str, client=None) -> np.ndarray:
+        return self.embed(text)
+
+
+def write_pdf(path, pages: List[str]) -> str:
+    """A PDF with one line of text per page."""
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+class StubServer:
+    """Local HTTP server whose responses come from a handler function; every request is recorded."""
+
+    def __init__(self, handler: Callable[[str, str, Optional[dict], Dict[str, str]], Response]):
+        self.handler = handler
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                headers = dict(self.headers)
+                stub.requests.append((method, self.path, body, headers))
+                status, response_headers, data = stub.handler(method, self.path, body, headers)
+                self.send_response(status)
+                for name, value in response_headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(handler) -> StubServer:
+        server = StubServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(autouse=True)
+def _in_tmp_path(tmp_path, monkeypatch):
+    # Modules create logs/ and cache/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+import agent as agent_module
+from action import ToolCallResult
+from agent import Agent
+from conftest import RecordingEmbedder
+from memory import MemoryManager
+from perception import PerceptionResult
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """An Agent with in-memory storage whose perception, planning and tools are stubs.
+
+    Every query calls one tool, then answers with the memories it recalled on the second step.
+    """
+    instance = Agent()
+    instance.memory = MemoryManager(embedder=RecordingEmbedder(), snapshot_every=1000)
+
+    async def perceive(user_input, client):
+        return PerceptionResult(user_input=user_input)
+
+    async def plan(perception, memories, client, tool_descriptions=""):
+        if perception.user_input.startswith("Original task:"):
+            return "FINAL_ANSWER: [" + " | ".join(sorted(item.text for item in memories)) + "]"
+        return f"FUNCTION_CALL: lookup|{perception.user_input}"
+
+    async def execute(session, tools, response):
+        query = response.split("|", 1)[1]
+        # Let the other queries store their outputs before this one recalls anything
+        await asyncio.sleep(0.01)
+        return ToolCallResult(tool_name="lookup", arguments={"query": query}, result=f"output of {query}", raw_response=None)
+
+    monkeypatch.setattr(agent_module, "extract_perception_async", perceive)
+    monkeypatch.setattr(agent_module, "generate_plan_async", plan)
+    monkeypatch.setattr(agent_module, "execute_tool", execute)
+    yield instance
+    instance.memory.close()
+
+
+def test_concurrent_queries_only_recall_their_own_memories(agent):
+    answers = asyncio.run(agent.run_many(["first", "second"], concurrency=2))
+
+    assert "output of first" in answers[0] and "output of second" not in answers[0]
+    assert "output of second" in answers[1] and "output of first" not in answers[1]
+    assert len({item.session_id for item in agent.memory.data}) == 2
+
+
+def test_answers_come_back_in_query_order(agent, monkeypatch):
+    execute = agent_module.execute_tool
+
+    async def execute_slow_first(session, tools, response):
+        # Earlier queries finish last
+        await asyncio.sleep(0.05 if response.endswith("q0") else 0.0)
+        return await execute(session, tools, response)
+
+    monkeypatch.setattr(agent_module, "execute_tool", execute_slow_first)
+
+    answers = asyncio.run(agent.run_many([f"q{i}" for i in range(4)], concurrency=4))
+
+    assert answers == [f"FINAL_ANSWER: [Tool call: lookup with {{'query': 'q{i}'}}, got: output of q{i}]" for i in range(4)]
+
+
+def test_at_most_concurrency_queries_run_at_once(agent, monkeypatch):
+    execute = agent_module.execute_tool
+    running = []
+    peak = []
+
+    async def execute_counting(session, tools, response):
+        running.append(response)
+        peak.append(len(running))
+        try:
+            return await execute(session, tools, response)
+        finally:
+            running.remove(response)
+
+    monkeypatch.setattr(agent_module, "execute_tool", execute_counting)
+
+    answers = asyncio.run(agent.run_many([f"q{i}" for i in range(7)], concurrency=3))
+
+    assert max(peak) == 3
+    assert all(answer.startswith("FINAL_ANSWER:") for answer in answers)
+
+
+def test_a_failing_query_does_not_abort_the_batch(agent, monkeypatch):
+    plan = agent_module.generate_plan_async
+
+    async def plan_failing_once(perception, memories, client, tool_descriptions=""):
+        if perception.user_input == "broken":
+            raise RuntimeError("planner crashed")
+        return await plan(perception, memories, client, tool_descriptions)
+
+    monkeypatch.setattr(agent_module, "generate_plan_async", plan_failing_once)
+
+    answers = asyncio.run(agent.run_many(["first", "broken", "third"], concurrency=2))
+
+    assert answers[1] == "FINAL_ANSWER: [unknown]"
+    assert "output of first" in answers[0] and "output of third" in answers[2]
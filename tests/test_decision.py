@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+import decision
+from conftest import json_response
+from decision import DecisionScanner, generate_plan, generate_plan_async, parse_plan
+from perception import PerceptionResult
+
+PERCEPTION = PerceptionResult(user_input="How much did I spend in March?")
+
+
+def feed_all(chunks, done_last=True):
+    """Feed chunks to a new scanner; returns the decision and how many chunks it took."""
+    scanner = DecisionScanner()
+    for i, chunk in enumerate(chunks, 1):
+        found = scanner.feed(chunk, done=done_last and i == len(chunks))
+        if found is not None:
+            return found, i
+    return None, len(chunks)
+
+
+def test_decision_is_returned_once_its_line_is_complete():
+    chunks = ["Let me think.\nFUNCTION_", "CALL: get_spending", "|2024-03-01", "|2024-03-31\n", "FINAL_ANSWER: [x]\n"]
+
+    assert feed_all(chunks) == ("FUNCTION_CALL: get_spending|2024-03-01|2024-03-31", 4)
+
+
+def test_first_complete_decision_line_wins():
+    assert feed_all(["FINAL_ANSWER: [42]\nFUNCTION_CALL: other\n"]) == ("FINAL_ANSWER: [42]", 1)
+
+
+def test_partial_line_is_completed_by_the_end_of_the_generation():
+    scanner = DecisionScanner()
+
+    assert scanner.feed("  FINAL_ANSWER: [₹1,2") is None
+    assert scanner.feed("00]") is None
+    assert scanner.feed("", done=True) == "FINAL_ANSWER: [₹1,200]"
+
+
+def test_lines_without_a_decision_are_scanned_once():
+    scanner = DecisionScanner()
+
+    assert scanner.feed("The user wants\nsome ") is None
+    assert scanner.feed("totals. FUNCTION_CALL: is mentioned mid-line\n") is None
+    assert scanner._scanned == len(scanner.text)
+    assert scanner.feed("", done=True) is None
+
+
+def test_parse_plan_falls_back_to_the_whole_output():
+    assert parse_plan("thinking\n FUNCTION_CALL: a|b \nFINAL_ANSWER: [c]") == "FUNCTION_CALL: a|b"
+    assert parse_plan("  no decision here  ") == "no decision here"
+
+
+class StreamingClient:
+    """Async Ollama client stub streaming fixed chunks; records how many were consumed and whether it was closed."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+
+    async def stream_generate(self, prompt, model):
+        try:
+            for text in self.chunks:
+                self.consumed += 1
+                yield {"response": text, "done": False}
+            yield {"response": "", "done": True}
+        finally:
+            self.closed = True
+
+
+def test_async_stream_is_closed_at_the_first_decision():
+    client = StreamingClient(["FUNCTION_CALL: get_orders", "|march\n", "and then ", "a long explanation\n"])
+
+    result = asyncio.run(generate_plan_async(PERCEPTION, [], client))
+
+    assert result == "FUNCTION_CALL: get_orders|march"
+    assert client.consumed == 2 and client.closed
+
+
+def test_async_stream_without_a_decision_returns_the_whole_output():
+    client = StreamingClient(["I am not ", "sure."])
+
+    assert asyncio.run(generate_plan_async(PERCEPTION, [], client)) == "I am not sure."
+    assert client.closed
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_sync_plan_reads_the_first_decision(stub_server, monkeypatch, stream):
+    def respond(method, path, body, headers):
+        if not body["stream"]:
+            return json_response({"response": "x\nFINAL_ANSWER: [7]\n", "done": True})
+        lines = [{"response": "x\nFINAL_", "done": False}, {"response": "ANSWER: [7]\nmore", "done": False}, {"response": "", "done": True}]
+        return 200, {"Content-Type": "application/x-ndjson"}, "\n".join(json.dumps(line) for line in lines).encode()
+
+    server = stub_server(respond)
+    monkeypatch.setattr(decision, "OLLAMA_API_URL", f"{server.url}/api/generate")
+
+    assert generate_plan(PERCEPTION, [], stream=stream) == "FINAL_ANSWER: [7]"
@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import write_pdf
+from document_processor import Document, DocumentProcessor, chunk_document, iter_chunks, merge_chunks
+
+
+def contents(documents):
+    return [(doc.metadata["source"], doc.metadata["page"], doc.content) for doc in documents]
+
+
+def test_pool_extraction_matches_serial_and_is_shared_across_files(tmp_path):
+    pdfs = [
+        write_pdf(tmp_path / "a.pdf", [f"a page {i}" for i in range(5)]),
+        write_pdf(tmp_path / "b.pdf", [f"b page {i}" for i in range(3)]),
+    ]
+    serial = [doc for pdf in pdfs for doc in DocumentProcessor().iter_pdf(pdf)]
+
+    with DocumentProcessor(workers=2, parallel_min_pages=2) as processor:
+        first = list(processor.iter_pdf(pdfs[0]))
+        pool = processor._executor
+        second = list(processor.iter_pdf(pdfs[1]))
+        assert pool is not None and processor._executor is pool
+
+    assert processor._executor is None
+    assert contents(first + second) == contents(serial)
+
+
+def test_small_files_are_extracted_without_a_pool(tmp_path):
+    pdf = write_pdf(tmp_path / "small.pdf", ["one", "two", "three"])
+
+    with DocumentProcessor(workers=4, parallel_min_pages=4) as processor:
+        documents = processor.process_pdf(pdf)
+        assert processor._executor is None
+
+    assert [doc.metadata["page"] for doc in documents] == [0, 1, 2]
+
+
+STATEMENT = (
+    "Order  Restaurant        Amount\n"
+    "1001   Burger King       ₹250\n"
+    "1002   Domino's Pizza    ₹480\n"
+    "1003   Behrouz Biryani   ₹399\n"
+)
+
+
+def test_chunks_are_slices_of_the_page_at_their_offsets():
+    chunks = list(iter_chunks(STATEMENT, size=5, overlap=2))
+
+    assert len(chunks) > 2
+    for offset, chunk in chunks:
+        assert STATEMENT[offset:offset + len(chunk)] == chunk
+    assert chunks[1][1] == "1001   Burger King       ₹250\n1002"
+
+
+def test_merged_chunks_keep_the_page_layout():
+    chunks = chunk_document(Document(content=STATEMENT, metadata={"source": "a.pdf", "page": 0}), size=5, overlap=2)
+
+    assert merge_chunks(list(reversed(chunks))) == STATEMENT.rstrip()
+    assert merge_chunks([chunks[0], chunks[-1]]) == chunks[0].content + " ... " + chunks[-1].content
+
+
+@pytest.mark.parametrize("size, overlap", [(5, 5), (5, 8), (5, -1), (0, 0)])
+def test_chunking_rejects_overlap_that_does_not_advance(size, overlap):
+    with pytest.raises(ValueError):
+        iter_chunks(STATEMENT, size=size, overlap=overlap)
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import threading
+
+import httpx
+import numpy as np
+import pytest
+
+from conftest import json_response
+import embedding_cache
+from embedding_cache import EmbeddingCache
+from embedding_client import EmbeddingClient
+from ollama_client import OllamaClient
+
+
+def vector(text: str) -> list:
+    """Deterministic vector standing in for a model embedding; its first value is the text length."""
+    return [float(len(text)), 1.0, 0.0]
+
+
+def make_client(server, **kwargs) -> EmbeddingClient:
+    return EmbeddingClient(base_url=server.url, use_cache=False, max_retries=1, **kwargs)
+
+
+def test_texts_are_split_into_batches_and_returned_in_order(stub_server):
+    server = stub_server(lambda method, path, body, headers: json_response(
+        {"embeddings": [vector(text) for text in body["input"]]}
+    ))
+    client = make_client(server, batch_size=2)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    embeddings = client.embed_many(texts)
+
+    # Batches run concurrently, so compare them regardless of arrival order
+    batches = [tuple(body["input"]) for _, _, body, _ in server.requests]
+    assert all(path == "/api/embed" for _, path, _, _ in server.requests)
+    assert sorted(batches) == [("a", "bb"), ("ccc", "dddd"), ("eeeee",)]
+    assert [embedding[0] for embedding in embeddings] == [1, 2, 3, 4, 5]
+
+
+def test_missing_embed_endpoint_falls_back_to_normalized_legacy_calls(stub_server):
+    def handler(method, path, body, headers):
+        if path == "/api/embed":
+            return json_response({"error": "not found"}, status=404)
+        return json_response({"embedding": [3.0, 4.0]})
+
+    server = stub_server(handler)
+    client = make_client(server)
+
+    embeddings = client.embed_many(["x", "y"])
+
+    assert [path for _, path, _, _ in server.requests].count("/api/embeddings") == 2
+    for embedding in embeddings:
+        np.testing.assert_allclose(embedding, [0.6, 0.8], rtol=1e-6)
+    # The fallback sticks: later calls go straight to the legacy endpoint
+    client.embed("z")
+    assert server.requests[-1][1] == "/api/embeddings"
+
+
+MISSING_MODEL = {"error": 'model "nomic-embed-text" not found, try pulling it first'}
+
+
+def test_missing_model_does_not_switch_to_the_legacy_endpoint(stub_server):
+    server = stub_server(lambda method, path, body, headers: json_response(MISSING_MODEL, status=404))
+    client = make_client(server, batch_size=8)
+
+    assert client.embed_many(["x", "y"]) == [None, None]
+    with pytest.raises(RuntimeError):
+        client.embed("z")
+
+    # One request per batch, no per-item retries, and never the legacy endpoint
+    assert [path for _, path, _, _ in server.requests] == ["/api/embed", "/api/embed"]
+
+
+def test_async_client_falls_back_only_for_a_missing_endpoint(stub_server):
+    missing_model = stub_server(lambda method, path, body, headers: json_response(MISSING_MODEL, status=404))
+    old_server = stub_server(lambda method, path, body, headers: (
+        json_response({"error": "not found"}, status=404) if path == "/api/embed"
+        else json_response({"embedding": [3.0, 4.0]})
+    ))
+
+    async def embed(server):
+        client = OllamaClient(base_url=server.url, max_retries=1)
+        try:
+            return await client.embed(["x"])
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(embed(missing_model))
+    assert [path for _, path, _, _ in missing_model.requests] == ["/api/embed"]
+    np.testing.assert_allclose(asyncio.run(embed(old_server))[0], [0.6, 0.8], rtol=1e-6)
+
+
+def test_bad_item_is_retried_alone_without_failing_the_batch(stub_server):
+    def handler(method, path, body, headers):
+        if "bad" in body["input"]:
+            return json_response({"error": "cannot embed"}, status=400)
+        return json_response({"embeddings": [vector(text) for text in body["input"]]})
+
+    server = stub_server(handler)
+    client = make_client(server, batch_size=8)
+
+    embeddings = client.embed_many(["one", "bad", "three"])
+
+    assert embeddings[1] is None
+    assert embeddings[0][0] == 3 and embeddings[2][0] == 5
+    # One failed batch request, then one request per item
+    assert [len(body["input"]) for _, _, body, _ in server.requests] == [3, 1, 1, 1]
+
+
+class ThreadRecordingCache(EmbeddingCache):
+    """EmbeddingCache that records which thread each read and write ran on."""
+
+    def __init__(self, path):
+        super().__init__(str(path))
+        self.threads = []
+
+    def get_many(self, model, texts):
+        self.threads.append(threading.get_ident())
+        return super().get_many(model, texts)
+
+    def put_many(self, model, texts, embeddings):
+        self.threads.append(threading.get_ident())
+        super().put_many(model, texts, embeddings)
+
+
+class CountingOllama:
+    def __init__(self):
+        self.calls = 0
+
+    async def embed(self, texts, model):
+        self.calls += 1
+        return [np.array(vector(text), dtype=np.float32) for text in texts]
+
+
+def test_aembed_uses_the_cache_off_the_event_loop(tmp_path):
+    cache = ThreadRecordingCache(tmp_path / "cache.db")
+    client = EmbeddingClient(cache=cache)
+    ollama = CountingOllama()
+
+    async def embed_twice():
+        loop_thread = threading.get_ident()
+        first = await client.aembed("biryani", ollama)
+        second = await client.aembed("biryani", ollama)
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(embed_twice())
+    client.close()
+
+    assert ollama.calls == 1
+    assert np.array_equal(first, second)
+    # Miss, write, hit
+    assert len(cache.threads) == 3 and loop_thread not in cache.threads
+
+
+def test_default_cache_is_shared_across_working_directories(tmp_path, monkeypatch):
+    assert os.path.isabs(embedding_cache.EMBED_CACHE_PATH)
+    monkeypatch.setattr(embedding_cache, "EMBED_CACHE_PATH", str(tmp_path / "shared" / "embeddings.db"))
+    for name in ("root", "src"):
+        (tmp_path / name).mkdir()
+
+    monkeypatch.chdir(tmp_path / "root")
+    builder_cache = EmbeddingCache()
+    builder_cache.put_many("model", ["biryani"], [np.array([1.0, 2.0], dtype=np.float32)])
+    monkeypatch.chdir(tmp_path / "src")
+    server_cache = EmbeddingCache()
+
+    assert server_cache.get_many("model", ["biryani"])[0].tolist() == [1.0, 2.0]
+    builder_cache.close()
+    server_cache.close()
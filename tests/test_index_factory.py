@@ -0,0 +1,81 @@
+import faiss
+import numpy as np
+import pytest
+
+import build_index as build_index_module
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder, write_pdf
+from index_factory import IndexConfig, build_index, extend_index
+
+DIMENSION = 8
+
+
+def flat_of(n: int, seed: int = 0) -> faiss.Index:
+    flat = faiss.IndexFlatL2(DIMENSION)
+    flat.add(np.random.default_rng(seed).standard_normal((n, DIMENSION)).astype(np.float32))
+    return flat
+
+
+def test_extended_hnsw_index_finds_appended_vectors():
+    config = IndexConfig(type="hnsw", flat_threshold=0)
+    flat = flat_of(200)
+    index = build_index(flat, config)
+    flat.add(np.random.default_rng(1).standard_normal((50, DIMENSION)).astype(np.float32))
+
+    extended = extend_index(index, flat, config)
+
+    assert extended is index and index.ntotal == 250
+    _, ids = index.search(flat.reconstruct_n(200, 50), 1)
+    assert ids[:, 0].tolist() == list(range(200, 250))
+
+
+def test_ivf_index_with_too_few_lists_is_rebuilt():
+    config = IndexConfig(type="ivf_flat", flat_threshold=0)
+    small = flat_of(39 * 8)
+    index = build_index(small, IndexConfig(type="ivf_flat", flat_threshold=0, nlist=2))
+
+    assert extend_index(index, small, config) is None
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    """Index the given PDFs incrementally with HNSW; returns how many full builds each save did."""
+    index_dir = str(tmp_path / "index")
+    full_builds = []
+
+    def counting_build(source, config):
+        full_builds.append(source.ntotal)
+        return build_index(source, config)
+
+    monkeypatch.setattr(build_index_module, "build_index", counting_build)
+
+    def run(pdf_files):
+        full_builds.clear()
+        builder = IndexBuilder(
+            dimension=DIMENSION,
+            embedder=RecordingEmbedder(DIMENSION),
+            index_config=IndexConfig(type="hnsw", flat_threshold=0)
+        )
+        builder.load_index(index_dir)
+        builder.sync_documents(pdf_files)
+        builder.save_index(index_dir)
+        builder.link_enricher.close()
+        return list(full_builds)
+
+    return run
+
+
+def test_appended_pages_extend_the_saved_search_index(tmp_path, build):
+    first = write_pdf(tmp_path / "a.pdf", ["page one", "page two"])
+    assert build([first]) == [2]
+
+    second = write_pdf(tmp_path / "b.pdf", ["page three"])
+    assert build([first, second]) == []
+
+
+def test_changed_pages_rebuild_the_search_index(tmp_path, build):
+    statement = write_pdf(tmp_path / "a.pdf", ["page one", "page two"])
+    build([statement])
+
+    write_pdf(tmp_path / "a.pdf", ["page one", "page two changed"])
+    assert build([statement]) == [2]
@@ -0,0 +1,101 @@
+import pytest
+
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder, write_pdf
+from index_factory import IndexConfig
+from index_manifest import IndexManifest
+from index_store import current_dir
+
+DIMENSION = 8
+
+
+@pytest.fixture
+def build(tmp_path):
+    """Run one build over pdf_files, resuming from the saved index; returns the builder."""
+    index_dir = str(tmp_path / "index")
+
+    def run(pdf_files, chunk_size=None, expect_incremental=None):
+        builder = IndexBuilder(
+            dimension=DIMENSION,
+            embedder=RecordingEmbedder(DIMENSION),
+            chunk_size=chunk_size,
+            index_config=IndexConfig(type="flat")
+        )
+        loaded = builder.load_index(index_dir)
+        if expect_incremental is not None:
+            assert loaded is expect_incremental
+        builder.sync_documents(pdf_files)
+        builder.save_index(index_dir)
+        builder.link_enricher.close()
+        return builder
+
+    return run
+
+
+def page_contents(builder):
+    return {(doc.metadata["source"], doc.metadata["page"]): doc.content.split("\n")[0] for doc in builder.documents}
+
+
+def test_only_changed_page_is_reembedded(tmp_path, build):
+    statement = write_pdf(tmp_path / "a.pdf", ["page one", "page two", "page three"])
+    first = build([statement], expect_incremental=False)
+    assert len(first.embedder.embedded) == 3
+
+    write_pdf(tmp_path / "a.pdf", ["page one", "page two changed", "page three"])
+    second = build([statement], expect_incremental=True)
+
+    assert len(second.embedder.embedded) == 1
+    assert second.embedder.embedded[0].startswith("page two changed")
+    assert page_contents(second) == {
+        (statement, 0): "page one",
+        (statement, 1): "page two changed",
+        (statement, 2): "page three",
+    }
+    assert second.index.ntotal == 3
+
+
+def test_deleted_pdf_is_dropped_without_reembedding(tmp_path, build):
+    kept = write_pdf(tmp_path / "a.pdf", ["kept page"])
+    deleted = write_pdf(tmp_path / "b.pdf", ["deleted one", "deleted two"])
+    build([kept, deleted])
+
+    second = build([kept], expect_incremental=True)
+
+    assert second.embedder.embedded == []
+    assert page_contents(second) == {(kept, 0): "kept page"}
+    assert second.index.ntotal == 1
+    assert deleted not in IndexManifest.load(current_dir(str(tmp_path / "index"))).files
+
+
+def test_new_pdf_is_embedded_alone(tmp_path, build):
+    existing = write_pdf(tmp_path / "a.pdf", ["existing page"])
+    build([existing])
+
+    added = write_pdf(tmp_path / "b.pdf", ["new page one", "new page two"])
+    second = build([existing, added], expect_incremental=True)
+
+    assert [text.split("\n")[0] for text in second.embedder.embedded] == ["new page one", "new page two"]
+    assert second.index.ntotal == 3
+    assert set(IndexManifest.load(current_dir(str(tmp_path / "index"))).files) == {existing, added}
+
+
+def test_settings_change_forces_full_rebuild(tmp_path, build):
+    statement = write_pdf(tmp_path / "a.pdf", ["first page", "second page"])
+    build([statement])
+
+    rebuilt = build([statement], chunk_size=50, expect_incremental=False)
+
+    assert len(rebuilt.embedder.embedded) == 2
+    assert all("chunk" in doc.metadata for doc in rebuilt.documents)
+    assert IndexManifest.load(current_dir(str(tmp_path / "index"))).settings["chunk_size"] == 50
+
+
+def test_file_with_failed_pages_is_revisited(tmp_path):
+    manifest = IndexManifest(settings={"chunk_size": None})
+    manifest.record("a.pdf", None, ["h0", None])
+    manifest.save(str(tmp_path))
+
+    loaded = IndexManifest.load(str(tmp_path))
+    assert not loaded.is_unchanged("a.pdf", "any hash")
+    assert loaded.page_hashes("a.pdf") == ["h0", None]
+    assert loaded.settings == {"chunk_size": None}
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder, write_pdf
+from index_factory import IndexConfig
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from search_context import SearchContext
+
+DOCUMENTS = [
+    "order 1001 burger king whopper whopper fries",
+    "order 1002 dominos pizza farmhouse",
+    "order 1003 burger king fries",
+    "monthly summary of all orders and fees",
+]
+
+
+def test_tokens_are_lowercased_words_on_both_sides():
+    assert tokenize("Order #1001: ₹1,234.50 at Domino's") == ["order", "1001", "1", "234", "50", "at", "domino", "s"]
+
+
+def test_rarer_terms_and_higher_frequency_rank_first():
+    index = BM25Index.build(DOCUMENTS)
+
+    # "farmhouse" occurs in one document, "burger" in two
+    assert index.search("farmhouse burger", k=3)[1].tolist()[0] == 1
+    # Same document frequency for both "burger" documents: more whoppers win
+    assert index.search("whopper burger", k=2)[1].tolist() == [0, 2]
+    assert index.search("unknown words", k=3)[1].tolist() == []
+
+
+def test_search_respects_the_mask_and_k():
+    index = BM25Index.build(DOCUMENTS)
+    mask = np.array([False, True, True, True])
+
+    assert index.search("burger fries", k=5, mask=mask)[1].tolist() == [2]
+    assert len(index.search("order", k=2)[1]) == 2
+
+
+def test_saved_index_loads_memory_mapped_with_the_same_scores(tmp_path):
+    index = BM25Index.build(DOCUMENTS)
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert BM25Index.exists(str(tmp_path))
+    scores, ids = loaded.search("burger fries", k=3)
+    expected_scores, expected_ids = index.search("burger fries", k=3)
+    assert ids.tolist() == expected_ids.tolist()
+    assert np.allclose(scores, expected_scores)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    # 7 is second in both lists, so it beats the two first places that appear only once
+    assert reciprocal_rank_fusion([[1, 7, 3], [2, 7, 3]], k=2) == [7, 3]
+    assert reciprocal_rank_fusion([[1], []], k=5) == [1]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    pages = [
+        "Order 1001 Burger King Whopper",
+        "Order 1002 Dominos Pizza Farmhouse",
+        "Weekly spending summary and delivery fees",
+    ]
+    index_dir = str(tmp_path / "index")
+    builder = IndexBuilder(dimension=8, embedder=RecordingEmbedder(), index_config=IndexConfig(type="flat"))
+    builder.sync_documents([write_pdf(tmp_path / "statement.pdf", pages)])
+    builder.save_index(index_dir)
+    builder.link_enricher.close()
+    return SearchContext(index_dir).reload()
+
+
+@pytest.mark.parametrize("query, mode", [
+    ("1002", "lexical"),
+    ("Farmhouse", "lexical"),
+    ("order 1001", "lexical"),
+    ("1002 biryani", "hybrid"),
+    ("how much did I spend on delivery fees", "hybrid"),
+])
+def test_auto_mode_sends_exact_tokens_to_the_lexical_path(snapshot, query, mode):
+    assert snapshot.resolve_mode(query) == mode
+
+
+def test_lexical_queries_are_answered_without_embedding(snapshot):
+    def no_embedding(text):
+        raise AssertionError("lexical queries must not be embedded")
+
+    assert snapshot.rank("1002", k=3, embed=no_embedding)[0] == 1
+    assert snapshot.rank("Whopper", k=3, embed=no_embedding) == [0]
+
+
+def test_hybrid_ranking_fuses_lexical_and_vector_results(snapshot):
+    embedder = RecordingEmbedder()
+
+    ranked = snapshot.rank("1002 biryani", k=3, embed=embedder.embed)
+
+    assert embedder.embedded == ["1002 biryani"]
+    assert ranked[0] == 1 and sorted(ranked) == [0, 1, 2]
@@ -0,0 +1,180 @@
+import json
+import os
+import time
+
+import fitz
+import pytest
+
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder
+from index_factory import IndexConfig
+from link_enricher import LINK_TYPE, LinkCache, LinkEnricher
+from search_context import SearchContext
+
+
+def html(text: str) -> bytes:
+    return f"<html><body><script>ignored()</script><p>{text}</p></body></html>".encode("utf-8")
+
+
+@pytest.fixture
+def make_enricher(tmp_path):
+    enrichers = []
+
+    def make(**kwargs) -> LinkEnricher:
+        enricher = LinkEnricher(cache=LinkCache(str(tmp_path / "links.db")), **kwargs)
+        enrichers.append(enricher)
+        return enricher
+
+    yield make
+    for enricher in enrichers:
+        enricher.close()
+
+
+def fetched_paths(server):
+    return [path for _, path, _, _ in server.requests]
+
+
+def test_each_url_is_fetched_once_across_pages(stub_server, make_enricher):
+    server = stub_server(lambda method, path, body, headers: (200, {}, html(f"page {path}")))
+    enricher = make_enricher()
+    a, b = f"{server.url}/a", f"{server.url}/b"
+
+    first_page = enricher.enrich([a, a, b, "mailto:someone@example.com"])
+    second_page = enricher.enrich([b, a])
+
+    assert first_page == {a: "page /a", b: "page /b"}
+    assert second_page == first_page
+    assert sorted(fetched_paths(server)) == ["/a", "/b"]
+
+
+def test_hanging_host_only_costs_its_own_link(stub_server, make_enricher):
+    def handler(method, path, body, headers):
+        if path == "/slow":
+            time.sleep(2)
+        return 200, {}, html("ok")
+
+    server = stub_server(handler)
+    enricher = make_enricher(timeout=(1.0, 0.2))
+
+    start = time.perf_counter()
+    texts = enricher.enrich([f"{server.url}/slow", f"{server.url}/fast"])
+
+    assert time.perf_counter() - start < 1.5
+    assert texts == {f"{server.url}/fast": "ok"}
+
+
+def test_stale_entry_is_revalidated_with_its_etag(stub_server, make_enricher):
+    def handler(method, path, body, headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {}, b""
+        return 200, {"ETag": '"v1"'}, html("statement details")
+
+    server = stub_server(handler)
+    enricher = make_enricher(ttl=0)
+    url = f"{server.url}/details"
+
+    assert enricher.enrich([url]) == {url: "statement details"}
+    assert enricher.enrich([url]) == {url: "statement details"}
+
+    assert len(server.requests) == 2
+    assert "If-None-Match" not in server.requests[0][3]
+    assert server.requests[1][3]["If-None-Match"] == '"v1"'
+
+
+def test_failures_are_cached_until_error_ttl(stub_server, make_enricher):
+    server = stub_server(lambda method, path, body, headers: (500, {}, b"boom"))
+    url = f"{server.url}/broken"
+
+    enricher = make_enricher()
+    assert enricher.enrich([url]) == {}
+    assert enricher.enrich([url]) == {}
+    assert len(server.requests) == 1
+    text, _, _, _, ok = enricher.cache.get(url)
+    assert (text, ok) == ("", False)
+
+    # Once the error TTL has passed the link is tried again
+    retrying = make_enricher(error_ttl=0)
+    retrying.enrich([url])
+    assert len(server.requests) == 2
+
+
+def write_linked_pdf(path, pages) -> str:
+    """A PDF with one (text, urls) entry per page; each URL becomes a link annotation."""
+    doc = fitz.open()
+    for text, urls in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), text)
+        for i, url in enumerate(urls):
+            page.insert_link({"kind": fitz.LINK_URI, "from": fitz.Rect(72, 100 + 20 * i, 200, 115 + 20 * i), "uri": url})
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def build(tmp_path, make_enricher):
+    """Incrementally index the given PDFs; returns the new snapshot and the texts embedded by the build."""
+    index_dir = str(tmp_path / "index")
+
+    def run(pdf_files, **enricher_options):
+        embedder = RecordingEmbedder()
+        builder = IndexBuilder(
+            dimension=8, embedder=embedder, link_enricher=make_enricher(**enricher_options),
+            index_config=IndexConfig(type="flat")
+        )
+        builder.load_index(index_dir)
+        builder.sync_documents(pdf_files)
+        builder.save_index(index_dir)
+        return SearchContext(index_dir).reload(), embedder.embedded
+
+    return run
+
+
+def linked_pages(snapshot):
+    return sorted(
+        (snapshot.store.metadata(i)["source"], snapshot.store.content(i))
+        for i in range(len(snapshot.store)) if snapshot.store.metadata(i)["type"] == LINK_TYPE
+    )
+
+
+def test_linked_pages_are_indexed_once_per_url(tmp_path, stub_server, build):
+    server = stub_server(lambda method, path, body, headers: (200, {}, html(f"terms of {path[1:]}")))
+    refunds, partners = f"{server.url}/refunds", f"{server.url}/partners"
+    statements = [
+        write_linked_pdf(tmp_path / "jan.pdf", [("jan orders", [refunds]), ("jan fees", [refunds, partners])]),
+        write_linked_pdf(tmp_path / "feb.pdf", [("feb orders", [refunds])]),
+    ]
+
+    snapshot, embedded = build(statements)
+
+    assert linked_pages(snapshot) == [(partners, "terms of partners"), (refunds, "terms of refunds")]
+    assert embedded.count("terms of refunds") == 1
+    ranked = snapshot.rank("refunds", k=1, embed=None, mode="lexical")
+    assert snapshot.store.metadata(ranked[0])["source"] == refunds
+
+    # An unchanged rebuild embeds nothing, linked pages included
+    _, embedded = build(statements)
+    assert embedded == []
+
+
+def test_unreferenced_linked_pages_are_removed_and_changed_ones_replaced(tmp_path, stub_server, build):
+    version = {"refunds": "v1"}
+    server = stub_server(lambda method, path, body, headers: (200, {}, html(f"{path[1:]} {version.get(path[1:], 'v1')}")))
+    refunds, partners = f"{server.url}/refunds", f"{server.url}/partners"
+    jan = write_linked_pdf(tmp_path / "jan.pdf", [("jan orders", [refunds])])
+    feb = write_linked_pdf(tmp_path / "feb.pdf", [("feb orders", [partners])])
+    build([jan, feb])
+
+    snapshot, _ = build([jan])
+
+    assert linked_pages(snapshot) == [(refunds, "refunds v1")]
+    with open(os.path.join(snapshot.directory, "links.json"), "r", encoding="utf-8") as f:
+        assert json.load(f) == {refunds: "refunds v1"}
+
+    # The page linking to it changed and the cached copy expired: the new text replaces the old
+    version["refunds"] = "v2"
+    jan = write_linked_pdf(tmp_path / "jan.pdf", [("jan orders again", [refunds])])
+    snapshot, embedded = build([jan], ttl=0)
+
+    assert linked_pages(snapshot) == [(refunds, "refunds v2")]
+    assert "refunds v2" in embedded
@@ -0,0 +1,64 @@
+import pytest
+
+import mcp_server
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder, write_pdf
+from index_factory import IndexConfig
+from query_cache import QueryCache
+from search_context import SearchContext
+
+DIMENSION = 8
+
+
+@pytest.fixture
+def indexed(tmp_path, monkeypatch):
+    """Point the server at a fresh index of one statement; returns the server's embedder."""
+    index_dir = str(tmp_path / "index")
+    builder = IndexBuilder(dimension=DIMENSION, embedder=RecordingEmbedder(DIMENSION), index_config=IndexConfig(type="flat"))
+    builder.sync_documents([write_pdf(tmp_path / "statement.pdf", ["biryani order", "pizza order"])])
+    builder.save_index(index_dir)
+    builder.link_enricher.close()
+
+    embedder = RecordingEmbedder(DIMENSION)
+    monkeypatch.setattr(mcp_server, "search_context", SearchContext(index_dir))
+    monkeypatch.setattr(mcp_server, "query_cache", QueryCache())
+    monkeypatch.setattr(mcp_server, "embedder", embedder)
+    return embedder
+
+
+def test_analyze_statement_builds_a_prompt_from_question_and_context():
+    prompt = mcp_server.analyze_statement("Where did I spend most?", ["page one", "page two"])
+
+    assert prompt == "Where did I spend most?\n\nStatement excerpts:\npage one\npage two"
+
+
+def test_prompts_explain_missing_order_store(monkeypatch):
+    def no_orders():
+        raise RuntimeError("No order store in the index; rebuild it with build_index.py")
+
+    monkeypatch.setattr(mcp_server, "get_spending_aggregates", no_orders)
+
+    for prompt in (mcp_server.summarize_orders(["excerpt"]), mcp_server.analyze_spending_patterns(["excerpt"])):
+        assert "Precomputed figures are unavailable (No order store in the index" in prompt
+        assert prompt.endswith("Statement excerpts:\nexcerpt")
+
+
+def test_batch_returns_one_entry_per_query_in_input_order(indexed):
+    entries = mcp_server.search_documents_batch(["pizza", "biryani", "pizza"], mode="vector")
+
+    assert [entry["query"] for entry in entries] == ["pizza", "biryani", "pizza"]
+    assert all(entry["error"] is None and len(entry["results"]) == 2 for entry in entries)
+    assert entries[0]["results"] == entries[2]["results"]
+
+
+def test_batch_reports_errors_per_query(indexed, monkeypatch):
+    cached = mcp_server.search_documents_batch(["biryani"], mode="vector")[0]
+
+    def unavailable(texts):
+        raise ConnectionError("Ollama is not running")
+
+    monkeypatch.setattr(indexed, "embed_many", unavailable)
+    entries = mcp_server.search_documents_batch(["biryani", "pizza"], mode="vector")
+
+    assert entries[0] == cached
+    assert entries[1] == {"query": "pizza", "results": [], "error": "Failed to search: Ollama is not running"}
@@ -0,0 +1,297 @@
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import RecordingEmbedder
+from memory import LOG_ITEMS_FILE, LOG_VECTORS_FILE, MemoryItem, MemoryManager, MemoryPolicy
+
+
+@pytest.fixture
+def open_memory(tmp_path):
+    """Open a MemoryManager; with persist=True every call reopens the same directory."""
+    managers = []
+
+    def open_(persist: bool = True, **kwargs) -> MemoryManager:
+        memory = MemoryManager(
+            embedder=RecordingEmbedder(),
+            path=str(tmp_path / "memory") if persist else None,
+            **kwargs
+        )
+        managers.append(memory)
+        return memory
+
+    yield open_
+    for memory in managers:
+        memory.close()
+
+
+def texts(items):
+    return sorted(item.text for item in items)
+
+
+def fact(text: str, **kwargs) -> MemoryItem:
+    return MemoryItem(text=text, type="fact", **kwargs)
+
+
+# Append log replay and compaction
+
+def test_restart_replays_log_without_reembedding(open_memory):
+    memory = open_memory()
+    for text in ("likes biryani", "orders on fridays", "vegetarian"):
+        memory.add(fact(text))
+    # No close(): every record is flushed as it is appended, as after a crash
+
+    reopened = open_memory()
+
+    assert len(reopened) == 3
+    assert texts(reopened.retrieve("biryani", top_k=3)) == ["likes biryani", "orders on fridays", "vegetarian"]
+    assert reopened.embedder.embedded == ["biryani"]
+
+
+def test_torn_log_tail_is_dropped_and_truncated(open_memory, tmp_path):
+    memory = open_memory()
+    memory.add(fact("first"))
+    memory.add(fact("second"))
+    memory.close()
+    directory = tmp_path / "memory"
+    items_size = os.path.getsize(directory / LOG_ITEMS_FILE)
+    vectors_size = os.path.getsize(directory / LOG_VECTORS_FILE)
+    # A crash in the middle of the third append
+    with open(directory / LOG_VECTORS_FILE, "ab") as f:
+        f.write(b"\0" * 32)
+    with open(directory / LOG_ITEMS_FILE, "ab") as f:
+        f.write(b'{"seq": 2, "item": {"te')
+
+    reopened = open_memory()
+
+    assert texts(reopened.data) == ["first", "second"]
+    assert os.path.getsize(directory / LOG_ITEMS_FILE) == items_size
+    assert os.path.getsize(directory / LOG_VECTORS_FILE) == vectors_size
+    reopened.add(fact("third"))
+    reopened.close()
+    assert texts(open_memory().data) == ["first", "second", "third"]
+
+
+def test_compaction_writes_snapshot_and_empties_log(open_memory, tmp_path):
+    memory = open_memory(snapshot_every=4)
+    for i in range(5):
+        memory.add(fact(f"memory {i}"))
+
+    generations = [name for name in os.listdir(tmp_path / "memory") if name.startswith("gen-")]
+    assert len(generations) == 1
+    assert len(memory._tail_vectors) == 1
+    with open(tmp_path / "memory" / LOG_ITEMS_FILE, "rb") as f:
+        assert len(f.read().splitlines()) == 1
+
+    reopened = open_memory(snapshot_every=4)
+    assert texts(reopened.data) == [f"memory {i}" for i in range(5)]
+    assert reopened.embedder.embedded == []
+
+
+def test_compaction_drops_evicted_memories(open_memory):
+    memory = open_memory(policy=MemoryPolicy(max_items=4, low_watermark=0.5, compact_fraction=1.0))
+    for i in range(4):
+        memory.add(MemoryItem(text=f"output {i}", type="tool_output"))
+    memory.add(fact("kept"))
+    assert len(memory.data) == 5 and len(memory) == 2
+
+    memory.compact()
+
+    assert len(memory.data) == 2
+    assert texts(memory.retrieve("kept", top_k=5)) == texts(memory.data)
+    assert texts(open_memory().data) == texts(memory.data)
+
+
+def test_log_records_already_in_snapshot_are_not_replayed_twice(open_memory, tmp_path):
+    directory = tmp_path / "memory"
+    memory = open_memory()
+    memory.add(fact("a"))
+    memory.add(fact("b"))
+    memory.close()
+    saved_log = {name: (directory / name).read_bytes() for name in (LOG_ITEMS_FILE, LOG_VECTORS_FILE)}
+
+    memory = open_memory()
+    memory.compact()
+    memory.close()
+    # A crash after the snapshot was published but before the log was truncated
+    for name, data in saved_log.items():
+        (directory / name).write_bytes(data)
+
+    assert texts(open_memory().data) == ["a", "b"]
+
+
+def test_memory_without_path_compacts_in_place(open_memory):
+    memory = open_memory(persist=False, snapshot_every=2)
+    for text in ("x", "y", "z"):
+        memory.add(fact(text))
+
+    assert memory.index is not None and memory.index.ntotal == 2
+    assert texts(memory.retrieve("z", top_k=3)) == ["x", "y", "z"]
+
+
+# Eviction and dedup
+
+def ago(seconds: float) -> str:
+    return (datetime.now() - timedelta(seconds=seconds)).isoformat()
+
+
+def test_expired_memories_are_evicted_by_type_ttl(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(ttl={"query": 60}))
+    memory.add(MemoryItem(text="old query", type="query", timestamp=ago(3600)))
+    memory.add(MemoryItem(text="new query", type="query", timestamp=ago(1)))
+    memory.add(fact("old fact", timestamp=ago(3600)))
+
+    assert memory.evict() == 1
+
+    assert texts(memory.retrieve("query", top_k=3)) == ["new query", "old fact"]
+
+
+def test_retrieval_expires_memories_once_the_interval_passed(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(ttl={"query": 60}, expiry_interval=0))
+    memory.add(MemoryItem(text="old query", type="query", timestamp=ago(3600)))
+    memory.add(fact("fact"))
+
+    assert texts(memory.retrieve("anything", top_k=3)) == ["fact"]
+    assert len(memory) == 1
+
+
+def test_capacity_evicts_least_recently_used_unprotected_first(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(max_items=3, low_watermark=1.0, compact_fraction=1.0))
+    memory.add(fact("oldest fact", timestamp=ago(400)))
+    memory.add(MemoryItem(text="used output", type="tool_output", timestamp=ago(300)))
+    memory.add(MemoryItem(text="unused output", type="tool_output", timestamp=ago(200)))
+    # Retrieval marks a memory as used
+    memory.retrieve("used output", top_k=1, type_filter="tool_output")
+
+    memory.add(MemoryItem(text="newest output", type="tool_output"))
+
+    assert len(memory) == 3
+    assert texts(memory.retrieve("x", top_k=4)) == ["newest output", "oldest fact", "used output"]
+
+
+def test_protected_memories_are_evicted_only_when_nothing_else_is_left(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(max_items=2, low_watermark=0.5, compact_fraction=1.0))
+    memory.add(fact("fact one", timestamp=ago(300)))
+    memory.add(fact("fact two", timestamp=ago(200)))
+    memory.add(MemoryItem(text="fresh output", type="tool_output"))
+
+    # Down to the low watermark of one memory: the output goes, then the least recently used fact
+    assert texts(memory.retrieve("x", top_k=3)) == ["fact two"]
+
+
+def test_evictions_survive_a_restart(open_memory):
+    memory = open_memory(policy=MemoryPolicy(ttl={"query": 60}, compact_fraction=1.0))
+    memory.add(MemoryItem(text="old query", type="query", timestamp=ago(3600)))
+    memory.add(fact("fact"))
+    memory.evict()
+    memory.close()
+
+    reopened = open_memory(policy=MemoryPolicy(ttl={}))
+    assert len(reopened) == 1
+    assert texts(reopened.retrieve("x", top_k=2)) == ["fact"]
+
+
+def test_near_duplicates_are_dropped_within_type_and_session(open_memory):
+    memory = open_memory(persist=False)
+
+    assert memory.add(fact("likes biryani", session_id="s1"))
+    assert not memory.add(fact("likes biryani", session_id="s1"))
+    assert memory.add(fact("likes biryani", session_id="s2"))
+    assert memory.add(MemoryItem(text="likes biryani", type="preference", session_id="s1"))
+    assert memory.add(fact("orders on fridays", session_id="s1"))
+    assert len(memory) == 4
+
+
+def test_dedup_can_be_disabled(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(dedup_threshold=None))
+
+    assert memory.add(fact("same"))
+    assert memory.add(fact("same"))
+    assert len(memory) == 2
+
+
+# Filtered retrieval
+
+FILTERED = [
+    MemoryItem(text="veg preference", type="preference", tags=["food"], session_id="s1"),
+    MemoryItem(text="biryani order", type="tool_output", tags=["food", "orders"], session_id="s1"),
+    MemoryItem(text="march spend", type="tool_output", tags=["spend"], session_id="s1"),
+    MemoryItem(text="pizza order", type="tool_output", tags=["orders"], session_id="s2"),
+    MemoryItem(text="weekly spend", type="fact", tags=["spend"], session_id="s2"),
+    MemoryItem(text="fees question", type="query", session_id="s2"),
+]
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"type_filter": "tool_output"}, ["biryani order", "march spend", "pizza order"]),
+    ({"tag_filter": ["orders"]}, ["biryani order", "pizza order"]),
+    ({"tag_filter": ["food", "spend"]}, ["biryani order", "march spend", "veg preference", "weekly spend"]),
+    ({"session_filter": "s2"}, ["fees question", "pizza order", "weekly spend"]),
+    ({"session_filter": "s1", "type_filter": "tool_output", "tag_filter": ["orders"]}, ["biryani order"]),
+    ({"session_filter": "s2", "type_filter": "preference"}, []),
+    ({"tag_filter": ["unknown"]}, []),
+])
+def test_filters_select_through_snapshot_and_log_postings(open_memory, filters, expected):
+    memory = open_memory(snapshot_every=4)
+    for item in FILTERED:
+        memory.add(item)
+    memory.close()
+    # The first four memories come back from the snapshot's postings, the rest from the log
+    reopened = open_memory(snapshot_every=4)
+
+    assert texts(reopened.retrieve("order", top_k=10, **filters)) == expected
+
+
+def test_filters_skip_evicted_memories(open_memory):
+    memory = open_memory(persist=False, policy=MemoryPolicy(ttl={"tool_output": 60}, compact_fraction=1.0))
+    memory.add(MemoryItem(text="old order", type="tool_output", tags=["orders"], session_id="s1", timestamp=ago(3600)))
+    memory.add(MemoryItem(text="new order", type="tool_output", tags=["orders"], session_id="s1"))
+    memory.evict()
+
+    assert texts(memory.retrieve("order", top_k=5, tag_filter=["orders"], session_filter="s1")) == ["new order"]
+
+
+# Async access
+
+def test_sync_retrieval_embeds_the_query_without_holding_the_lock(open_memory):
+    memory = open_memory(persist=False)
+    memory.add(fact("likes biryani"))
+    embed = memory.embedder.embed
+    lock_free = []
+
+    def embed_checking_lock(text):
+        # Another thread must be able to take the lock while the query is embedded
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(memory._lock.acquire(timeout=1) and memory._lock.release() is None))
+        thread.start()
+        thread.join()
+        lock_free.append(acquired == [True])
+        return embed(text)
+
+    memory.embedder.embed = embed_checking_lock
+
+    assert texts(memory.retrieve("biryani")) == ["likes biryani"]
+    assert lock_free == [True]
+
+
+def test_async_adds_and_retrievals_run_off_the_event_loop(open_memory, monkeypatch):
+    memory = open_memory(snapshot_every=3)
+    log_threads = []
+    log = memory._log
+    monkeypatch.setattr(memory, "_log", lambda *args: log_threads.append(threading.get_ident()) or log(*args))
+
+    async def run():
+        loop_thread = threading.get_ident()
+        added = await asyncio.gather(*(memory.add_async(fact(f"memory {i}"), client=None) for i in range(8)))
+        found = await asyncio.gather(*(memory.retrieve_async(f"memory {i}", client=None, top_k=8) for i in range(4)))
+        return loop_thread, added, found
+
+    loop_thread, added, found = asyncio.run(run())
+
+    assert all(added)
+    assert len(log_threads) == 8 and loop_thread not in log_threads
+    assert all(texts(items) == [f"memory {i}" for i in range(8)] for items in found)
+    assert texts(open_memory().data) == [f"memory {i}" for i in range(8)]
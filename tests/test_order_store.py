@@ -0,0 +1,141 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from order_store import Order, OrderStore, OrderTableParser, parse_items
+
+HEADER = ["Order ID", "Order Date", "Restaurant", "Items", "Delivery Fee", "Order Total"]
+
+
+def test_parser_maps_columns_from_header_keywords():
+    table = [
+        HEADER,
+        ["1001", "05 Jan 2024, 08:15 PM", "Burger  King", "Whopper x 2, Fries", "₹30", "₹450.50"],
+        ["1002", "2024-01-07", "Domino's Pizza", "2 x Farmhouse", "Rs. 25", "Rs. 1,200"],
+    ]
+
+    first, second = OrderTableParser().parse([table], "jan.pdf", 0)
+
+    assert (first.order_id, first.restaurant, first.amount, first.fees) == ("1001", "Burger King", 450.5, 30.0)
+    assert (first.timestamp, first.has_time) == (datetime(2024, 1, 5, 20, 15), True)
+    assert first.items == [("Whopper", 2), ("Fries", 1)]
+    assert (second.timestamp, second.has_time, second.amount) == (datetime(2024, 1, 7), False, 1200.0)
+    assert second.items == [("Farmhouse", 2)]
+    assert (second.source, second.page) == ("jan.pdf", 0)
+
+
+def test_malformed_and_summary_rows_are_skipped():
+    table = [
+        HEADER,
+        ["1001", "05 Jan 2024", "Burger King", "Whopper", "₹30", "not paid"],
+        ["1002"],
+        ["", "", "", "", "", "₹9,999"],
+        ["1003", "06 Jan 2024", "Behrouz Biryani", "Biryani", "", "₹399"],
+    ]
+
+    orders = OrderTableParser().parse([table], "jan.pdf", 0)
+
+    assert [order.order_id for order in orders] == ["1003"]
+
+
+def test_headerless_continuation_reuses_the_last_header_of_the_same_width():
+    parser = OrderTableParser()
+    parser.parse([[HEADER, ["1001", "05 Jan 2024", "Burger King", "Whopper", "₹30", "₹450"]]], "jan.pdf", 0)
+
+    continued = parser.parse([[["1002", "06 Jan 2024", "Subway", "Sub", "₹20", "₹300"]]], "jan.pdf", 1)
+    other_width = parser.parse([[["Subway", "₹300"]]], "jan.pdf", 1)
+
+    assert [(order.order_id, order.page, order.amount) for order in continued] == [("1002", 1, 300.0)]
+    assert other_width == []
+
+
+def test_tables_without_an_amount_column_are_ignored():
+    assert OrderTableParser().parse([[["Date", "Restaurant"], ["05 Jan 2024", "Subway"]]], "a.pdf", 0) == []
+
+
+@pytest.mark.parametrize("cell, items", [
+    ("Paneer Tikka x 2; Naan ×3", [("Paneer Tikka", 2), ("Naan", 3)]),
+    ("3 x Momos\nCoke", [("Momos", 3), ("Coke", 1)]),
+    ("", []),
+])
+def test_parse_items(cell, items):
+    assert parse_items(cell) == items
+
+
+def order(restaurant, amount, date, items=(), source="jan.pdf", page=0, fees=0.0):
+    return Order(
+        source=source, page=page, amount=amount, fees=fees, restaurant=restaurant,
+        timestamp=datetime.fromisoformat(date), has_time="T" in date, items=list(items)
+    )
+
+
+@pytest.fixture
+def store():
+    orders = OrderStore()
+    orders.add([
+        order("Burger King", 400.0, "2024-01-05T20:15", [("Whopper", 2)], fees=30.0),
+        order("Domino's Pizza", 600.0, "2024-01-20", [("Farmhouse", 1), ("Coke", 2)]),
+        order("Burger King", 200.0, "2024-02-03T13:00", [("Whopper", 1)], source="feb.pdf", page=1),
+    ])
+    return orders
+
+
+def test_columns_are_dictionary_encoded(store):
+    assert len(store) == 3
+    assert store.restaurants == ["Burger King", "Domino's Pizza"]
+    assert store.restaurant.tolist() == [0, 1, 0]
+    assert store.sources == ["jan.pdf", "feb.pdf"]
+    assert store.items == ["Whopper", "Farmhouse", "Coke"]
+    assert list(zip(store.item_order.tolist(), store.item_code.tolist(), store.item_qty.tolist())) == [
+        (0, 0, 2), (1, 1, 1), (1, 2, 2), (2, 0, 1)
+    ]
+
+
+def test_totals_and_masks(store):
+    assert store.totals() == {
+        "orders": 3, "total_amount": 1200.0, "total_fees": 30.0,
+        "average_order_value": 400.0, "median_order_value": 400.0, "max_order_value": 600.0,
+    }
+    assert store.totals(store.mask("2024-01-20", "2024-02-03"))["total_amount"] == 800.0
+    assert store.totals(store.mask(restaurant="burger"))["orders"] == 2
+    assert store.totals(store.mask(start="2025-01-01"))["average_order_value"] == 0.0
+
+
+def test_rankings_and_histograms(store):
+    assert store.top_items(2) == [
+        {"item": "Whopper", "quantity": 3, "orders": 2},
+        {"item": "Coke", "quantity": 2, "orders": 1},
+    ]
+    assert store.top_restaurants(1, store.mask(end="2024-01-31")) == [
+        {"restaurant": "Domino's Pizza", "total_amount": 600.0, "orders": 1}
+    ]
+    assert store.histogram("month") == {
+        "2024-01": {"orders": 2, "total_amount": 1000.0},
+        "2024-02": {"orders": 1, "total_amount": 200.0},
+    }
+    # Only orders with a time of day count per hour
+    assert store.histogram("hour") == {
+        "13:00": {"orders": 1, "total_amount": 200.0},
+        "20:00": {"orders": 1, "total_amount": 400.0},
+    }
+    assert store.histogram("weekday")["Fri"] == {"orders": 1, "total_amount": 400.0}
+
+
+def test_removing_pages_keeps_items_aligned(store):
+    assert store.remove("jan.pdf", pages=[0]) == 2
+
+    assert store.amount.tolist() == [200.0]
+    assert store.top_items() == [{"item": "Whopper", "quantity": 1, "orders": 1}]
+    assert store.remove("missing.pdf") == 0
+
+
+def test_save_and_load_round_trip(store, tmp_path):
+    store.save(str(tmp_path))
+
+    loaded = OrderStore.load(str(tmp_path))
+
+    assert loaded.totals() == store.totals()
+    assert loaded.top_items() == store.top_items()
+    assert np.array_equal(loaded.timestamp, store.timestamp)
+    assert OrderStore.load(str(tmp_path / "missing")) is None
@@ -0,0 +1,71 @@
+import pytest
+
+import perception
+from conftest import RecordingEmbedder, json_response
+from perception import extract_entities, extract_perception
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    perception.perception_cache.clear()
+    yield
+    perception.perception_cache.clear()
+
+
+@pytest.fixture
+def llm(stub_server, monkeypatch):
+    """Stub Ollama that answers every perception prompt with the same dictionary."""
+    server = stub_server(lambda method, path, body, headers: json_response({
+        "response": "{'intent': 'follow up', 'entities': ['42 orders'], 'tool_hint': None}",
+        "done": True
+    }))
+    monkeypatch.setattr(perception, "OLLAMA_API_URL", f"{server.url}/api/generate")
+    return server
+
+
+@pytest.mark.parametrize("text, entities", [
+    ("How much did I spend on orders from Burger King in March 2024?", ["Burger King", "March 2024"]),
+    ("Orders above ₹500 between 01/02/2024 and 2024-03-31", ["₹500", "01/02/2024", "2024-03-31"]),
+    ("What did I order at Domino's Pizza on 5th Jan?", ["Domino's Pizza", "5th Jan"]),
+    ("Anything over Rs. 1,200 in 2023", ["Rs. 1,200", "2023"]),
+    ("May I see the market for junk food?", []),
+])
+def test_extract_entities(text, entities):
+    assert extract_entities(text) == entities
+
+
+def test_first_step_is_classified_locally_with_entities(llm):
+    result = extract_perception("Give me a summary of my orders from Burger King since Feb 3, 2024")
+
+    assert result.intent == "order summary"
+    assert result.tool_hint == "order_summary"
+    assert result.entities == ["summary", "Burger King", "Feb 3, 2024"]
+    assert llm.requests == []
+
+
+def follow_up(task: str) -> str:
+    return f"Original task: {task}\nPrevious output: 42 orders, ₹21,000 in total\nWhat should I do next?"
+
+
+def test_follow_up_step_reuses_the_task_perception_without_the_llm(llm):
+    task = "Give me a summary of my orders from Burger King"
+
+    result = extract_perception(follow_up(task))
+
+    assert llm.requests == []
+    assert (result.intent, result.tool_hint, result.entities) == ("order summary", "order_summary", ["summary", "Burger King"])
+    assert result.user_input == follow_up(task)
+
+
+def test_ambiguous_task_reaches_the_llm_once_across_its_steps(llm, monkeypatch):
+    monkeypatch.setattr(perception, "_embedding_perception", lambda user_input, vector: None)
+    monkeypatch.setattr(perception, "_get_embedder", lambda: RecordingEmbedder())
+    task = "Which restaurant should I try next?"
+
+    first = extract_perception(task)
+    second = extract_perception(follow_up(task))
+
+    assert len(llm.requests) == 1
+    assert task in llm.requests[0][2]["prompt"]
+    assert "Previous output" not in llm.requests[0][2]["prompt"]
+    assert second.intent == first.intent == "follow up"
@@ -0,0 +1,88 @@
+import pytest
+
+from conftest import RecordingEmbedder
+from query_cache import LRUCache, QueryCache
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert len(cache) == 2
+
+
+def test_stats_count_hits_and_misses():
+    cache = QueryCache()
+    embedder = RecordingEmbedder()
+
+    assert cache.stats()["results"]["hit_rate"] == 0.0
+    cache.ranked("v1", "pizza orders", "vector", 5, lambda: [3, 1])
+    cache.ranked("v1", "Pizza orders", "vector", 5, lambda: [9])
+    cache.embedding("Pizza  orders", embedder.embed)
+    cache.embedding("pizza orders", embedder.embed)
+    cache.embedding("pizza ORDERS ", embedder.embed)
+
+    assert embedder.embedded == ["Pizza  orders"]
+    assert cache.stats() == {
+        "index_version": "v1",
+        "embeddings": {"entries": 1, "hits": 2, "misses": 1, "hit_rate": 0.667},
+        "results": {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5},
+    }
+
+
+def test_results_are_keyed_by_mode_k_and_filter():
+    cache = QueryCache()
+    cache.ranked("v1", "pizza", "vector", 5, lambda: [1])
+
+    assert cache.get_ranked("v1", "pizza", "vector", 5) == [1]
+    assert cache.get_ranked("v1", "pizza", "lexical", 5) is None
+    assert cache.get_ranked("v1", "pizza", "vector", 10) is None
+    assert cache.get_ranked("v1", "pizza", "vector", 5, search_filter=("*.pdf",)) is None
+
+
+def test_new_index_version_invalidates_both_levels():
+    cache = QueryCache()
+    embedder = RecordingEmbedder()
+    cache.embedding("pizza", embedder.embed)
+    cache.ranked("v1", "pizza", "vector", 5, lambda: [1])
+
+    assert cache.get_ranked("v2", "pizza", "vector", 5) is None
+    assert cache.stats()["index_version"] == "v2"
+    assert cache.stats()["embeddings"]["entries"] == 0
+    cache.embedding("pizza", embedder.embed)
+    assert embedder.embedded == ["pizza", "pizza"]
+    # Going back to the old version does not resurrect its results either
+    assert cache.get_ranked("v1", "pizza", "vector", 5) is None
+
+
+def test_results_of_a_superseded_version_are_not_stored():
+    cache = QueryCache()
+    cache.get_ranked("v2", "pizza", "vector", 5)
+
+    # A search that started against v1 finishes after v2 was loaded
+    cache.put_ranked("v1", "pizza", "vector", 5, [1])
+
+    assert cache.stats()["results"]["entries"] == 0
+
+
+def test_embedding_many_sends_only_uncached_queries_once():
+    cache = QueryCache()
+    embedder = RecordingEmbedder()
+    cache.embedding("pizza", embedder.embed)
+
+    vectors = cache.embedding_many(["Pizza", "burger", "BURGER", "fries"], embedder.embed_many)
+
+    assert embedder.embedded == ["pizza", "burger", "fries"]
+    assert len(vectors) == 4 and (vectors[1] == vectors[2]).all()
+
+
+def test_embedding_many_raises_when_a_query_fails():
+    cache = QueryCache()
+
+    with pytest.raises(RuntimeError, match="burger"):
+        cache.embedding_many(["burger"], lambda texts: [None])
+    assert cache.stats()["embeddings"]["entries"] == 0
@@ -0,0 +1,157 @@
+import os
+import shutil
+
+import faiss
+import numpy as np
+import pytest
+
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder, write_pdf
+from index_factory import IndexConfig, build_index
+from index_store import VERSION_FILE, read_version, write_version
+from search_context import FILTER_EXACT_FRACTION, SearchContext, SearchFilter, SearchSnapshot
+
+DIMENSION = 8
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return str(tmp_path / "index")
+
+
+@pytest.fixture
+def build(tmp_path, index_dir):
+    """Index the given pages as one PDF and publish them as a new version."""
+    def run(pages):
+        builder = IndexBuilder(dimension=DIMENSION, embedder=RecordingEmbedder(DIMENSION), index_config=IndexConfig(type="flat"))
+        builder.sync_documents([write_pdf(tmp_path / "statement.pdf", pages)])
+        builder.save_index(index_dir)
+        builder.link_enricher.close()
+        return read_version(index_dir)
+
+    return run
+
+
+def versions_on_disk(index_dir):
+    return sorted(name for name in os.listdir(index_dir) if name.startswith("gen-"))
+
+
+def test_each_build_is_published_as_its_own_version(build, index_dir):
+    context = SearchContext(index_dir)
+    first = build(["one page"])
+    old = context.reload()
+    assert (old.version, len(old.store)) == (first, 1)
+
+    build(["two", "pages"])
+    third = build(["three", "more", "pages"])
+    new = context.reload()
+
+    assert (new.version, len(new.store)) == (third, 3)
+    # The current and the previous version stay; older ones are removed
+    assert len(versions_on_disk(index_dir)) == 2
+    assert sorted(os.listdir(index_dir)) == versions_on_disk(index_dir) + [VERSION_FILE]
+    # A snapshot loaded earlier keeps working after its directory is gone
+    assert old.store.content(0).startswith("one page")
+
+
+def test_unpublished_version_is_never_loaded(build, index_dir):
+    context = SearchContext(index_dir)
+    build(["published"])
+    current = context.reload()
+
+    # A build still being written: its directory exists, the pointer is unchanged
+    in_progress = str(int(current.version) + 1)
+    partial = os.path.join(index_dir, f"gen-{in_progress}")
+    shutil.copytree(current.directory, partial)
+    with open(os.path.join(partial, "swiggy.index"), "wb") as f:
+        f.write(b"truncated")
+
+    assert context.reload(force=True).version == current.version
+
+    os.remove(os.path.join(partial, "swiggy.index"))
+    shutil.copy(os.path.join(current.directory, "swiggy.index"), partial)
+    write_version(index_dir, in_progress)
+    assert context.reload().directory == partial
+
+
+class RecordingIndex:
+    """Wraps a FAISS index and records the queries searched on it."""
+
+    def __init__(self, index):
+        self.index = index
+        self.searches = 0
+
+    def search(self, *args, **kwargs):
+        self.searches += 1
+        return self.index.search(*args, **kwargs)
+
+
+@pytest.fixture
+def hnsw_snapshot():
+    """An HNSW snapshot over 1000 random vectors, with a recording exact index next to it."""
+    vectors = np.random.default_rng(0).standard_normal((1000, DIMENSION)).astype(np.float32)
+    flat = faiss.IndexFlatL2(DIMENSION)
+    flat.add(vectors)
+    index = build_index(flat, IndexConfig(type="hnsw", flat_threshold=0))
+    snapshot = SearchSnapshot(version="1", directory="", index=index, store=None, exact_index=RecordingIndex(flat))
+    return snapshot, vectors
+
+
+def exact_neighbours(vectors, query, mask, k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    distances[~mask] = np.inf
+    return np.argsort(distances)[:k].tolist()
+
+
+def test_selective_filter_searches_the_subset_exactly(hnsw_snapshot):
+    snapshot, vectors = hnsw_snapshot
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::200] = True
+    assert mask.sum() <= FILTER_EXACT_FRACTION * len(mask)
+
+    _, I = snapshot.search(vectors[:1], 3, mask)
+
+    assert snapshot.exact_index.searches == 1
+    assert I[0].tolist() == exact_neighbours(vectors, vectors[0], mask, 3)
+
+
+def test_broad_filter_searches_the_index_with_a_selector(hnsw_snapshot):
+    snapshot, vectors = hnsw_snapshot
+    mask = np.arange(len(vectors)) % 2 == 1
+
+    _, I = snapshot.search(vectors[:2], 5, mask)
+
+    assert snapshot.exact_index.searches == 0
+    assert mask[I].all()
+    assert I[1].tolist() == exact_neighbours(vectors, vectors[1], mask, 5)
+
+
+def test_empty_filter_matches_nothing(hnsw_snapshot):
+    snapshot, vectors = hnsw_snapshot
+
+    D, I = snapshot.search(vectors[:2], 4, np.zeros(len(vectors), dtype=bool))
+
+    assert I.shape == (2, 4) and (I == -1).all() and np.isinf(D).all()
+    assert snapshot.exact_index.searches == 0
+
+
+def test_filter_mask_selects_pages_by_source_and_page_range(tmp_path, index_dir):
+    builder = IndexBuilder(dimension=DIMENSION, embedder=RecordingEmbedder(DIMENSION), index_config=IndexConfig(type="flat"))
+    builder.sync_documents([
+        write_pdf(tmp_path / "jan.pdf", ["jan one", "jan two", "jan three"]),
+        write_pdf(tmp_path / "feb.pdf", ["feb one", "feb two"]),
+    ])
+    builder.save_index(index_dir)
+    builder.link_enricher.close()
+    snapshot = SearchContext(index_dir).reload()
+
+    def selected(**fields):
+        mask = snapshot.filter_mask(SearchFilter(**fields))
+        return sorted(snapshot.store.content(i).split()[0] + str(snapshot.store.columns[i]["page"]) for i in np.flatnonzero(mask))
+
+    assert snapshot.filter_mask(None) is None and snapshot.filter_mask(SearchFilter()) is None
+    assert selected(source="*feb.pdf") == ["feb0", "feb1"]
+    assert selected(source="jan*", page_start=1, page_end=1) == ["jan1"]
+    assert selected(page_start=2) == ["jan2"]
+    assert selected(has_tables=False, source="*.pdf") == ["feb0", "feb1", "jan0", "jan1", "jan2"]
+    assert selected(source="*.txt") == []
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from build_index import IndexBuilder
+from conftest import RecordingEmbedder
+from order_store import Order, OrderStore
+from spending_aggregates import SpendingAggregates
+
+
+def statement(source: str, pages: int, seed: int):
+    """A few orders per page with varied restaurants, items, amounts and times."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1, 9, 0)
+    return [
+        Order(
+            source=source,
+            page=page,
+            amount=round(float(rng.uniform(80, 900)), 2),
+            fees=round(float(rng.uniform(0, 60)), 2),
+            timestamp=start + timedelta(hours=int(rng.integers(0, 24 * 90))),
+            has_time=bool(rng.integers(0, 2)),
+            restaurant=["Burger King", "Subway", "Behrouz Biryani"][int(rng.integers(0, 3))],
+            items=[(["Whopper", "Sub", "Biryani", "Coke"][int(rng.integers(0, 4))], int(rng.integers(1, 4)))]
+        )
+        for page in range(pages)
+        for _ in range(3)
+    ]
+
+
+def snapshot(aggregates: SpendingAggregates):
+    return aggregates.orders, aggregates.total_amount, aggregates.total_fees, aggregates.buckets
+
+
+@pytest.fixture
+def orders():
+    store = OrderStore()
+    store.add(statement("jan.pdf", 4, seed=1) + statement("feb.pdf", 3, seed=2))
+    return store
+
+
+def test_replacing_pages_matches_a_full_recompute(orders):
+    aggregates = SpendingAggregates.from_store(orders)
+
+    # What IndexBuilder does when pages 1 and 3 of a statement changed
+    replaced = [1, 3]
+    aggregates.subtract(orders, orders.rows("jan.pdf", pages=replaced))
+    orders.remove("jan.pdf", pages=replaced)
+    first_new = len(orders)
+    orders.add([order for order in statement("jan.pdf", 4, seed=3) if order.page in replaced])
+    aggregates.add(orders, np.arange(len(orders)) >= first_new)
+
+    assert snapshot(aggregates) == snapshot(SpendingAggregates.from_store(orders))
+
+
+def test_removing_a_statement_matches_a_full_recompute(orders):
+    builder = IndexBuilder(dimension=8, embedder=RecordingEmbedder())
+    builder.orders = orders
+    builder.aggregates = SpendingAggregates.from_store(orders)
+
+    builder.remove_documents(["feb.pdf"])
+
+    assert len(builder.orders) == 12
+    assert snapshot(builder.aggregates) == snapshot(SpendingAggregates.from_store(builder.orders))
+    builder.link_enricher.close()
+
+
+def test_removing_everything_leaves_empty_buckets(orders):
+    aggregates = SpendingAggregates.from_store(orders)
+
+    aggregates.subtract(orders, np.ones(len(orders), dtype=bool))
+
+    assert snapshot(aggregates) == snapshot(SpendingAggregates())
+
+
+def test_save_and_load_round_trip(orders, tmp_path):
+    aggregates = SpendingAggregates.from_store(orders)
+    aggregates.save(str(tmp_path))
+
+    assert snapshot(SpendingAggregates.load(str(tmp_path))) == snapshot(aggregates)